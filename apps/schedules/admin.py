@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import FreeDay, Schedule, ShiftType, Preference, Assignment, Shift, Absence, JobTime
+from .models import FreeDay, Schedule, ShiftType, Preference, Assignment, Shift, Absence, JobTime, SolverProfile, \
+    GenerationJob, GenerationRun
 
 admin.site.register(Schedule)
 admin.site.register(ShiftType)
@@ -16,3 +17,22 @@ admin.site.register(Absence)
 admin.site.register(Assignment)
 admin.site.register(FreeDay)
 admin.site.register(JobTime)
+admin.site.register(SolverProfile)
+
+
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('organization', 'year', 'month', 'mode', 'status', 'solutions', 'best_objective', 'created_at')
+    list_filter = ('organization', 'status', 'mode')
+
+
+admin.site.register(GenerationJob, GenerationJobAdmin)
+
+
+class GenerationRunAdmin(admin.ModelAdmin):
+    list_display = ('organization', 'year', 'month', 'mode', 'status', 'solver_status', 'employees', 'total_time', 'solve_time',
+                    'objective', 'created_at')
+    list_filter = ('organization', 'status', 'mode', 'solver_status')
+    date_hierarchy = 'created_at'
+
+
+admin.site.register(GenerationRun, GenerationRunAdmin)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class SchedulesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.schedules'
+
+    def ready(self):
+        from prometheus_client import REGISTRY
+
+        from apps.schedules import read_model  # noqa: F401 (connects signal receivers invalidating cached schedules)
+        from apps.schedules.metrics import GenerationQueueCollector
+
+        REGISTRY.register(GenerationQueueCollector())
@@ -0,0 +1,160 @@
+import calendar
+import datetime
+import multiprocessing
+import platform
+import random
+import resource
+import time
+
+import ortools
+
+from apps.schedules.snapshots import SNAPSHOT_VERSION, load_snapshot
+
+BENCHMARK_VERSION = 1
+
+# Shift types of every synthetic workplace: (name, hour_start, hour_end), the last one is an overnight shift
+SYNTHETIC_SHIFT_TYPES = [("Rano", "06:00:00", "14:00:00"), ("Popołudnie", "14:00:00", "22:00:00"), ("Noc", "22:00:00", "06:00:00")]
+
+
+def synthetic_snapshot(num_employees: int, num_workplaces: int, year: int, month: int, seed: int = 0) -> dict:
+    """Generates snapshot of a synthetic organization, which can be loaded with load_snapshot.
+
+    The organization has workplaces with morning, afternoon and overnight shifts, employees with different job times
+    (a few of them work in two workplaces), absences, term and indefinite assignments, preferences and closings.
+    The demand is set to about 75% of the work time employees have.
+
+    Args:
+        num_employees: number of employees
+        num_workplaces: number of workplaces
+        year: year of the schedule
+        month: month of the schedule
+        seed: seed of the random generator, the same arguments always give the same snapshot
+
+    Returns:
+        dictionary with the snapshot
+    """
+    rnd = random.Random(seed)
+    num_days = calendar.monthrange(year, month)[1]
+    first_day = datetime.date(year, month, 1)
+    job_time = sum(8 for d in range(num_days) if (first_day + datetime.timedelta(days=d)).weekday() < 5)
+
+    snapshot = {"version": SNAPSHOT_VERSION, "year": year, "month": month, "job_time": job_time, "solver_profile": None,
+                "workplaces": [], "shift_types": [], "employees": [], "preferences": [], "absences": [], "assignments": [],
+                "closings": [], "shifts_before": [], "shifts_after": [], "shifts_hint": []}
+
+    job_times = {"1": 1, "3/4": 0.75, "1/2": 0.5}
+    employees = [{"id": e, "job_time": rnd.choices(list(job_times), weights=[7, 2, 1])[0], "workplaces": []}
+                 for e in range(1, num_employees + 1)]
+    for i, e in enumerate(employees):
+        e["workplaces"].append(i % num_workplaces + 1)
+        if num_workplaces > 1 and rnd.random() < 0.05:
+            e["workplaces"].append(rnd.choice([wp for wp in range(1, num_workplaces + 1) if wp not in e["workplaces"]]))
+    snapshot["employees"] = employees
+
+    for wp in range(1, num_workplaces + 1):
+        snapshot["workplaces"].append({"id": wp, "name": f"Dział {wp}", "unit": "Jednostka"})
+
+        # Shifts per day this workplace can cover with 75% of work time of its employees
+        capacity = sum(job_times[e["job_time"]] * job_time / 8 for e in employees if e["workplaces"][0] == wp) * 0.75 / num_days
+        for i, (name, hour_start, hour_end) in enumerate(SYNTHETIC_SHIFT_TYPES):
+            snapshot["shift_types"].append({"id": (wp - 1) * len(SYNTHETIC_SHIFT_TYPES) + i + 1, "workplace": wp, "name": name,
+                                            "shift_code": name[:3], "hour_start": hour_start, "hour_end": hour_end,
+                                            "demand": max(1, round(capacity / len(SYNTHETIC_SHIFT_TYPES))), "active_days": "1111111",
+                                            "is_used": True, "is_archive": False})
+
+        if rnd.random() < 0.3:
+            closed = first_day + datetime.timedelta(days=rnd.randrange(num_days))
+            snapshot["closings"].append({"workplace": wp, "start": closed.isoformat(), "end": closed.isoformat()})
+
+    for e in employees:
+        shift_types = [st["id"] for st in snapshot["shift_types"] if st["workplace"] in e["workplaces"]]
+
+        if rnd.random() < 0.2:
+            start = first_day + datetime.timedelta(days=rnd.randrange(num_days - 7))
+            length = rnd.randint(2, 7)
+            snapshot["absences"].append({"employee": e["id"], "start": start.isoformat(),
+                                         "end": (start + datetime.timedelta(days=length - 1)).isoformat(), "type": "VAC",
+                                         "hours_number": length * 8})
+        if rnd.random() < 0.1:
+            # No overnight shifts for this employee
+            snapshot["assignments"].append({"employee": e["id"], "shift_type": shift_types[2], "negative_flag": True,
+                                            "start": None, "end": None})
+        if rnd.random() < 0.05:
+            start = first_day + datetime.timedelta(days=rnd.randrange(num_days - 2))
+            snapshot["assignments"].append({"employee": e["id"], "shift_type": rnd.choice(shift_types), "negative_flag": False,
+                                            "start": start.isoformat(), "end": (start + datetime.timedelta(days=1)).isoformat()})
+        if rnd.random() < 0.2:
+            snapshot["preferences"].append({"employee": e["id"], "shift_type": shift_types[0],
+                                            "active_days": "".join(rnd.choice("01") for _ in range(7))})
+
+    return snapshot
+
+
+def summarize_run(response: dict) -> dict:
+    """Sums up statistics of all sub-problems of one run of the algorithm"""
+    components = response.get("components", [])
+    first_solutions = [c["first_solution_time"] for c in components]
+    objectives = [c["objective"] for c in components]
+
+    return {
+        "status": response.get("status", False),
+        "components": len(components),
+        "variables": sum(c["statistics"]["totals"]["variables"] for c in components),
+        "linear_constraints": sum(c["statistics"]["totals"]["linear_constraints"] for c in components),
+        "bool_clauses": sum(c["statistics"]["totals"]["bool_clauses"] for c in components),
+        "build_time": sum(c["build_time"] for c in components),
+        "solve_time": sum(c["wall_time"] for c in components),
+        # Sub-problems are solved at the same time, so the last of them decides when the whole schedule is feasible
+        "time_to_first_feasible": max(first_solutions) if first_solutions and None not in first_solutions else None,
+        "objective": sum(objectives) if objectives and None not in objectives else None,
+        "stop_reasons": [c["stop_reason"] for c in components],
+        "shifts": len(response.get("data", [])),
+    }
+
+
+def _run_instance(snapshot, solver_profile, queue):
+    problem = load_snapshot(snapshot)
+    problem.solver_profile = solver_profile
+    start = time.time()
+    response = problem.solve("benchmark")
+    result = summarize_run(response)
+    result["total_time"] = time.time() - start
+    # Linux reports maximum resident set size in kilobytes
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put(result)
+
+
+def run_benchmark(sizes, employees_per_workplace: int, year: int, month: int, solver_profile: dict, seed: int = 0) -> dict:
+    """Runs the algorithm on synthetic organizations of given sizes.
+
+    Every instance is solved in a separate process, so peak RSS is measured for each instance on its own.
+
+    Args:
+        sizes: numbers of employees of synthetic organizations
+        employees_per_workplace: number of employees per workplace, it decides the number of workplaces of every organization
+        year: year of the schedule
+        month: month of the schedule
+        solver_profile: solver profile used for every instance (same values as SolverProfile fields)
+        seed: seed of the random generator
+
+    Returns:
+        dictionary with the report
+    """
+    report = {"version": BENCHMARK_VERSION, "created": datetime.datetime.now().isoformat(timespec="seconds"),
+              "environment": {"python": platform.python_version(), "ortools": ortools.__version__, "machine": platform.machine(),
+                              "cpu_count": multiprocessing.cpu_count()},
+              "parameters": {"employees_per_workplace": employees_per_workplace, "year": year, "month": month, "seed": seed, "solver_profile": solver_profile},
+              "instances": []}
+
+    context = multiprocessing.get_context("fork")
+    for num_employees in sizes:
+        num_workplaces = max(1, round(num_employees / employees_per_workplace))
+        snapshot = synthetic_snapshot(num_employees, num_workplaces, year, month, seed)
+        queue = context.Queue()
+        process = context.Process(target=_run_instance, args=(snapshot, solver_profile, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        report["instances"].append(dict(result, employees=num_employees, workplaces=num_workplaces, shift_types=len(snapshot["shift_types"])))
+
+    return report
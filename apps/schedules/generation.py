@@ -0,0 +1,403 @@
+import calendar
+import datetime
+import threading
+import time
+
+from django.db import transaction, connection
+from django.db.models import Q
+from django.utils import timezone
+
+import scripts.run_algorithm
+from apps.accounts.models import Employee
+from apps.organizations.models import Workplace, WorkplaceClosing
+from apps.schedules.models import Schedule, Shift, ShiftType, Preference, Absence, Assignment, JobTime, SolverProfile, \
+    GenerationJob, GenerationRun
+from apps.schedules.read_model import invalidate_shifts, bulk_shift_writes
+from scripts.data import EmployeeData, ShiftTypeData, PreferenceData, AbsenceData, AssignmentData, ClosingData, ShiftData
+
+
+def replace_month_schedules(year, month, schedule_dict, shifts, batch_size=1000):
+    """Replaces schedules of workplaces for the month with generated ones in a single transaction.
+
+    Old schedules (and their shifts) are deleted and new ones are inserted with bulk_create, so a failure leaves
+    the previous schedules untouched.
+
+    Args:
+        year: year of the schedules
+        month: month of the schedules
+        schedule_dict: dictionary with new, unsaved schedules (workplace id: schedule)
+        shifts: list of new, unsaved shifts referencing schedules from schedule_dict
+        batch_size: number of shifts inserted by one query
+
+    Returns:
+        time of writing to the database in seconds
+    """
+    start = time.time()
+    with transaction.atomic():
+        old_schedules = Schedule.objects.filter(year=year, month=month, workplace_id__in=schedule_dict.keys())
+        employee_ids = set(Shift.objects.filter(schedule__in=old_schedules).values_list('employee_id', flat=True).distinct())
+        employee_ids.update(shift.employee_id for shift in shifts)
+        invalidate_shifts(year, month, workplace_ids=schedule_dict.keys(), employee_ids=employee_ids)
+
+        with bulk_shift_writes():
+            Shift.objects.filter(schedule__in=old_schedules).delete()
+            old_schedules.delete()
+
+        # Only one schedule per workplace, saved one by one to have primary keys on every database backend
+        for schedule in schedule_dict.values():
+            schedule.save()
+        Shift.objects.bulk_create(shifts, batch_size=batch_size)
+
+    return time.time() - start
+
+
+class GenerationProblem:
+    """
+    A class used to keep every input of the scheduling algorithm for one month.
+
+    It is a plain in-memory object, filled by load_generation_problem with a fixed number of queries, so the algorithm
+    doesn't touch the database while building the model.
+
+    Attributes:
+    -------
+    year : int
+        The year we generate schedule for.
+    month : int
+        The month we generate schedule for.
+    org_id : int
+        Id of the organization of scheduled workplaces.
+    workplace_list : list[int]
+        Ids of scheduled workplaces.
+    schedule_dict : dict[int, Schedule]
+        New, unsaved schedules (workplace id: schedule).
+    employees : list[Employee]
+        Employees of scheduled workplaces, ordered by id.
+    shift_types : list[ShiftType]
+        Used, not archived shift types of scheduled workplaces.
+    emp_for_workplaces : dict[int, list[Employee]]
+        Employees of each workplace (workplace id: list of employees).
+    emp_preferences, emp_absences, emp_assignments : dict[int, list]
+        Preferences, absences in the month and assignments valid in the month (employee id: list of objects).
+    work_for_workplace_closing : dict[int, list[WorkplaceClosing]]
+        Closings of each workplace in the month (workplace id: list of closings).
+    job_time : int
+        Number of hours for full-time job in the month.
+    shifts_before, shifts_after : dict[date, list[Shift]]
+        Shifts of the week before and after the month (date: list of shifts).
+    shifts_hint : dict[date, list[Shift]]
+        Existing shifts of the month or, if there are none, of the last four weeks before it (date: list of shifts).
+    solver_profile : dict
+        Values of organization's SolverProfile or None.
+    """
+
+    def __init__(self, year: int, month: int, org_id: int, workplace_list: list):
+        self.year = year
+        self.month = month
+        self.org_id = org_id
+        self.workplace_list = workplace_list
+
+        self.schedule_dict = dict()
+        self.employees = []
+        self.shift_types = []
+        self.emp_for_workplaces = dict()
+        self.emp_preferences = dict()
+        self.emp_absences = dict()
+        self.emp_assignments = dict()
+        self.work_for_workplace_closing = dict()
+        self.job_time = None
+        self.shifts_before = dict()
+        self.shifts_after = dict()
+        self.shifts_hint = dict()
+        self.solver_profile = None
+
+    def solve(self, username, repair=None, progress_callback=None, draft_callback=None) -> dict:
+        """Runs the algorithm on plain data objects and turns generated shifts into Shift objects of new schedules."""
+        shift_types = {st.id: to_shift_type_data(st) for st in self.shift_types}
+        employees = {e.id: to_employee_data(e) for e in self.employees}
+
+        def shift_type(st):
+            return shift_types.get(st.id) or to_shift_type_data(st)
+
+        def shifts(shifts_by_date):
+            return {date: [ShiftData(date=s.date, employee_id=s.employee_id, shift_type_id=s.shift_type_id) for s in d_shifts]
+                    for date, d_shifts in shifts_by_date.items()}
+
+        response = scripts.run_algorithm.main_algorithm(
+            list(employees.values()), list(shift_types.values()), self.year, self.month,
+            {wp: [employees[e.id] for e in emp] for wp, emp in self.emp_for_workplaces.items()},
+            {e: [PreferenceData(employee_id=p.employee_id, shift_type=shift_type(p.shift_type), active_days=p.active_days) for p in prefs]
+             for e, prefs in self.emp_preferences.items()},
+            {e: [AbsenceData(employee_id=a.employee_id, start=a.start, end=a.end, hours_number=a.hours_number) for a in absences]
+             for e, absences in self.emp_absences.items()},
+            {e: [AssignmentData(employee_id=a.employee_id, shift_type=shift_type(a.shift_type), negative_flag=a.negative_flag,
+                                start=a.start, end=a.end) for a in assignments]
+             for e, assignments in self.emp_assignments.items()},
+            self.job_time,
+            {wp: [ClosingData(workplace_id=c.workplace_id, start=c.start, end=c.end) for c in closings]
+             for wp, closings in self.work_for_workplace_closing.items()},
+            shifts(self.shifts_before), shifts(self.shifts_after), username, self.solver_profile, shifts(self.shifts_hint), repair,
+            progress_callback, draft_callback)
+
+        convert_start = time.time()
+        if "data" in response:
+            workplaces = {st.id: st.workplace_id for st in self.shift_types}
+            response["data"] = [Shift(date=s.date, schedule=self.schedule_dict[workplaces[s.shift_type_id]], employee_id=s.employee_id,
+                                      shift_type_id=s.shift_type_id) for s in response["data"]]
+        response["convert_time"] = time.time() - convert_start
+
+        return response
+
+
+def to_employee_data(employee: Employee) -> EmployeeData:
+    return EmployeeData(id=employee.id, job_time=employee.job_time, first_name=employee.first_name, last_name=employee.last_name)
+
+
+def to_shift_type_data(shift_type: ShiftType) -> ShiftTypeData:
+    return ShiftTypeData(id=shift_type.id, workplace_id=shift_type.workplace_id, hour_start=shift_type.hour_start,
+                         hour_end=shift_type.hour_end, name=shift_type.name, shift_code=shift_type.shift_code,
+                         demand=shift_type.demand, active_days=shift_type.active_days,
+                         workplace_name=shift_type.workplace.name if shift_type.workplace_id is not None else "")
+
+
+def load_generation_problem(year, month, org_id, workplace_list) -> GenerationProblem:
+    """Loads everything the scheduling algorithm needs for the month.
+
+    Every related object used by the algorithm is loaded with select_related, so the number of queries doesn't
+    depend on the number of employees, workplaces or shifts.
+
+    Args:
+        year: year of the schedule
+        month: month of the schedule
+        org_id: id of the organization
+        workplace_list: ids of scheduled workplaces
+
+    Returns:
+        GenerationProblem object
+    """
+    year, month = int(year), int(month)
+    problem = GenerationProblem(year, month, org_id, workplace_list)
+
+    first_day = datetime.date(year, month, 1)
+    last_day = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    seven_before = first_day - datetime.timedelta(days=7)
+    seven_after = last_day + datetime.timedelta(days=7)
+    four_weeks_before = first_day - datetime.timedelta(days=28)
+
+    for workplace in Workplace.objects.filter(id__in=workplace_list).select_related('workplace_unit'):
+        problem.schedule_dict[workplace.id] = Schedule(year=year, month=month, workplace=workplace)
+
+    problem.shift_types = list(ShiftType.objects.filter(workplace_id__in=workplace_list).filter(is_used=True).filter(
+        is_archive=False).select_related('workplace__workplace_unit'))
+
+    problem.employees = list(Employee.objects.filter(user_workplace__in=workplace_list).exclude(is_supervisor=True).exclude(
+        groups__name='supervisor').exclude(is_superuser=True).distinct().order_by('id'))
+    employees_by_id = {e.id: e for e in problem.employees}
+
+    for work_id in workplace_list:
+        problem.emp_for_workplaces[work_id] = []
+    memberships = Employee.user_workplace.through.objects.filter(workplace_id__in=workplace_list).filter(
+        employee_id__in=employees_by_id).order_by('employee_id').values_list('employee_id', 'workplace_id')
+    for employee_id, workplace_id in memberships:
+        problem.emp_for_workplaces[workplace_id].append(employees_by_id[employee_id])
+
+    for preference in Preference.objects.filter(employee_id__in=employees_by_id).select_related('shift_type'):
+        problem.emp_preferences.setdefault(preference.employee_id, []).append(preference)
+
+    absences = Absence.objects.filter(employee_id__in=employees_by_id).filter(start__lte=last_day).filter(end__gte=first_day)
+    for absence in absences:
+        problem.emp_absences.setdefault(absence.employee_id, []).append(absence)
+
+    # Term assignments valid in the month and general (indefinite) assignments
+    assignments = Assignment.objects.filter(employee_id__in=employees_by_id).filter(
+        Q(start__lte=last_day, end__gte=first_day) | Q(start=None, end=None)).select_related('shift_type')
+    for assignment in assignments:
+        problem.emp_assignments.setdefault(assignment.employee_id, []).append(assignment)
+
+    for work_id in workplace_list:
+        problem.work_for_workplace_closing[work_id] = []
+    closings = WorkplaceClosing.objects.filter(workplace_id__in=workplace_list).filter(start__lte=last_day).filter(end__gte=first_day)
+    for closing in closings:
+        problem.work_for_workplace_closing[closing.workplace_id].append(closing)
+
+    problem.job_time = JobTime.objects.filter(organization_id=org_id).filter(year=year).values_list(
+        calendar.month_name[month].lower(), flat=True).first()
+
+    # Neighbouring weeks and existing shifts of the month are loaded at once and split by date
+    shifts = Shift.objects.filter(date__gte=min(four_weeks_before, seven_before)).filter(date__lte=seven_after).filter(
+        schedule__workplace_id__in=workplace_list).order_by('date')
+    shifts_month, shifts_four_weeks_before = dict(), dict()
+    for shift in shifts:
+        if seven_before <= shift.date < first_day:
+            problem.shifts_before.setdefault(shift.date, []).append(shift)
+        if shift.date > last_day:
+            problem.shifts_after.setdefault(shift.date, []).append(shift)
+        elif shift.date >= first_day:
+            shifts_month.setdefault(shift.date, []).append(shift)
+        elif shift.date >= four_weeks_before:
+            shifts_four_weeks_before.setdefault(shift.date, []).append(shift)
+    problem.shifts_hint = shifts_month or shifts_four_weeks_before
+
+    problem.solver_profile = SolverProfile.objects.filter(organization_id=org_id).values().first()
+
+    return problem
+
+
+class JobProgress:
+    """
+    A class used to pass progress of the search to GenerationJob.
+
+    The algorithm calls the object with progress of every sub-problem (from solver threads), the object keeps it in
+    memory and its own thread writes the summary to the job once per interval. Draft schedules (intermediate solutions)
+    are passed to draft and written by the same thread, so the solver never waits for the database. Every write is also
+    the heartbeat of the job. The thread also checks if the job was cancelled or its draft accepted, the search is
+    stopped with that reason by the next call.
+    """
+
+    def __init__(self, job_id: int, interval: float = 1.0):
+        self.job_id = job_id
+        self.interval = interval
+        self.components = dict()
+        self.drafts = dict()
+        self.cancelled = False
+        self.accepted = False
+
+        self.__draft_version = 0
+        self.__written_draft_version = 0
+        self.__finished = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __call__(self, progress: dict) -> str | None:
+        self.components[progress["component"]] = progress
+        if self.cancelled:
+            return "cancelled"
+        # Sub-problem without a draft yet keeps searching until its first solution, otherwise there'd be nothing to save
+        if self.accepted and progress["component"] in self.drafts:
+            return "accepted"
+        return None
+
+    def draft(self, draft: dict):
+        self.drafts[draft["component"]] = draft
+        self.__draft_version += 1
+
+    def summary(self) -> dict:
+        """Sums up progress of sub-problems, objective and bound are known only when every started sub-problem has them."""
+        progress = list(self.components.values())
+        objectives = [p["objective"] for p in progress]
+        bounds = [p["bound"] for p in progress]
+        return {"solutions": sum(p["solutions"] for p in progress),
+                "best_objective": sum(objectives) if objectives and None not in objectives else None,
+                "best_bound": sum(bounds) if bounds and None not in bounds else None,
+                "elapsed": max((p["elapsed"] for p in progress), default=0.0)}
+
+    def draft_summary(self) -> dict:
+        """Merges the latest drafts of sub-problems into one schedule."""
+        drafts = list(self.drafts.values())
+        return {"components": len(drafts),
+                "objective": sum(d["objective"] for d in drafts),
+                "shifts": [{"date": s.date.isoformat(), "employee_id": s.employee_id, "shift_type_id": s.shift_type_id}
+                           for d in drafts for s in d["shifts"]]}
+
+    def write(self):
+        values = dict(self.summary(), heartbeat_at=timezone.now())
+        draft_version = self.__draft_version
+        if draft_version != self.__written_draft_version:
+            values.update(draft=self.draft_summary(), draft_updated_at=timezone.now())
+        GenerationJob.objects.filter(pk=self.job_id).update(**values)
+        self.__written_draft_version = draft_version
+
+        requests = GenerationJob.objects.filter(pk=self.job_id).values('status', 'cancel_requested', 'accept_requested').first() or {}
+        # Job failed as stale while it was still solving is stopped too, its result wouldn't be saved anyway
+        self.cancelled = requests.get('cancel_requested', False) or requests.get('status') != 'RUNNING'
+        self.accepted = requests.get('accept_requested', False)
+
+    def __run(self):
+        try:
+            while not self.__finished.wait(self.interval):
+                self.write()
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.__finished.set()
+        self.__thread.join()
+
+
+def start_job(job_id: int) -> bool:
+    """Marks queued job as running, returns False if the job was cancelled before it started."""
+    now = timezone.now()
+    return GenerationJob.objects.filter(pk=job_id, status='QUEUED').update(status='RUNNING', started_at=now, heartbeat_at=now) > 0
+
+
+def finish_job(job_id: int, job_status: str, result: dict, progress: dict = None):
+    """Saves the final status of the job with diagnostics of the run (everything the algorithm returned except shifts)."""
+    if "data" in result:
+        result = dict(result, shifts=len(result["data"]))
+        del result["data"]
+    # The draft isn't needed anymore, accepted or final schedule has been saved
+    # Job failed as stale keeps its status
+    GenerationJob.objects.filter(pk=job_id, status='RUNNING').update(status=job_status, result=result, finished_at=timezone.now(),
+                                                                     draft=None, **(progress or {}))
+
+
+# Statuses of CP-SAT from the worst one, status of the run is the worst status of its sub-problems
+SOLVER_STATUSES = ['MODEL_INVALID', 'INFEASIBLE', 'UNKNOWN', 'FEASIBLE', 'OPTIMAL']
+
+
+def record_generation_run(year, month, org_id, workplace_list, run_status: str, response: dict, problem: GenerationProblem = None,
+                          job_id: int = None, repair=None, load_time=None, persist_time=None, total_time=None, error='') -> GenerationRun:
+    """Saves GenerationRun with size of the input, phase timings and solver statistics of the run.
+
+    Args:
+        year: year of the schedules
+        month: month of the schedules
+        org_id: id of the organization
+        workplace_list: ids of scheduled workplaces
+        run_status: final status of the run (SUCCESS, FAILED or CANCELLED)
+        response: dictionary returned by the algorithm (empty if it failed before returning)
+        problem: loaded input of the algorithm or None if loading failed
+        job_id: id of GenerationJob of the run
+        repair: changes repaired by the run, None for full month
+        load_time, persist_time, total_time: times of loading the input, writing schedules and the whole run in seconds
+        error: message of the exception which stopped the run
+
+    Returns:
+        saved GenerationRun
+    """
+    components = response.get("components", [])
+
+    def total(key):
+        values = [c[key] for c in components if c.get(key) is not None]
+        return sum(values) if values else None
+
+    penalties = dict()
+    for component in components:
+        for kind, terms in component.get("penalties", {}).items():
+            kind_total = penalties.setdefault(kind, {"count": 0, "cost": 0})
+            kind_total["count"] += terms["count"]
+            kind_total["cost"] += terms["cost"]
+
+    post_process_time = total("post_process_time")
+    if response.get("convert_time") is not None:
+        post_process_time = (post_process_time or 0.0) + response["convert_time"]
+
+    statuses = [c["solver_status"] for c in components if c.get("solver_status") in SOLVER_STATUSES]
+    objectives = [c.get("objective") for c in components]
+    bounds = [c.get("best_bound") for c in components]
+
+    return GenerationRun.objects.create(
+        organization_id=org_id, job_id=job_id, year=year, month=month, mode='REPAIR' if repair else 'FULL', status=run_status,
+        error=error,
+        employees=len(problem.employees) if problem is not None else 0,
+        shift_types=len(problem.shift_types) if problem is not None else 0,
+        days=calendar.monthrange(year, month)[1], workplaces=len(workplace_list),
+        load_time=load_time, context_time=total("context_time"), model_time=total("model_time"), solve_time=total("wall_time"),
+        post_process_time=post_process_time, persist_time=persist_time, total_time=total_time,
+        solver_status=min(statuses, key=SOLVER_STATUSES.index) if statuses else '',
+        conflicts=total("conflicts"), branches=total("branches"), wall_time=max((c["wall_time"] for c in components), default=None),
+        objective=sum(objectives) if objectives and None not in objectives else None,
+        best_bound=sum(bounds) if bounds and None not in bounds else None,
+        solutions=total("solutions") or 0,
+        penalties=penalties if components else None,
+        # Model statistics per constraint family are kept as they were, they are the first thing to look at when a run gets slower
+        components=components or None)
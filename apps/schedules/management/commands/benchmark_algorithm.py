@@ -0,0 +1,36 @@
+import json
+
+from django.core.management import BaseCommand
+
+from apps.schedules.benchmarks import run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Run the scheduling algorithm on synthetic organizations and write a JSON report"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 25, 50, 100, 200, 500], help="Numbers of employees")
+        parser.add_argument('--employees-per-workplace', type=int, default=15, help="Number of employees per workplace")
+        parser.add_argument('--year', type=int, default=2023)
+        parser.add_argument('--month', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--max-time', type=float, default=60.0, help="Time limit of the solver (seconds)")
+        parser.add_argument('--workers', type=int, default=8, help="Number of search workers")
+        parser.add_argument('-o', '--output', default='benchmark.json', help="Output file")
+
+    def handle(self, *args, **options):
+        # The same manual profile for every size, so results of different releases can be compared
+        solver_profile = {"automatic": False, "num_workers": options['workers'], "max_time_in_seconds": options['max_time'],
+                          "relative_gap_limit": 0.0, "presolve_level": "DEFAULT", "stop_after_first_solution": False,
+                          "plateau_window": None, "plateau_delta": 0}
+        report = run_benchmark(options['sizes'], options['employees_per_workplace'], options['year'], options['month'], solver_profile,
+                               options['seed'])
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for instance in report['instances']:
+            self.stdout.write(f"{instance['employees']:4d} employees | {instance['workplaces']:2d} workplaces | variables: {instance['variables']:7d} | "
+                              f"build: {instance['build_time']:7.2f} s | first feasible: {instance['time_to_first_feasible']} s | "
+                              f"objective: {instance['objective']} | peak RSS: {instance['peak_rss_mb']:.0f} MB")
+        self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from apps.schedules.generation import load_generation_problem
+from apps.schedules.snapshots import dump_snapshot, write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Export everything the scheduling algorithm needs for the month to a snapshot file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int)
+        parser.add_argument('month', type=int)
+        parser.add_argument('organization', type=int, help="Id of the organization")
+        parser.add_argument('workplaces', type=int, nargs='+', help="Ids of scheduled workplaces")
+        parser.add_argument('-o', '--output', default='snapshot.json.gz', help="Output file, gzipped if it ends with .gz")
+
+    def handle(self, *args, **options):
+        problem = load_generation_problem(options['year'], options['month'], options['organization'], options['workplaces'])
+        write_snapshot(dump_snapshot(problem), options['output'])
+        self.stdout.write(f"Snapshot with {len(problem.employees)} employees and {len(problem.shift_types)} shift types "
+                          f"written to {options['output']}")
@@ -0,0 +1,37 @@
+import calendar
+import json
+
+from django.core.management import BaseCommand
+
+from apps.schedules.snapshots import load_snapshot, read_snapshot
+from scripts.helpers import choose_solver_preset
+
+
+class Command(BaseCommand):
+    help = "Run the scheduling algorithm on a snapshot file, without reading from or writing to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', help="Snapshot file created by export_snapshot")
+        parser.add_argument('--repair', help="Repair mode as JSON, e.g. '{\"employees\": [1], \"days\": [10]}'")
+        parser.add_argument('--max-time', type=float, help="Override time limit of the solver profile (seconds)")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Number of search workers (default 1, search with more workers isn't deterministic)")
+
+    def handle(self, *args, **options):
+        problem = load_snapshot(read_snapshot(options['snapshot']))
+
+        # Replay always uses a manual profile (automatic one is resolved by the size of the whole month), so the same
+        # parameters are used every time. CP-SAT is deterministic with a single worker only, and even then the search
+        # stopped by the time limit or the plateau window can end at a different solution.
+        profile = problem.solver_profile
+        if not profile or profile.get("automatic", True):
+            profile = choose_solver_preset(len(problem.employees), len(problem.shift_types),
+                                           calendar.monthrange(problem.year, problem.month)[1])
+        profile = dict(profile, automatic=False, num_workers=options['workers'])
+        if options['max_time'] is not None:
+            profile["max_time_in_seconds"] = options['max_time']
+        problem.solver_profile = profile
+
+        response = problem.solve("replay", json.loads(options['repair']) if options['repair'] else None)
+        response["shifts"] = len(response.pop("data", []))
+        self.stdout.write(json.dumps(response, indent=2, default=str))
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.db.models import Count, Min
+from django.utils import timezone
+from prometheus_client.core import GaugeMetricFamily
+
+from apps.schedules.models import GenerationJob
+
+
+class GenerationQueueCollector:
+    """Exports waiting times of generation jobs per lane (full month or repair), read from the database on every scrape,
+    so the values are the same no matter which process (web or huey worker) has started the jobs."""
+
+    def __init__(self, window: timedelta = timedelta(hours=1)):
+        self.window = window
+
+    def families(self):
+        return (GaugeMetricFamily('planimbly_generation_queued_jobs', 'Generation jobs waiting to be started', labels=['lane']),
+                GaugeMetricFamily('planimbly_generation_queue_oldest_wait_seconds', 'Waiting time of the oldest waiting job',
+                                  labels=['lane']),
+                GaugeMetricFamily('planimbly_generation_queue_wait_seconds',
+                                  f'Average queue wait of jobs started within the last {self.window}', labels=['lane']))
+
+    def describe(self):
+        # Without it the registry would call collect (and query the database) when the collector is registered
+        return self.families()
+
+    def collect(self):
+        now = timezone.now()
+        queued, oldest, waits = self.families()
+
+        for lane, _ in GenerationJob.MODE:
+            waiting = GenerationJob.objects.filter(mode=lane, status='QUEUED').aggregate(count=Count('id'), oldest=Min('created_at'))
+            queued.add_metric([lane], waiting['count'])
+            oldest.add_metric([lane], (now - waiting['oldest']).total_seconds() if waiting['oldest'] else 0.0)
+
+            started = [job.queue_wait() for job in GenerationJob.objects.filter(mode=lane, started_at__gte=now - self.window)
+                       .only('created_at', 'started_at', 'status')]
+            waits.add_metric([lane], sum(started) / len(started) if started else 0.0)
+
+        yield queued
+        yield oldest
+        yield waits
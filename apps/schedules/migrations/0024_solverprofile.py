@@ -0,0 +1,28 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0008_message'),
+        ('schedules', '0023_alter_shifttype_color'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolverProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('automatic', models.BooleanField(default=True, verbose_name='Automatyczny dobór parametrów')),
+                ('num_workers', models.IntegerField(default=8, verbose_name='Liczba wątków')),
+                ('max_time_in_seconds', models.FloatField(default=300.0, verbose_name='Limit czasu (s)')),
+                ('relative_gap_limit', models.FloatField(default=0.0, verbose_name='Względna luka optymalności')),
+                ('presolve_level', models.CharField(choices=[('OFF', 'Wyłączony'), ('DEFAULT', 'Domyślny'), ('AGGRESSIVE', 'Rozszerzony')], default='DEFAULT', max_length=16, verbose_name='Poziom presolve')),
+                ('stop_after_first_solution', models.BooleanField(default=False, verbose_name='Zatrzymaj po pierwszym rozwiązaniu')),
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='organizations.organization', verbose_name='Organizacja')),
+            ],
+        ),
+    ]
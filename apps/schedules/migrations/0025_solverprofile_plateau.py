@@ -0,0 +1,23 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0024_solverprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solverprofile',
+            name='plateau_delta',
+            field=models.IntegerField(default=0, verbose_name='Minimalna poprawa celu'),
+        ),
+        migrations.AddField(
+            model_name='solverprofile',
+            name='plateau_window',
+            field=models.FloatField(default=30.0, verbose_name='Okno bez poprawy celu (s)'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('organizations', '0008_message'),
+        ('schedules', '0025_solverprofile_plateau'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='Rok')),
+                ('month', models.IntegerField(verbose_name='Miesiąc')),
+                ('workplaces', models.JSONField(verbose_name='Działy')),
+                ('mode', models.CharField(choices=[('FULL', 'Cały miesiąc'), ('REPAIR', 'Naprawa')], default='FULL', max_length=16, verbose_name='Tryb')),
+                ('repair', models.JSONField(blank=True, null=True, verbose_name='Zmiany do naprawy')),
+                ('status', models.CharField(choices=[('QUEUED', 'W kolejce'), ('RUNNING', 'W trakcie'), ('SUCCESS', 'Zakończone'), ('FAILED', 'Nieudane'), ('CANCELLED', 'Anulowane')], default='QUEUED', max_length=16, verbose_name='Status')),
+                ('task_id', models.CharField(blank=True, default='', max_length=64, verbose_name='Id zadania')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='Zażądano anulowania')),
+                ('solutions', models.IntegerField(default=0, verbose_name='Liczba rozwiązań')),
+                ('best_objective', models.FloatField(blank=True, null=True, verbose_name='Najlepsza wartość celu')),
+                ('best_bound', models.FloatField(blank=True, null=True, verbose_name='Najlepsze ograniczenie')),
+                ('elapsed', models.FloatField(default=0.0, verbose_name='Czas rozwiązywania (s)')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Wynik')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Utworzono')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Rozpoczęto')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Zakończono')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Zlecone przez')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='organizations.organization', verbose_name='Organizacja')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0026_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='accept_requested',
+            field=models.BooleanField(default=False, verbose_name='Zażądano akceptacji'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='draft',
+            field=models.JSONField(blank=True, null=True, verbose_name='Wersja robocza'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='draft_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Aktualizacja wersji roboczej'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0008_message'),
+        ('schedules', '0027_generationjob_draft'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='Rok')),
+                ('month', models.IntegerField(verbose_name='Miesiąc')),
+                ('mode', models.CharField(choices=[('FULL', 'Cały miesiąc'), ('REPAIR', 'Naprawa')], default='FULL', max_length=16, verbose_name='Tryb')),
+                ('status', models.CharField(choices=[('SUCCESS', 'Zakończone'), ('FAILED', 'Nieudane'), ('CANCELLED', 'Anulowane')], max_length=16, verbose_name='Status')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Błąd')),
+                ('employees', models.IntegerField(default=0, verbose_name='Liczba pracowników')),
+                ('shift_types', models.IntegerField(default=0, verbose_name='Liczba typów zmian')),
+                ('days', models.IntegerField(default=0, verbose_name='Liczba dni')),
+                ('workplaces', models.IntegerField(default=0, verbose_name='Liczba działów')),
+                ('load_time', models.FloatField(blank=True, null=True, verbose_name='Wczytywanie danych (s)')),
+                ('context_time', models.FloatField(blank=True, null=True, verbose_name='Budowa kontekstu (s)')),
+                ('model_time', models.FloatField(blank=True, null=True, verbose_name='Budowa modelu (s)')),
+                ('solve_time', models.FloatField(blank=True, null=True, verbose_name='Rozwiązywanie (s)')),
+                ('post_process_time', models.FloatField(blank=True, null=True, verbose_name='Przetwarzanie wyniku (s)')),
+                ('persist_time', models.FloatField(blank=True, null=True, verbose_name='Zapis grafiku (s)')),
+                ('total_time', models.FloatField(blank=True, null=True, verbose_name='Czas całkowity (s)')),
+                ('solver_status', models.CharField(blank=True, default='', max_length=16, verbose_name='Status solvera')),
+                ('conflicts', models.BigIntegerField(blank=True, null=True, verbose_name='Liczba konfliktów')),
+                ('branches', models.BigIntegerField(blank=True, null=True, verbose_name='Liczba rozgałęzień')),
+                ('wall_time', models.FloatField(blank=True, null=True, verbose_name='Czas solvera (s)')),
+                ('objective', models.FloatField(blank=True, null=True, verbose_name='Wartość celu')),
+                ('best_bound', models.FloatField(blank=True, null=True, verbose_name='Najlepsze ograniczenie')),
+                ('solutions', models.IntegerField(default=0, verbose_name='Liczba rozwiązań')),
+                ('penalties', models.JSONField(blank=True, null=True, verbose_name='Kary')),
+                ('components', models.JSONField(blank=True, null=True, verbose_name='Podproblemy')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Utworzono')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='schedules.generationjob', verbose_name='Zadanie')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='organizations.organization', verbose_name='Organizacja')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -1,4 +1,9 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.utils import timezone
 
 from apps.accounts.models import Employee
 from apps.organizations.models import Workplace, Organization
@@ -127,6 +132,192 @@ class Absence(models.Model):
         return self.employee.__str__() + ' ' + str(self.start) + '/' + str(self.end) + ' ' + self.type
 
 
+# Backends which keep values in the memory of one process, a value set by the huey worker or another web server worker
+# isn't seen through them
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def cache_is_shared() -> bool:
+    """Tells if the cache is shared by all processes, so a value set by one of them is seen by the others."""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
 class AlgorithmTask(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     process_pid = models.CharField(max_length=2048)
+
+    # "Generation in progress" flag of the organization is read on every request, so it's kept in the cache. It's
+    # updated by huey signals and by generation jobs when they start and finish, the TTL only guards against a flag
+    # left behind by a worker that died. Expired flag is read from the database again, so a run longer than the TTL
+    # keeps shifts locked. With a process-local cache the flag is always read from the database.
+    RUNNING_CACHE_KEY = 'algorithm_running_{}'
+
+    @classmethod
+    def is_running(cls, org_id) -> bool:
+        if not cache_is_shared():
+            return cls.running_in_database(org_id)
+        running = cache.get(cls.RUNNING_CACHE_KEY.format(org_id))
+        if running is None:
+            running = cls.update_running(org_id)
+        return running
+
+    @classmethod
+    def update_running(cls, org_id) -> bool:
+        """Refreshes cached flag from the database (an organization may have more than one task running)."""
+        running = cls.running_in_database(org_id)
+        cache.set(cls.RUNNING_CACHE_KEY.format(org_id), running, settings.ALGORITHM_RUNNING_TTL)
+        return running
+
+    @classmethod
+    def running_in_database(cls, org_id) -> bool:
+        """Tells if the organization has a task or a job running.
+
+        Jobs run without huey have no task, their own status tells if they are running. Job which stopped sending
+        heartbeats doesn't count, it has lost its worker.
+        """
+        alive_since = timezone.now() - datetime.timedelta(seconds=settings.GENERATION_HEARTBEAT_TIMEOUT)
+        return cls.objects.filter(organization_id=org_id).exists() or \
+            GenerationJob.objects.filter(organization_id=org_id, status='RUNNING', heartbeat_at__gte=alive_since).exists()
+
+
+class SolverProfile(models.Model):
+    PRESOLVE_LEVEL = [
+        ('OFF', 'Wyłączony'),
+        ('DEFAULT', 'Domyślny'),
+        ('AGGRESSIVE', 'Rozszerzony')
+    ]
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, verbose_name="Organizacja")
+    automatic = models.BooleanField(verbose_name="Automatyczny dobór parametrów", default=True)
+    num_workers = models.IntegerField(verbose_name="Liczba wątków", default=8)
+    max_time_in_seconds = models.FloatField(verbose_name="Limit czasu (s)", default=300.0)
+    relative_gap_limit = models.FloatField(verbose_name="Względna luka optymalności", default=0.0)
+    presolve_level = models.CharField(max_length=16, verbose_name="Poziom presolve", choices=PRESOLVE_LEVEL, default='DEFAULT')
+    stop_after_first_solution = models.BooleanField(verbose_name="Zatrzymaj po pierwszym rozwiązaniu", default=False)
+    plateau_window = models.FloatField(verbose_name="Okno bez poprawy celu (s)", default=30.0)
+    plateau_delta = models.IntegerField(verbose_name="Minimalna poprawa celu", default=0)
+
+    def __str__(self):
+        return self.organization.__str__() + ' ' + ('auto' if self.automatic else str(self.max_time_in_seconds) + 's')
+
+
+class GenerationJob(models.Model):
+    STATUS = [
+        ('QUEUED', 'W kolejce'),
+        ('RUNNING', 'W trakcie'),
+        ('SUCCESS', 'Zakończone'),
+        ('FAILED', 'Nieudane'),
+        ('CANCELLED', 'Anulowane')
+    ]
+    MODE = [
+        ('FULL', 'Cały miesiąc'),
+        ('REPAIR', 'Naprawa')
+    ]
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, verbose_name="Organizacja")
+    created_by = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Zlecone przez")
+    year = models.IntegerField(verbose_name='Rok')
+    month = models.IntegerField(verbose_name='Miesiąc')
+    workplaces = models.JSONField(verbose_name="Działy")
+    mode = models.CharField(max_length=16, verbose_name="Tryb", choices=MODE, default='FULL')
+    repair = models.JSONField(verbose_name="Zmiany do naprawy", null=True, blank=True)
+    status = models.CharField(max_length=16, verbose_name="Status", choices=STATUS, default='QUEUED')
+    task_id = models.CharField(max_length=64, verbose_name="Id zadania", blank=True, default='')
+    heartbeat_at = models.DateTimeField(verbose_name="Ostatni sygnał", null=True, blank=True)
+    cancel_requested = models.BooleanField(verbose_name="Zażądano anulowania", default=False)
+
+    # Progress of the search, updated while solving
+    solutions = models.IntegerField(verbose_name="Liczba rozwiązań", default=0)
+    best_objective = models.FloatField(verbose_name="Najlepsza wartość celu", null=True, blank=True)
+    best_bound = models.FloatField(verbose_name="Najlepsze ograniczenie", null=True, blank=True)
+    elapsed = models.FloatField(verbose_name="Czas rozwiązywania (s)", default=0.0)
+
+    # The best schedule found so far, it can be accepted before the search ends
+    draft = models.JSONField(verbose_name="Wersja robocza", null=True, blank=True)
+    draft_updated_at = models.DateTimeField(verbose_name="Aktualizacja wersji roboczej", null=True, blank=True)
+    accept_requested = models.BooleanField(verbose_name="Zażądano akceptacji", default=False)
+
+    result = models.JSONField(verbose_name="Wynik", null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name="Utworzono", auto_now_add=True)
+    started_at = models.DateTimeField(verbose_name="Rozpoczęto", null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name="Zakończono", null=True, blank=True)
+
+    def is_finished(self):
+        return self.status in ('SUCCESS', 'FAILED', 'CANCELLED')
+
+    def is_stale(self, now=None):
+        """Tells if the job has lost its worker: running job stopped sending heartbeats or dispatched one hasn't been started."""
+        now = now or timezone.now()
+        heartbeat_at = self.heartbeat_at or self.started_at or self.created_at
+        if self.status == 'RUNNING':
+            return (now - heartbeat_at).total_seconds() > settings.GENERATION_HEARTBEAT_TIMEOUT
+        if self.status == 'QUEUED' and self.task_id:
+            return (now - heartbeat_at).total_seconds() > settings.GENERATION_DISPATCH_TIMEOUT
+        return False
+
+    def queue_wait(self):
+        """Seconds the job has waited (or is still waiting) for a free slot of its organization."""
+        if self.started_at is not None:
+            return (self.started_at - self.created_at).total_seconds()
+        if self.status == 'QUEUED':
+            return (timezone.now() - self.created_at).total_seconds()
+        return None
+
+    def __str__(self):
+        return self.organization.__str__() + ' ' + str(self.year) + ' ' + str(self.month) + ' ' + self.status
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class GenerationRun(models.Model):
+    """Record of one run of the algorithm, kept to follow its performance over months.
+
+    Phase timings of sub-problems (context, model, solve, post-process) are summed up, sub-problems solved in parallel
+    can take more than total_time together, wall_time is the longest run of CP-SAT. Values of every sub-problem are kept
+    in components.
+    """
+    STATUS = [
+        ('SUCCESS', 'Zakończone'),
+        ('FAILED', 'Nieudane'),
+        ('CANCELLED', 'Anulowane')
+    ]
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, verbose_name="Organizacja")
+    job = models.ForeignKey(GenerationJob, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Zadanie")
+    year = models.IntegerField(verbose_name='Rok')
+    month = models.IntegerField(verbose_name='Miesiąc')
+    mode = models.CharField(max_length=16, verbose_name="Tryb", choices=GenerationJob.MODE, default='FULL')
+    status = models.CharField(max_length=16, verbose_name="Status", choices=STATUS)
+    error = models.TextField(verbose_name="Błąd", blank=True, default='')
+
+    # Size of the input
+    employees = models.IntegerField(verbose_name="Liczba pracowników", default=0)
+    shift_types = models.IntegerField(verbose_name="Liczba typów zmian", default=0)
+    days = models.IntegerField(verbose_name="Liczba dni", default=0)
+    workplaces = models.IntegerField(verbose_name="Liczba działów", default=0)
+
+    # Phase timings in seconds
+    load_time = models.FloatField(verbose_name="Wczytywanie danych (s)", null=True, blank=True)
+    context_time = models.FloatField(verbose_name="Budowa kontekstu (s)", null=True, blank=True)
+    model_time = models.FloatField(verbose_name="Budowa modelu (s)", null=True, blank=True)
+    solve_time = models.FloatField(verbose_name="Rozwiązywanie (s)", null=True, blank=True)
+    post_process_time = models.FloatField(verbose_name="Przetwarzanie wyniku (s)", null=True, blank=True)
+    persist_time = models.FloatField(verbose_name="Zapis grafiku (s)", null=True, blank=True)
+    total_time = models.FloatField(verbose_name="Czas całkowity (s)", null=True, blank=True)
+
+    # Statistics of CP-SAT
+    solver_status = models.CharField(max_length=16, verbose_name="Status solvera", blank=True, default='')
+    conflicts = models.BigIntegerField(verbose_name="Liczba konfliktów", null=True, blank=True)
+    branches = models.BigIntegerField(verbose_name="Liczba rozgałęzień", null=True, blank=True)
+    wall_time = models.FloatField(verbose_name="Czas solvera (s)", null=True, blank=True)
+    objective = models.FloatField(verbose_name="Wartość celu", null=True, blank=True)
+    best_bound = models.FloatField(verbose_name="Najlepsze ograniczenie", null=True, blank=True)
+    solutions = models.IntegerField(verbose_name="Liczba rozwiązań", default=0)
+
+    penalties = models.JSONField(verbose_name="Kary", null=True, blank=True)
+    components = models.JSONField(verbose_name="Podproblemy", null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name="Utworzono", auto_now_add=True)
+
+    def __str__(self):
+        return self.organization.__str__() + ' ' + str(self.year) + ' ' + str(self.month) + ' ' + self.status
+
+    class Meta:
+        ordering = ['-created_at']
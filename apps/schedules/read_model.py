@@ -0,0 +1,248 @@
+"""Cached read model of month schedules.
+
+Month views are built from many rows but change rarely, so their payloads are cached. Every payload is stamped with
+versions of the data it was built from:
+
+- month version of the unit (or employee), bumped by every write path of shifts (editing, generation, admin and
+  cascade deletes through signals of Shift),
+- epoch of the organization, bumped when data shown next to shifts changes (absences, shift types, employees, free
+  days, job times, workplaces).
+
+Versions are part of the cache key and of the ETag, so a bump makes old payloads unreachable and clients revalidate
+a published schedule with a single cache lookup. Versions are bumped only after the transaction has been committed,
+otherwise a concurrent request could cache the old rows under the new version.
+
+Versions only work if every process sees them, so with a process-local cache backend (e.g. several gunicorn workers
+with LocMemCache) nothing is cached and every response is built from the database.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.accounts.models import Employee
+from apps.organizations.models import Message, Workplace, Unit
+from apps.schedules.models import Absence, FreeDay, JobTime, Schedule, Shift, ShiftType, cache_is_shared
+
+VERSION_KEY = 'schedule_version_{}_{}_{}_{}'
+EPOCH_KEY = 'schedule_epoch_{}'
+PAYLOAD_KEY = 'schedule_payload_{}_{}_{}'
+MESSAGE_KEY = 'schedule_message_{}'
+WORKPLACE_UNIT_KEY = 'workplace_unit_{}'
+
+# Set while a write path which invalidates whole months itself changes shifts in bulk
+_bulk_writes = threading.local()
+
+
+def new_version() -> int:
+    # Counter lost from the cache starts from the current time, so it never repeats a version handed out before
+    return time.time_ns()
+
+
+def bump(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), None)
+
+
+def get_versions(keys: list) -> list:
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(list(missing)))
+    return [versions.get(key, 0) for key in keys]
+
+
+def unit_version_key(unit_id, year, month) -> str:
+    return VERSION_KEY.format('unit', unit_id, year, month)
+
+
+def employee_version_key(employee_id, year, month) -> str:
+    return VERSION_KEY.format('employee', employee_id, year, month)
+
+
+def workplace_unit_id(workplace_id):
+    """Unit of the workplace, cached until the workplace is saved again."""
+    unit_id = cache.get(WORKPLACE_UNIT_KEY.format(workplace_id)) if cache_is_shared() else None
+    if unit_id is None:
+        unit_id = Workplace.objects.filter(pk=workplace_id).values_list('workplace_unit_id', flat=True).first()
+        if unit_id is not None and cache_is_shared():
+            cache.set(WORKPLACE_UNIT_KEY.format(workplace_id), unit_id, settings.SCHEDULE_CACHE_TTL)
+    return unit_id
+
+
+def month_version(unit_id, year: int, month: int) -> int | None:
+    """Current version of the month schedule of the unit, None if schedules aren't cached."""
+    if not cache_is_shared():
+        return None
+    return get_versions([unit_version_key(unit_id, year, month)])[0]
+
+
+def invalidate_shifts(year: int, month: int, workplace_ids=(), unit_ids=(), employee_ids=()):
+    """Bumps month versions of units (given directly or by their workplaces) and employees once the transaction commits."""
+    workplace_ids, unit_ids, employee_ids = set(workplace_ids), set(unit_ids), set(employee_ids)
+
+    def on_commit():
+        units = unit_ids | set(Workplace.objects.filter(pk__in=workplace_ids).values_list('workplace_unit_id', flat=True))
+        for unit_id in units:
+            bump(unit_version_key(unit_id, year, month))
+        for employee_id in employee_ids:
+            bump(employee_version_key(employee_id, year, month))
+
+    transaction.on_commit(on_commit)
+
+
+@contextmanager
+def bulk_shift_writes():
+    """Turns off invalidation by signals of single shifts, for write paths which call invalidate_shifts themselves.
+
+    Deleting a queryset of shifts sends a signal for every shift, each of them would bump the same versions again.
+    """
+    _bulk_writes.active = True
+    try:
+        yield
+    finally:
+        _bulk_writes.active = False
+
+
+def invalidate_shift(shift: Shift):
+    # Unit is found right away, the workplace may be deleted by the time the transaction commits (cascade delete)
+    if Shift.schedule.is_cached(shift):
+        workplace_id = shift.schedule.workplace_id
+    else:
+        workplace_id = Schedule.objects.filter(pk=shift.schedule_id).values_list('workplace_id', flat=True).first()
+    unit_id = workplace_unit_id(workplace_id) if workplace_id is not None else None
+    invalidate_shifts(shift.date.year, shift.date.month, unit_ids=[unit_id] if unit_id is not None else [], employee_ids=[shift.employee_id])
+
+
+def invalidate_organization(org_id):
+    if org_id is not None:
+        transaction.on_commit(lambda: bump(EPOCH_KEY.format(org_id)))
+
+
+def cached_response(request, org_id, name, params, version_keys, build, extra: dict = None) -> Response:
+    """Serves payload returned by build from the cache, with ETag and 304 Not Modified support.
+
+    Args:
+        request: request of the view
+        org_id: organization of the data, its epoch is a part of the version
+        name: name of the view
+        params: values identifying the payload within the view (e.g. workplace id, year and month)
+        version_keys: keys of month versions the payload depends on
+        build: function building the payload (plain, picklable data) on a cache miss
+        extra: values added to the payload, which aren't cached (e.g. a message shown only once)
+
+    Returns:
+        response with the payload or empty 304 response when the client has the current version
+    """
+    if not cache_is_shared():
+        payload = build()
+        return Response(data=dict(payload, **extra) if extra is not None else payload, headers={'Cache-Control': 'private, no-cache'})
+
+    versions = get_versions([EPOCH_KEY.format(org_id)] + version_keys)
+    version = '-'.join(str(v) for v in versions)
+    etag = f'"{name}-{"-".join(str(p) for p in params)}-{version}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+    # Response with one-off values can't be revalidated, the client would see them again
+    one_off = extra is not None and any(value is not None for value in extra.values())
+    if one_off:
+        headers = {'Cache-Control': 'no-store'}
+    elif etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    key = PAYLOAD_KEY.format(name, '_'.join(str(p) for p in params), version)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, settings.SCHEDULE_CACHE_TTL)
+    if extra is not None:
+        payload = dict(payload, **extra)
+    return Response(data=payload, headers=headers)
+
+
+def pop_schedule_message(org_id):
+    """Returns content of the pending schedule message of the organization and deletes it.
+
+    Whether there's a message at all is cached, messages are only created by failed generations.
+    """
+    if cache_is_shared() and cache.get(MESSAGE_KEY.format(org_id)) is False:
+        return None
+
+    message = Message.objects.filter(organization_id=org_id).filter(type='SCHEDULE')
+    content = None
+    if message.exists() is True:
+        content = message.first().content
+        message.delete()
+    if cache_is_shared():
+        cache.set(MESSAGE_KEY.format(org_id), False, settings.SCHEDULE_CACHE_TTL)
+    return content
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, **kwargs):
+    if instance.type == 'SCHEDULE':
+        cache.delete(MESSAGE_KEY.format(instance.organization_id))
+
+
+@receiver(pre_save, sender=Shift)
+def shift_changing(sender, instance, raw=False, **kwargs):
+    # Shift moved to another employee or month leaves its old month stale as well
+    if raw or instance.pk is None or getattr(_bulk_writes, 'active', False):
+        return
+    old = Shift.objects.filter(pk=instance.pk).only('date', 'schedule_id', 'employee_id').first()
+    if old is not None and (old.date, old.schedule_id, old.employee_id) != (instance.date, instance.schedule_id, instance.employee_id):
+        invalidate_shift(old)
+
+
+@receiver([post_save, post_delete], sender=Shift)
+def shift_changed(sender, instance, raw=False, **kwargs):
+    # Writes which don't go through the API views (admin, cascade deletes of employees, workplaces and schedules)
+    if raw or getattr(_bulk_writes, 'active', False):
+        return
+    invalidate_shift(instance)
+
+
+@receiver([post_save, post_delete], sender=Absence)
+def absence_changed(sender, instance, **kwargs):
+    invalidate_organization(Employee.objects.filter(pk=instance.employee_id).values_list('user_org_id', flat=True).first())
+
+
+@receiver([post_save, post_delete], sender=FreeDay)
+@receiver([post_save, post_delete], sender=JobTime)
+def organization_data_changed(sender, instance, **kwargs):
+    invalidate_organization(instance.organization_id)
+
+
+@receiver([post_save, post_delete], sender=ShiftType)
+def shift_type_changed(sender, instance, **kwargs):
+    invalidate_organization(Workplace.objects.filter(pk=instance.workplace_id).values_list('workplace_unit__unit_org_id', flat=True).first())
+
+
+@receiver([post_save, post_delete], sender=Workplace)
+def workplace_changed(sender, instance, **kwargs):
+    cache.delete(WORKPLACE_UNIT_KEY.format(instance.pk))
+    invalidate_organization(Unit.objects.filter(pk=instance.workplace_unit_id).values_list('unit_org_id', flat=True).first())
+
+
+@receiver([post_save, post_delete], sender=Unit)
+def unit_changed(sender, instance, **kwargs):
+    invalidate_organization(instance.unit_org_id)
+
+
+@receiver([post_save, post_delete], sender=Employee)
+def employee_changed(sender, instance, update_fields=None, **kwargs):
+    # Logging in only updates last_login, which isn't shown in schedules
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_organization(instance.user_org_id)
@@ -2,7 +2,7 @@ import datetime
 
 from rest_framework import serializers
 
-from .models import ShiftType, Preference, Absence, Assignment, JobTime, FreeDay
+from .models import ShiftType, Preference, Absence, Assignment, JobTime, FreeDay, GenerationJob, GenerationRun
 from ..accounts.models import Employee
 from ..accounts.serializers import EmployeeSerializer
 
@@ -14,6 +14,27 @@ class JobTimeSerializer(serializers.ModelSerializer):
                   'july', 'august', 'september', 'october', 'november', 'december']
 
 
+class GenerationJobSerializer(serializers.ModelSerializer):
+    queue_wait = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = GenerationJob
+        fields = ['id', 'year', 'month', 'workplaces', 'mode', 'status', 'cancel_requested', 'solutions', 'best_objective',
+                  'best_bound', 'elapsed', 'draft_updated_at', 'accept_requested', 'queue_wait', 'created_at', 'started_at',
+                  'finished_at']
+        read_only_fields = fields
+
+
+class GenerationRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GenerationRun
+        fields = ['id', 'job', 'year', 'month', 'mode', 'status', 'error', 'employees', 'shift_types', 'days', 'workplaces',
+                  'load_time', 'context_time', 'model_time', 'solve_time', 'post_process_time', 'persist_time', 'total_time',
+                  'solver_status', 'conflicts', 'branches', 'wall_time', 'objective', 'best_bound', 'solutions', 'penalties',
+                  'created_at']
+        read_only_fields = fields
+
+
 class FreeDaySerializer(serializers.ModelSerializer):
     class Meta:
         model = FreeDay
@@ -0,0 +1,134 @@
+import datetime
+import gzip
+import json
+
+from apps.accounts.models import Employee
+from apps.organizations.models import Unit, Workplace, WorkplaceClosing
+from apps.schedules.generation import GenerationProblem
+from apps.schedules.models import ShiftType, Schedule, Shift, Preference, Absence, Assignment
+
+SNAPSHOT_VERSION = 1
+
+
+def dump_snapshot(problem: GenerationProblem) -> dict:
+    """Turns loaded generation problem into a JSON serializable snapshot.
+
+    The snapshot contains everything the algorithm needs and nothing more, personal data of employees is left out.
+
+    Args:
+        problem: GenerationProblem object
+
+    Returns:
+        dictionary with the snapshot
+    """
+    workplaces = {s.workplace_id: s.workplace for s in problem.schedule_dict.values()}
+
+    def dump_shifts(shifts):
+        return [{"date": s.date.isoformat(), "employee": s.employee_id, "shift_type": s.shift_type_id}
+                for d_shifts in shifts.values() for s in d_shifts]
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "year": problem.year,
+        "month": problem.month,
+        "job_time": problem.job_time,
+        "solver_profile": problem.solver_profile,
+        "workplaces": [{"id": wp.id, "name": wp.name, "unit": wp.workplace_unit.name} for wp in workplaces.values()],
+        "shift_types": [{"id": st.id, "workplace": st.workplace_id, "name": st.name, "shift_code": st.shift_code,
+                         "hour_start": st.hour_start.isoformat(), "hour_end": st.hour_end.isoformat(), "demand": st.demand,
+                         "active_days": st.active_days, "is_used": st.is_used, "is_archive": st.is_archive}
+                        for st in problem.shift_types],
+        "employees": [{"id": e.id, "job_time": e.job_time,
+                       "workplaces": [wp for wp, employees in problem.emp_for_workplaces.items() if e in employees]}
+                      for e in problem.employees],
+        "preferences": [{"employee": p.employee_id, "shift_type": p.shift_type_id, "active_days": p.active_days}
+                        for preferences in problem.emp_preferences.values() for p in preferences],
+        "absences": [{"employee": a.employee_id, "start": a.start.isoformat(), "end": a.end.isoformat(), "type": a.type,
+                      "hours_number": a.hours_number}
+                     for absences in problem.emp_absences.values() for a in absences],
+        "assignments": [{"employee": a.employee_id, "shift_type": a.shift_type_id, "negative_flag": a.negative_flag,
+                         "start": a.start.isoformat() if a.start else None, "end": a.end.isoformat() if a.end else None}
+                        for assignments in problem.emp_assignments.values() for a in assignments],
+        "closings": [{"workplace": c.workplace_id, "start": c.start.isoformat(), "end": c.end.isoformat()}
+                     for closings in problem.work_for_workplace_closing.values() for c in closings],
+        "shifts_before": dump_shifts(problem.shifts_before),
+        "shifts_after": dump_shifts(problem.shifts_after),
+        "shifts_hint": dump_shifts(problem.shifts_hint),
+    }
+
+
+def load_snapshot(snapshot: dict) -> GenerationProblem:
+    """Turns snapshot into generation problem with unsaved model instances, the database isn't used.
+
+    Args:
+        snapshot: dictionary with the snapshot
+
+    Returns:
+        GenerationProblem object
+    """
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {snapshot.get('version')} (expected {SNAPSHOT_VERSION})")
+
+    def date(value):
+        return datetime.date.fromisoformat(value) if value else None
+
+    workplace_list = [wp["id"] for wp in snapshot["workplaces"]]
+    problem = GenerationProblem(snapshot["year"], snapshot["month"], None, workplace_list)
+    problem.job_time = snapshot["job_time"]
+    problem.solver_profile = snapshot["solver_profile"]
+
+    workplaces = {wp["id"]: Workplace(id=wp["id"], name=wp["name"], workplace_unit=Unit(name=wp["unit"])) for wp in snapshot["workplaces"]}
+    for wp in workplaces.values():
+        problem.schedule_dict[wp.id] = Schedule(year=problem.year, month=problem.month, workplace=wp)
+        problem.emp_for_workplaces[wp.id] = []
+        problem.work_for_workplace_closing[wp.id] = []
+
+    shift_types = {st["id"]: ShiftType(id=st["id"], workplace=workplaces[st["workplace"]], name=st["name"], shift_code=st["shift_code"],
+                                       hour_start=datetime.time.fromisoformat(st["hour_start"]),
+                                       hour_end=datetime.time.fromisoformat(st["hour_end"]), demand=st["demand"],
+                                       active_days=st["active_days"], is_used=st["is_used"], is_archive=st["is_archive"])
+                   for st in snapshot["shift_types"]}
+    problem.shift_types = list(shift_types.values())
+
+    for e in snapshot["employees"]:
+        employee = Employee(id=e["id"], username=f"employee_{e['id']}", first_name="Employee", last_name=str(e["id"]), job_time=e["job_time"])
+        problem.employees.append(employee)
+        for wp in e["workplaces"]:
+            problem.emp_for_workplaces[wp].append(employee)
+
+    # Preferences and assignments may reference shift types which aren't scheduled, these are kept as bare objects
+    def shift_type(st_id):
+        return shift_types.get(st_id) or ShiftType(id=st_id)
+
+    for p in snapshot["preferences"]:
+        problem.emp_preferences.setdefault(p["employee"], []).append(
+            Preference(employee_id=p["employee"], shift_type=shift_type(p["shift_type"]), active_days=p["active_days"]))
+    for a in snapshot["absences"]:
+        problem.emp_absences.setdefault(a["employee"], []).append(
+            Absence(employee_id=a["employee"], start=date(a["start"]), end=date(a["end"]), type=a["type"], hours_number=a["hours_number"]))
+    for a in snapshot["assignments"]:
+        problem.emp_assignments.setdefault(a["employee"], []).append(
+            Assignment(employee_id=a["employee"], shift_type=shift_type(a["shift_type"]), negative_flag=a["negative_flag"],
+                       start=date(a["start"]), end=date(a["end"])))
+    for c in snapshot["closings"]:
+        problem.work_for_workplace_closing[c["workplace"]].append(
+            WorkplaceClosing(workplace=workplaces[c["workplace"]], start=date(c["start"]), end=date(c["end"])))
+
+    for key in ("shifts_before", "shifts_after", "shifts_hint"):
+        shifts = getattr(problem, key)
+        for s in snapshot[key]:
+            shifts.setdefault(date(s["date"]), []).append(Shift(date=date(s["date"]), employee_id=s["employee"], shift_type_id=s["shift_type"]))
+
+    return problem
+
+
+def write_snapshot(snapshot: dict, path: str):
+    """Writes snapshot to a JSON file, gzipped if the path ends with .gz"""
+    with (gzip.open(path, "wt") if path.endswith(".gz") else open(path, "w")) as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+
+
+def read_snapshot(path: str) -> dict:
+    """Reads snapshot from a JSON file, gzipped if the path ends with .gz"""
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as f:
+        return json.load(f)
@@ -1,132 +1,198 @@
-import calendar
-import datetime
+import queue
+import threading
+import time
 
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
 from huey import signals
 from huey.contrib import djhuey as huey
-from huey.contrib.djhuey import db_task
+from huey.contrib.djhuey import db_task, HUEY
+from loguru import logger
 
-import scripts.run_algorithm
-from apps.accounts.models import Employee
-from apps.organizations.models import Workplace, WorkplaceClosing, Message, Organization
-from apps.schedules.models import ShiftType, Schedule, Preference, Absence, Assignment, JobTime, AlgorithmTask, Shift
+from apps.organizations.models import Message, Organization
+from apps.schedules.generation import replace_month_schedules, load_generation_problem, JobProgress, start_job, finish_job, \
+    record_generation_run
+from apps.schedules.models import AlgorithmTask, GenerationJob
+
+# Small repair jobs take the fast lane, they are dispatched before full month jobs and have higher priority in huey
+GENERATION_LANES = ['REPAIR', 'FULL']
+GENERATION_PRIORITY = {'REPAIR': 10, 'FULL': 0}
+
+# Without huey, jobs dispatched by this process are run one by one by a single worker thread
+_local_jobs = queue.Queue()
+_local_worker = None
+_local_worker_lock = threading.Lock()
 
 
 @db_task()
-def run_algorithm(year, month, org_id, workplace_list, username):
-    workplace_query = Workplace.objects.filter(id__in=workplace_list)
-    schedule_dict = dict()
-
-    for workplace in workplace_query:
-        schedule = Schedule(year=year, month=month,
-                            workplace=workplace)
-        # schedule.save()
-        schedule_dict.setdefault(workplace.id, schedule)
-
-    shiftType_list = list(
-        ShiftType.objects.filter(workplace_id__in=workplace_list).filter(is_used=True).filter(is_archive=False))
-
-    emp_for_workplaces = {}
-
-    for work_id in workplace_list:
-        emp_for_workplaces[work_id] = Employee.objects.filter(
-            user_workplace__in=Workplace.objects.filter(id__in=[work_id])).exclude(is_supervisor=True).exclude(
-            groups__name='supervisor').exclude(is_superuser=True).distinct().order_by('id')
-
-    employee_list = Employee.objects.filter(user_workplace__in=workplace_query).distinct().order_by('id')
-    preferences = Preference.objects.filter(employee__in=employee_list)
-
-    # Sprawdzamy pierwszą datę w miesiącu i ostatnią
-    first_day = datetime.date(int(year), int(month), 1)
-    last_day = datetime.date(int(year), int(month), calendar.monthrange(int(year), int(month))[1])
-
-    absences = Absence.objects.filter(employee__in=employee_list).filter(start__lte=last_day).filter(
-        end__gte=first_day)
-    emp_preferences = {}
-    for preference in preferences:
-        emp_preferences.setdefault(preference.employee.id, []).append(preference)
-
-    emp_absences = {}
-    for absence in absences:
-        emp_absences.setdefault(absence.employee.id, []).append(absence)
-
-    term_assignments = Assignment.objects.filter(employee__in=employee_list).filter(start__lte=last_day).filter(
-        end__gte=first_day)
-    general_assignments = Assignment.objects.filter(employee__in=employee_list).filter(start=None).filter(
-        end=None)
-
-    emp_assignments = {}
-    for assignment in term_assignments:
-        emp_assignments.setdefault(assignment.employee.id, []).append(assignment)
-
-    for assignment in general_assignments:
-        emp_assignments.setdefault(assignment.employee.id, []).append(assignment)
-
-    work_for_workplace_closing = {}
-    for work_id in workplace_list:
-        work_for_workplace_closing[work_id] = WorkplaceClosing.objects.filter(start__lte=last_day).filter(
-            end__gte=first_day).filter(workplace_id=work_id)
-
-    jobtime = JobTime.objects.filter(year=int(year)).values_list(calendar.month_name[month].lower(),
-                                                                 flat=True).first()
-
-    seven_before = first_day - datetime.timedelta(days=7)
-    seven_after = last_day + datetime.timedelta(days=7)
-
-    shifts_before = {}
-    shifts_after = {}
-
-    shifts_b = Shift.objects.filter(date__gte=seven_before).filter(date__lt=first_day).filter(
-        schedule__workplace_id__in=workplace_list).order_by('date')
-    shifts_a = Shift.objects.filter(date__gt=last_day).filter(date__lte=seven_after).filter(
-        schedule__workplace_id__in=workplace_list).order_by('date')
-
-    for shift in shifts_b:
-        shifts_before.setdefault(shift.date, []).append(shift)
-    for shift in shifts_a:
-        shifts_after.setdefault(shift.date, []).append(shift)
-
-    response = scripts.run_algorithm.main_algorithm(schedule_dict, employee_list, shiftType_list, year, month,
-                                                    emp_for_workplaces, emp_preferences, emp_absences,
-                                                    emp_assignments, jobtime, work_for_workplace_closing,
-                                                    shifts_before, shifts_after, username)
-    if response.get('status'):
-        for workplace in workplace_query:
-            old_schedule = Schedule.objects.filter(year=year).filter(month=month).filter(
-                workplace=workplace).first()
-            if old_schedule is not None:
-                old_schedule.delete()
-        for schedule in schedule_dict:
-            schedule_dict[schedule].save()
-        data = response.get('data')
-        for shift in data:
-            shift.save()
-    else:
+def run_algorithm(year, month, org_id, workplace_list, username, repair=None, job_id=None):
+    try:
+        _run_algorithm(year, month, org_id, workplace_list, username, repair, job_id)
+    finally:
+        # Whatever happened, the job doesn't take the slot of its organization anymore
+        if job_id is not None:
+            AlgorithmTask.update_running(org_id)
+            dispatch_generation_jobs(org_id)
+
+
+def _run_algorithm(year, month, org_id, workplace_list, username, repair=None, job_id=None):
+    if job_id is not None:
+        if not start_job(job_id):
+            return
+        # Job run without huey has no AlgorithmTask, shifts of the organization are locked by its status
+        AlgorithmTask.update_running(org_id)
+
+    start = time.time()
+    problem, load_time = None, None
+    progress = JobProgress(job_id) if job_id is not None else None
+    try:
+        problem = load_generation_problem(year, month, org_id, workplace_list)
+        load_time = time.time() - start
+        response = problem.solve(username, repair, progress, progress.draft if progress is not None else None)
+    except Exception as e:
+        if job_id is not None:
+            finish_job(job_id, 'FAILED', {'error': str(e)})
+        record_generation_run(year, month, org_id, workplace_list, 'FAILED', {}, problem, job_id, repair, load_time,
+                              total_time=time.time() - start, error=str(e))
+        raise
+    finally:
+        if progress is not None:
+            progress.stop()
+
+    # Cancelled job leaves the current schedules untouched, accepted draft is saved as any other result
+    cancelled = progress is not None and progress.cancelled
+    if not cancelled and response.get('status'):
+        response['write_time'] = replace_month_schedules(year, month, problem.schedule_dict, response.get('data'))
+    elif not cancelled:
         org = Organization.objects.get(id=org_id)
         message = Message(organization=org, content="Nie udało się wygenerować nowego grafiku", type='SCHEDULE')
         message.save()
-        '''for workplace in workplace_query:
-            old_schedule = Schedule.objects.filter(year=year).filter(month=month).filter(
-                workplace=workplace).first()
-            if old_schedule is not None:
-                old_schedule.message = "Nie udało się wygenerować nowego grafiku"
-                old_schedule.save()
-            else:
-                schedule = schedule_dict[workplace.id]
-                schedule.message = "Nie udało się wygenerować nowego grafiku"
-                schedule.save()'''
-    return
+
+    run_status = 'CANCELLED' if cancelled else 'SUCCESS' if response.get('status') else 'FAILED'
+    record_generation_run(year, month, org_id, workplace_list, run_status, response, problem, job_id, repair, load_time,
+                          response.get('write_time'), time.time() - start)
+    if job_id is not None:
+        finish_job(job_id, run_status, response, progress.summary())
+
+
+def submit_generation_job(org_id, employee, year, month, workplace_list, repair=None):
+    """Creates generation job and dispatches it if its organization has a free slot.
+
+    Identical request which is still waiting (same month, workplaces and repair) isn't queued again, the waiting job
+    is returned instead.
+
+    Returns:
+        tuple of the job and flag telling if the job has been created
+    """
+    workplace_list = sorted(int(wp) for wp in workplace_list)
+    mode = 'REPAIR' if repair else 'FULL'
+    with transaction.atomic():
+        # Locking the organization serializes submitting and dispatching jobs of one organization
+        Organization.objects.select_for_update().filter(pk=org_id).first()
+        for job in GenerationJob.objects.filter(organization_id=org_id, year=year, month=month, mode=mode, status='QUEUED'):
+            if job.workplaces == workplace_list and job.repair == repair and not job.is_stale():
+                return job, False
+
+        job = GenerationJob.objects.create(organization_id=org_id, created_by=employee, year=year, month=month,
+                                           workplaces=workplace_list, mode=mode, repair=repair)
+
+    dispatch_generation_jobs(org_id)
+    job.refresh_from_db()
+    return job, True
+
+
+def dispatch_generation_jobs(org_id):
+    """Starts waiting jobs of the organization as long as it has fewer than GENERATION_MAX_RUNNING_PER_ORG active ones.
+
+    Jobs wait in the database, not in huey, so one organization can't fill the queue and starve the others. The
+    repair lane goes first, jobs of one lane are started in order of creation. Jobs which have lost their worker
+    (crashed huey consumer, restarted web server) are failed first, so they don't take slots forever.
+    """
+    dispatched, stale = [], []
+    with transaction.atomic():
+        Organization.objects.select_for_update().filter(pk=org_id).first()
+        jobs = GenerationJob.objects.filter(organization_id=org_id).exclude(status__in=['SUCCESS', 'FAILED', 'CANCELLED'])
+
+        now = timezone.now()
+        stale = [job for job in jobs if job.is_stale(now)]
+        GenerationJob.objects.filter(pk__in=[job.pk for job in stale]).update(
+            status='FAILED', finished_at=now, draft=None, result={'error': 'Job stopped responding'})
+        jobs = [job for job in jobs if job not in stale]
+
+        active = sum(1 for job in jobs if job.status == 'RUNNING' or job.task_id)
+        waiting = sorted((job for job in jobs if job.status == 'QUEUED' and not job.task_id),
+                         key=lambda job: (GENERATION_LANES.index(job.mode), job.created_at))
+
+        for job in waiting[:max(0, settings.GENERATION_MAX_RUNNING_PER_ORG - active)]:
+            # Task id marks the job as dispatched, the real one is known after enqueueing
+            job.task_id = 'dispatched'
+            job.heartbeat_at = now
+            job.save(update_fields=['task_id', 'heartbeat_at'])
+            dispatched.append(job)
+
+    # Task of a job which has been failed could still be started later, it would stop at start_job anyway
+    for job in stale:
+        if settings.USE_HUEY and job.task_id not in ('dispatched', 'thread'):
+            HUEY.revoke_by_id(job.task_id)
+
+    for i, job in enumerate(dispatched):
+        try:
+            start_generation_job(job)
+        except Exception:
+            # Jobs which couldn't be enqueued wait for the next dispatch instead of taking slots of their organization
+            GenerationJob.objects.filter(pk__in=[job.pk for job in dispatched[i:]]).update(task_id='', heartbeat_at=None)
+            raise
+    return dispatched
+
+
+def start_generation_job(job):
+    """Runs generation job on huey or, if huey isn't used, on the worker thread of this process.
+
+    Requests are never blocked by the solver and jobs started by one process don't run at the same time. The worker
+    thread only loads the data and saves the result, models are built and solved by child processes (see main_algorithm).
+    """
+    username = job.created_by.username if job.created_by_id else ''
+    args = (job.year, job.month, job.organization_id, job.workplaces, username, job.repair, job.pk)
+    if settings.USE_HUEY:
+        job.task_id = run_algorithm(*args, priority=GENERATION_PRIORITY[job.mode]).id
+        job.save(update_fields=['task_id'])
+    else:
+        job.task_id = 'thread'
+        job.save(update_fields=['task_id'])
+        _start_local_worker()
+        _local_jobs.put(args)
+
+
+def _start_local_worker():
+    global _local_worker
+    with _local_worker_lock:
+        if _local_worker is None or not _local_worker.is_alive():
+            _local_worker = threading.Thread(target=_run_local_jobs, daemon=True)
+            _local_worker.start()
+
+
+def _run_local_jobs():
+    while True:
+        args = _local_jobs.get()
+        try:
+            run_algorithm.call_local(*args)
+        except Exception:
+            # The job has already been marked as failed, the worker goes on with the next one
+            logger.exception(f"Generation job {args[-1]} failed")
+        finally:
+            connection.close()
 
 
 @huey.signal(signals.SIGNAL_ERROR, signals.SIGNAL_COMPLETE, signals.SIGNAL_CANCELED)
 def task_ended_handler(signal, task, exc=None):
-    user_org_id = Employee.objects.get(pk=task.args[2]).user_org_id
-    a_task = AlgorithmTask.objects.get(organization_id=user_org_id, process_pid=task.id)
-    if a_task:
-        a_task.delete()
+    # run_algorithm(year, month, org_id, ...)
+    AlgorithmTask.objects.filter(organization_id=task.args[2], process_pid=task.id).delete()
+    AlgorithmTask.update_running(task.args[2])
 
 
 @huey.signal(signals.SIGNAL_EXECUTING)
 def task_ended(signal, task):
-    user_org_id = Employee.objects.get(pk=task.args[2]).user_org_id
-    a_task = AlgorithmTask(organization_id=user_org_id, process_pid=task.id)
+    a_task = AlgorithmTask(organization_id=task.args[2], process_pid=task.id)
     a_task.save()
+    AlgorithmTask.update_running(task.args[2])
@@ -1 +1,444 @@
-# Create your tests here.
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import Employee
+from apps.organizations.models import Organization, Unit, Workplace, WorkplaceClosing, Message
+from apps.schedules.generation import load_generation_problem, record_generation_run, replace_month_schedules
+from apps.schedules.models import ShiftType, Schedule, Shift, Preference, Absence, Assignment, JobTime, SolverProfile, GenerationJob, \
+    AlgorithmTask, GenerationRun
+from apps.schedules.tasks import submit_generation_job, dispatch_generation_jobs, run_algorithm
+from apps.schedules.read_model import month_version, unit_version_key, employee_version_key, get_versions
+from apps.schedules.snapshots import dump_snapshot, load_snapshot
+from apps.schedules.views import unit_statistics, schedule_report
+
+
+# Read model and the running flag need a cache shared by processes, unlike the default LocMemCache of tests
+SHARED_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                            'LOCATION': os.path.join(tempfile.gettempdir(), 'planimbly-tests-cache')}}
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class LoadGenerationProblemTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Organizacja")
+        unit = Unit.objects.create(name="Jednostka", unit_org=cls.org)
+        cls.workplaces = [Workplace.objects.create(name=f"Dział {i}", workplace_unit=unit) for i in range(2)]
+        JobTime.objects.create(organization=cls.org, year=2022, **{m: 160 for m in (
+            'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december')})
+        SolverProfile.objects.create(organization=cls.org)
+
+        for wp in cls.workplaces:
+            shift_types = [ShiftType.objects.create(hour_start=datetime.time(h), hour_end=datetime.time((h + 8) % 24), name=f"Zmiana {h}",
+                                                    shift_code=f"Z{h}", workplace=wp, active_days="1111111", is_used=True)
+                           for h in (6, 14, 22)]
+            WorkplaceClosing.objects.create(workplace=wp, start=datetime.date(2022, 10, 10), end=datetime.date(2022, 10, 11))
+            old_schedule = Schedule.objects.create(year=2022, month=9, workplace=wp)
+            schedule = Schedule.objects.create(year=2022, month=10, workplace=wp)
+
+            for i in range(5):
+                e = Employee.objects.create(username=f"{wp.id}_{i}", email=f"{wp.id}_{i}@example.com", user_org=cls.org)
+                e.user_workplace.add(wp)
+                Preference.objects.create(employee=e, shift_type=shift_types[0], active_days="1111100")
+                Absence.objects.create(employee=e, start=datetime.date(2022, 10, 3), end=datetime.date(2022, 10, 4), hours_number=16)
+                Assignment.objects.create(employee=e, shift_type=shift_types[1], negative_flag=True)
+                Assignment.objects.create(employee=e, shift_type=shift_types[2], start=datetime.date(2022, 10, 20), end=datetime.date(2022, 10, 21))
+                Shift.objects.create(date=datetime.date(2022, 9, 28), schedule=old_schedule, employee=e, shift_type=shift_types[0])
+                Shift.objects.create(date=datetime.date(2022, 10, 5), schedule=schedule, employee=e, shift_type=shift_types[1])
+
+    def test_number_of_queries(self):
+        with self.assertNumQueries(11):
+            problem = load_generation_problem(2022, 10, self.org.id, [wp.id for wp in self.workplaces])
+
+        # Related objects used by the algorithm are already loaded
+        with self.assertNumQueries(0):
+            for st in problem.shift_types:
+                str(st.workplace)
+            for emp_dict in (problem.emp_preferences, problem.emp_assignments):
+                for objects in emp_dict.values():
+                    [o.shift_type.id for o in objects]
+
+        # Exporting a snapshot doesn't need any more queries either
+        with self.assertNumQueries(0):
+            dump_snapshot(problem)
+
+        self.assertEqual(len(problem.employees), 10)
+        self.assertEqual({wp: len(employees) for wp, employees in problem.emp_for_workplaces.items()},
+                         {wp.id: 5 for wp in self.workplaces})
+        self.assertEqual(sum(len(a) for a in problem.emp_assignments.values()), 20)
+        self.assertEqual(problem.job_time, 160)
+        self.assertEqual(list(problem.shifts_before), [datetime.date(2022, 9, 28)])
+        self.assertEqual(list(problem.shifts_hint), [datetime.date(2022, 10, 5)])
+        self.assertIsNotNone(problem.solver_profile)
+
+    def test_supervisors_and_other_organizations_are_left_out(self):
+        """Supervisors aren't scheduled (the huey path used to pass them to the algorithm) and job time is the organization's own."""
+        other_org = Organization.objects.create(name="Inna organizacja")
+        JobTime.objects.create(organization=other_org, year=2022, **{m: 100 for m in (
+            'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december')})
+        group = Group.objects.create(name='supervisor')
+        supervisors = [Employee.objects.create(username="supervisor", email="s@example.com", user_org=self.org, is_supervisor=True),
+                       Employee.objects.create(username="group", email="g@example.com", user_org=self.org),
+                       Employee.objects.create(username="admin", email="a@example.com", user_org=self.org, is_superuser=True)]
+        supervisors[1].groups.add(group)
+        for e in supervisors:
+            e.user_workplace.add(self.workplaces[0])
+
+        problem = load_generation_problem(2022, 10, self.org.id, [wp.id for wp in self.workplaces])
+
+        employees = set(Employee.objects.filter(user_workplace__in=self.workplaces).exclude(pk__in=[e.pk for e in supervisors]))
+        self.assertEqual(set(problem.employees), employees)
+        self.assertEqual(set(problem.emp_for_workplaces[self.workplaces[0].id]), employees & set(self.workplaces[0].employee_set.all()))
+        self.assertEqual(problem.job_time, 160)
+
+    def test_snapshot_round_trip(self):
+        snapshot = dump_snapshot(load_generation_problem(2022, 10, self.org.id, [wp.id for wp in self.workplaces]))
+
+        # Snapshot goes through JSON, the problem loaded from it doesn't touch the database
+        with self.assertNumQueries(0):
+            problem = load_snapshot(json.loads(json.dumps(snapshot)))
+            self.assertEqual(dump_snapshot(problem), snapshot)
+
+        self.assertEqual(len(problem.employees), 10)
+        self.assertEqual(sum(len(a) for a in problem.emp_assignments.values()), 20)
+        self.assertEqual(list(problem.shifts_hint), [datetime.date(2022, 10, 5)])
+
+
+@override_settings(GENERATION_MAX_RUNNING_PER_ORG=1)
+@mock.patch('apps.schedules.tasks.start_generation_job')
+class GenerationQueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.orgs = [Organization.objects.create(name=f"Organizacja {i}") for i in range(2)]
+
+    def test_identical_waiting_request_is_not_queued_again(self, start):
+        running, _ = submit_generation_job(self.orgs[0].id, None, 2022, 10, [2, 1])
+        self.assertEqual(submit_generation_job(self.orgs[0].id, None, 2022, 10, [1, 2]), (running, False))
+
+        # Once the job has started its input is read, so the same request is queued again
+        GenerationJob.objects.filter(pk=running.pk).update(status='RUNNING')
+        waiting, created = submit_generation_job(self.orgs[0].id, None, 2022, 10, [1, 2])
+        duplicate, duplicate_created = submit_generation_job(self.orgs[0].id, None, 2022, 10, ['2', '1'])
+
+        self.assertTrue(created)
+        self.assertNotEqual(running, waiting)
+        self.assertFalse(duplicate_created)
+        self.assertEqual(duplicate, waiting)
+        self.assertEqual(GenerationJob.objects.count(), 2)
+
+    def test_organization_cap_and_lanes(self, start):
+        full, _ = submit_generation_job(self.orgs[0].id, None, 2022, 10, [1])
+        next_full, _ = submit_generation_job(self.orgs[0].id, None, 2022, 11, [1])
+        repair, _ = submit_generation_job(self.orgs[0].id, None, 2022, 10, [1], {'employees': [1], 'days': [3]})
+        other_org, _ = submit_generation_job(self.orgs[1].id, None, 2022, 10, [1])
+
+        # Only the first job of the organization has been started, the other organization isn't blocked by it
+        self.assertEqual([call.args[0].pk for call in start.call_args_list], [full.pk, other_org.pk])
+
+        # Repair job jumps ahead of the full month job which was submitted before it
+        GenerationJob.objects.filter(pk=full.pk).update(status='SUCCESS')
+        self.assertEqual([job.pk for job in dispatch_generation_jobs(self.orgs[0].id)], [repair.pk])
+        self.assertEqual(dispatch_generation_jobs(self.orgs[0].id), [])
+
+        GenerationJob.objects.filter(pk=repair.pk).update(status='FAILED')
+        self.assertEqual([job.pk for job in dispatch_generation_jobs(self.orgs[0].id)], [next_full.pk])
+
+    def test_stale_job_frees_its_slot(self, start):
+        running, _ = submit_generation_job(self.orgs[0].id, None, 2022, 10, [1])
+        waiting, _ = submit_generation_job(self.orgs[0].id, None, 2022, 11, [1])
+        GenerationJob.objects.filter(pk=running.pk).update(status='RUNNING', heartbeat_at=timezone.now() - datetime.timedelta(minutes=30))
+
+        # Worker of the running job has died, the waiting job takes its slot
+        self.assertEqual([job.pk for job in dispatch_generation_jobs(self.orgs[0].id)], [waiting.pk])
+        self.assertEqual(GenerationJob.objects.get(pk=running.pk).status, 'FAILED')
+
+    def test_job_which_could_not_be_enqueued_waits(self, start):
+        start.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            submit_generation_job(self.orgs[0].id, None, 2022, 10, [1])
+
+        job = GenerationJob.objects.get()
+        self.assertEqual((job.status, job.task_id), ('QUEUED', ''))
+        start.side_effect = None
+        self.assertEqual([j.pk for j in dispatch_generation_jobs(self.orgs[0].id)], [job.pk])
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class AlgorithmRunningFlagTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Organizacja")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_flag_is_read_from_cache(self):
+        with self.assertNumQueries(2):
+            self.assertFalse(AlgorithmTask.is_running(self.org.id))
+            self.assertFalse(AlgorithmTask.is_running(self.org.id))
+
+        AlgorithmTask.objects.create(organization=self.org, process_pid='1')
+        AlgorithmTask.update_running(self.org.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(AlgorithmTask.is_running(self.org.id))
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_process_local_cache_is_not_used(self):
+        # Flag set by the huey worker or another web server worker wouldn't be seen in the cache of this process
+        AlgorithmTask.update_running(self.org.id)
+        AlgorithmTask.objects.create(organization=self.org, process_pid='1')
+        with self.assertNumQueries(1):
+            self.assertTrue(AlgorithmTask.is_running(self.org.id))
+
+    def test_job_run_without_huey_sets_flag(self):
+        job = GenerationJob.objects.create(organization=self.org, year=2022, month=10, workplaces=[1], task_id='thread')
+
+        running = []
+
+        def load_generation_problem(*args):
+            running.append(AlgorithmTask.is_running(self.org.id))
+            raise ValueError
+
+        # Started job locks shifts of its organization until it finishes, even though it has no AlgorithmTask
+        with mock.patch('apps.schedules.tasks.load_generation_problem', load_generation_problem):
+            with self.assertRaises(ValueError):
+                run_algorithm.call_local(2022, 10, self.org.id, [1], '', None, job.pk)
+        self.assertEqual(running, [True])
+        self.assertFalse(AlgorithmTask.is_running(self.org.id))
+
+        GenerationJob.objects.filter(pk=job.pk).update(status='RUNNING', heartbeat_at=timezone.now())
+        self.assertTrue(AlgorithmTask.update_running(self.org.id))
+
+        # Flag expired while the job is still running is read from the database again
+        cache.clear()
+        self.assertTrue(AlgorithmTask.is_running(self.org.id))
+
+        # Job which has lost its worker doesn't lock them forever
+        GenerationJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=30))
+        self.assertFalse(AlgorithmTask.update_running(self.org.id))
+
+
+class UnitReportsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        org = Organization.objects.create(name="Organizacja")
+        cls.unit = Unit.objects.create(name="Jednostka", unit_org=org)
+        wp = Workplace.objects.create(name="Dział", workplace_unit=cls.unit)
+        day = ShiftType.objects.create(hour_start=datetime.time(6), hour_end=datetime.time(14), name="Rano", shift_code="R", workplace=wp)
+        night = ShiftType.objects.create(hour_start=datetime.time(22), hour_end=datetime.time(6), name="Noc", shift_code="N", workplace=wp)
+        schedule = Schedule.objects.create(year=2022, month=10, workplace=wp)
+
+        for i in range(10):
+            e = Employee.objects.create(username=f"e{i}", email=f"e{i}@example.com", user_org=org, job_time="1", order_number=i)
+            for d in range(1, 4):
+                Shift.objects.create(date=datetime.date(2022, 10, d), schedule=schedule, employee=e, shift_type=day)
+            Shift.objects.create(date=datetime.date(2022, 10, 5), schedule=schedule, employee=e, shift_type=night)
+            Absence.objects.create(employee=e, start=datetime.date(2022, 9, 30), end=datetime.date(2022, 10, 1), hours_number=8, type='VAC')
+            Absence.objects.create(employee=e, start=datetime.date(2022, 10, 10), end=datetime.date(2022, 10, 10), hours_number=8, type='VAC')
+
+    def test_statistics(self):
+        with self.assertNumQueries(2):
+            statistics = unit_statistics(self.unit.id, 2022, 10, 160)
+
+        self.assertEqual(len(statistics), 10)
+        employee_statistics = next(iter(statistics.values()))
+        self.assertEqual(employee_statistics['hours'], 32)
+        self.assertEqual(employee_statistics['jobtime'], 160)
+        self.assertEqual(employee_statistics['shift_type'], {'Rano': 3, 'Noc': 1})
+        self.assertEqual((employee_statistics['SICK'], employee_statistics['VAC'], employee_statistics['OTHER']), (None, 16, None))
+
+    def test_report(self):
+        with self.assertNumQueries(3):
+            report = list(schedule_report(self.unit.id, 2022, 10))
+
+        self.assertEqual([employee['username'] for employee, _, _ in report], [f"e{i}" for i in range(10)])
+        for employee, shifts, absences in report:
+            self.assertEqual([shift['date'].day for shift in shifts], [1, 2, 3, 5])
+            self.assertTrue(all(absence['employee_id'] == employee['id'] for absence in absences))
+            self.assertEqual(len(absences), 2)
+
+
+@override_settings(CACHES=SHARED_CACHE, SECURE_SSL_REDIRECT=False)
+class MonthReadModelTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        org = Organization.objects.create(name="Organizacja")
+        unit = Unit.objects.create(name="Jednostka", unit_org=org)
+        cls.workplace = Workplace.objects.create(name="Dział", workplace_unit=unit)
+        cls.shift_type = ShiftType.objects.create(hour_start=datetime.time(6), hour_end=datetime.time(14), name="Rano", shift_code="R",
+                                                  workplace=cls.workplace)
+        cls.user = Employee.objects.create(username="admin", email="admin@example.com", user_org=org, is_superuser=True)
+        cls.schedule = Schedule.objects.create(year=2022, month=10, workplace=cls.workplace)
+        cls.shift = Shift.objects.create(date=datetime.date(2022, 10, 3), schedule=cls.schedule, employee=cls.user,
+                                         shift_type=cls.shift_type)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('schedule_get', args=[self.workplace.id]) + '?year=2022&month=10'
+
+    def test_not_modified_until_shift_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['days']['2022-10-03']), 1)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('shift_manage'), {'Shift': self.shift.id}, content_type='application/json')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['days']['2022-10-03'], [])
+
+    def test_version_bumped_by_another_process(self):
+        etag = self.client.get(self.url)['ETag']
+
+        # E.g. generation finished by the huey consumer or shift edited through another web server worker
+        code = ("import sys\n"
+                "from django.conf import settings\n"
+                "settings.configure(CACHES={'default': {'BACKEND': sys.argv[1], 'LOCATION': sys.argv[2]}})\n"
+                "from django.core.cache import cache\n"
+                "cache.incr(sys.argv[3])\n")
+        subprocess.run([sys.executable, '-c', code, SHARED_CACHE['default']['BACKEND'], SHARED_CACHE['default']['LOCATION'],
+                        unit_version_key(self.workplace.workplace_unit_id, 2022, 10)], check=True)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_process_local_cache_is_not_used(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('ETag', response)
+
+        # Change made by another process, its version bump wouldn't be seen by this one
+        Shift.objects.filter(pk=self.shift.pk).update(date=datetime.date(2022, 10, 4))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"any"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['days']['2022-10-04']), 1)
+
+    def test_shift_written_outside_of_views(self):
+        other = Employee.objects.create(username="other", email="other@example.com", user_org=self.user.user_org)
+        unit_id = self.workplace.workplace_unit_id
+        version = month_version(unit_id, 2022, 10)
+        employee_keys = [employee_version_key(e.pk, 2022, 10) for e in (self.user, other)]
+        employee_versions = get_versions(employee_keys)
+
+        # E.g. shift moved to another employee in the admin, both employees see the change
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift.employee = other
+            self.shift.save()
+        self.assertNotEqual(month_version(unit_id, 2022, 10), version)
+        self.assertTrue(all(new != old for new, old in zip(get_versions(employee_keys), employee_versions)))
+
+        # Deleting the employee deletes his/her shifts too
+        version = month_version(unit_id, 2022, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(Shift.objects.exists())
+        self.assertNotEqual(month_version(unit_id, 2022, 10), version)
+
+    def test_bulk_writes_invalidate_months_once(self):
+        Shift.objects.bulk_create([Shift(date=datetime.date(2022, 10, d), schedule=self.schedule, employee=self.user, shift_type=self.shift_type)
+                                   for d in range(4, 32)])
+        schedule = Schedule(year=2022, month=10, workplace=self.workplace)
+        shifts = [Shift(date=datetime.date(2022, 10, d), schedule=schedule, employee=self.user, shift_type=self.shift_type) for d in range(1, 32)]
+
+        # Replaced shifts are deleted one by one because of signals of Shift, but the month is invalidated once
+        with self.captureOnCommitCallbacks() as callbacks:
+            replace_month_schedules(2022, 10, {self.workplace.id: schedule}, shifts)
+        self.assertEqual(len(callbacks), 1)
+
+        version = month_version(self.workplace.workplace_unit_id, 2022, 10)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(month_version(self.workplace.workplace_unit_id, 2022, 10), version)
+
+    def test_message_is_not_cached(self):
+        etag = self.client.get(self.url)['ETag']
+        Message.objects.create(organization=self.user.user_org, content="Błąd", type='SCHEDULE')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['message'], "Błąd")
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_batch_edit(self):
+        other = Employee.objects.create(username="other", email="other@example.com", user_org=self.user.user_org)
+        etag = self.client.get(self.url)['ETag']
+        operations = [
+            {'op': 'add', 'date': '2022-10-04', 'employee': other.id, 'shift_type': self.shift_type.id, 'workplace': self.workplace.id},
+            {'op': 'move', 'shift': self.shift.id, 'employee': other.id, 'date': '2022-10-05'},
+        ]
+
+        # Nothing is saved when any operation is invalid
+        response = self.client.post(reverse('shift_batch'), {'year': 2022, 'month': 10, 'operations': operations + [{'op': 'delete', 'shift': 0}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'index': 2, 'detail': 'Invalid shift'}])
+        self.assertEqual(Shift.objects.count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('shift_batch'), {'year': 2022, 'month': 10, 'operations': operations},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((len(response.data['created']), response.data['moved'], response.data['deleted']), (1, 1, 0))
+        self.assertEqual(list(Shift.objects.order_by('date').values_list('date__day', 'employee_id')), [(4, other.id), (5, other.id)])
+        self.assertIn(self.workplace.workplace_unit_id, response.data['versions'])
+
+        # Test transaction is committed only at the end, so the version was bumped after the response had been built
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].endswith(f'-{month_version(self.workplace.workplace_unit_id, 2022, 10)}"'))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class GenerationRunTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Organizacja")
+        cls.user = Employee.objects.create(username="admin", email="admin@example.com", user_org=cls.org, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def component(solver_status, objective, penalties):
+        return {"solver_status": solver_status, "context_time": 0.5, "model_time": 1.0, "wall_time": 10.0, "post_process_time": 0.25,
+                "conflicts": 100, "branches": 1000, "solutions": 3, "objective": objective, "best_bound": 0.0, "penalties": penalties}
+
+    def test_components_are_summed_up(self):
+        response = {"status": True, "convert_time": 0.5, "components": [
+            self.component("OPTIMAL", 10.0, {"requests": {"count": 2, "cost": -4}}),
+            self.component("FEASIBLE", 20.0, {"requests": {"count": 1, "cost": -2}, "excess_demand": {"count": 1, "cost": 100}})]}
+        run = record_generation_run(2022, 10, self.org.id, [1, 2], 'SUCCESS', response, load_time=0.1, persist_time=0.2, total_time=15.0)
+
+        self.assertEqual(run.days, 31)
+        self.assertEqual(run.workplaces, 2)
+        self.assertEqual(run.solver_status, 'FEASIBLE')
+        self.assertEqual((run.context_time, run.model_time, run.solve_time, run.post_process_time), (1.0, 2.0, 20.0, 1.0))
+        self.assertEqual((run.wall_time, run.conflicts, run.branches, run.solutions, run.objective), (10.0, 200, 2000, 6, 30.0))
+        self.assertEqual(run.penalties, {"requests": {"count": 3, "cost": -6}, "excess_demand": {"count": 1, "cost": 100}})
+
+        failed = record_generation_run(2022, 11, self.org.id, [1], 'FAILED', {}, total_time=1.0, error="Brak danych")
+        self.assertEqual((failed.solver_status, failed.solutions, failed.penalties, failed.components), ('', 0, None, None))
+        self.assertEqual(GenerationRun.objects.filter(organization=self.org).count(), 2)
+
+        self.client.force_login(self.user)
+        runs = self.client.get(reverse('generation_run_list') + '?year=2022&month=10').json()
+        self.assertEqual([r['id'] for r in runs], [run.id])
+        trend = self.client.get(reverse('generation_run_trend')).json()
+        self.assertEqual([(t['month'], t['runs'], t['successful']) for t in trend], [(10, 1, 1), (11, 1, 0)])
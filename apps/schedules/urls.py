@@ -2,9 +2,11 @@ from django.urls import path, include
 from rest_framework import routers
 
 from apps.schedules.views import ShiftTypeManageView, ShiftTypeViewSet, ScheduleManageView, ScheduleGetApiView, \
-    ScheduleCreateApiView, ShiftManageApiView, PreferenceViewSet, AbsenceViewSet, AbsenceManageView, \
+    ScheduleCreateApiView, ShiftManageApiView, ShiftBatchApiView, PreferenceViewSet, AbsenceViewSet, AbsenceManageView, \
     ScheduleReportGetApiView, AssignmentViewSet, JobTimeViewSet, JobTimeManageView, FreeDayViewSet, CheckAlgorithmView, \
-    ScheduleGeneratingView, ScheduleEmployeeGetApiView, ScheduleUnitGetApiView, EmployeeScheduleView
+    ScheduleGeneratingView, ScheduleEmployeeGetApiView, ScheduleUnitGetApiView, EmployeeScheduleView, \
+    GenerationJobGetApiView, GenerationJobCancelApiView, GenerationJobResultApiView, GenerationJobDraftApiView, GenerationJobAcceptApiView, \
+    GenerationRunListApiView, GenerationRunTrendApiView
 
 shiftType_router = routers.DefaultRouter()
 shiftType_router.register(r'shiftType', ShiftTypeViewSet, basename='shiftType')
@@ -25,9 +27,17 @@ urlpatterns = [
     # API urls
     path('api/check_algorithm/', CheckAlgorithmView.as_view(), name="check_algorithm"),
     path('api/schedule_create/', ScheduleCreateApiView.as_view(), name='schedule_create'),
+    path('api/generation_job/<int:job_pk>/', GenerationJobGetApiView.as_view(), name='generation_job_get'),
+    path('api/generation_job/<int:job_pk>/cancel/', GenerationJobCancelApiView.as_view(), name='generation_job_cancel'),
+    path('api/generation_job/<int:job_pk>/result/', GenerationJobResultApiView.as_view(), name='generation_job_result'),
+    path('api/generation_job/<int:job_pk>/draft/', GenerationJobDraftApiView.as_view(), name='generation_job_draft'),
+    path('api/generation_job/<int:job_pk>/accept/', GenerationJobAcceptApiView.as_view(), name='generation_job_accept'),
+    path('api/generation_run/', GenerationRunListApiView.as_view(), name='generation_run_list'),
+    path('api/generation_run/trend/', GenerationRunTrendApiView.as_view(), name='generation_run_trend'),
     path('api/<int:workplace_pk>/', include(shiftType_router.urls)),
     path('api/', include(router.urls)),
     path('api/shift_manage/', ShiftManageApiView.as_view(), name='shift_manage'),
+    path('api/shift_batch/', ShiftBatchApiView.as_view(), name='shift_batch'),
     path('api/<int:workplace_pk>/schedule_get/', ScheduleGetApiView.as_view(),
          name='schedule_get'),
     path('api/<int:unit_pk>/schedule_unit_get/', ScheduleUnitGetApiView.as_view(),
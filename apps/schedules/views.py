@@ -1,24 +1,34 @@
 # Create your views here.
 import calendar
 import copy
+import csv
 import datetime
+import io
+import json
 
 import holidays
 from django.conf import settings
-from django.db.models import Sum
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Sum, Count, Avg, Max, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.views.generic import TemplateView
+from huey.contrib.djhuey import HUEY
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-import scripts.run_algorithm
 from apps.accounts.models import Employee
-from apps.organizations.models import Workplace, Unit, Organization, WorkplaceClosing, Message
+from apps.organizations.models import Workplace, Unit, Organization
 from apps.schedules.models import ShiftType, Shift, Schedule, Preference, Absence, Assignment, JobTime, FreeDay, \
-    AlgorithmTask
+    AlgorithmTask, GenerationJob, GenerationRun
+from apps.schedules.read_model import cached_response, pop_schedule_message, unit_version_key, employee_version_key, \
+    invalidate_shifts, bulk_shift_writes, workplace_unit_id, month_version
 from apps.schedules.serializers import ShiftTypeSerializer, PreferenceSerializer, AbsenceSerializer, \
-    AssignmentSerializer, JobTimeSerializer, FreeDaySerializer
-from apps.schedules.tasks import run_algorithm
+    AssignmentSerializer, JobTimeSerializer, FreeDaySerializer, GenerationJobSerializer, \
+    GenerationRunSerializer
+from apps.schedules.tasks import submit_generation_job, dispatch_generation_jobs
 from planimbly.permissions import GroupRequiredMixin, Issupervisor, Isemployee
 
 
@@ -31,6 +41,46 @@ def free_days(year, month):
     return free_days
 
 
+def unit_statistics(unit_pk, year, month, jobtime):
+    """Worked hours, numbers of shifts per shift type and absence hours of every employee of the unit in given month.
+
+    Everything is aggregated by the database in two grouped queries (shifts per employee and shift type, absence hours
+    per employee and type), so the number of queries doesn't depend on the number of employees.
+    """
+    rows = list(Shift.objects.filter(schedule__workplace__workplace_unit_id=unit_pk).filter(schedule__month=month).filter(
+        schedule__year=year).values('employee_id', 'employee__order_number', 'employee__first_name', 'employee__last_name',
+                                    'employee__job_time', 'shift_type__name', 'shift_type__hour_start',
+                                    'shift_type__hour_end').annotate(count=Count('id')).order_by('employee__order_number', 'employee_id',
+                                                                                                 'shift_type__hour_start'))
+    shifts_types = list(dict.fromkeys(row['shift_type__name'] for row in rows))
+
+    statistics = {}
+    for row in rows:
+        shift_len = datetime.datetime.combine(datetime.date.min, row['shift_type__hour_end']) - \
+                    datetime.datetime.combine(datetime.date.min, row['shift_type__hour_start'])
+        employee_statistics = statistics.setdefault(row['employee_id'], {
+            'hours': 0,
+            'order_number': row['employee__order_number'],
+            'name': row['employee__first_name'] + ' ' + row['employee__last_name'],
+            'jobtime': convert_to_float(row['employee__job_time']) * jobtime,
+            'shift_type': {shift_type: 0 for shift_type in shifts_types},
+            'absence': {}
+        })
+        employee_statistics['hours'] += row['count'] * shift_len.seconds / 3600
+        employee_statistics['shift_type'][row['shift_type__name']] += row['count']
+
+    first_day = datetime.date(year, month, 1)
+    last_day = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    absences = Absence.objects.filter(employee_id__in=list(statistics)).filter(start__lte=last_day).filter(
+        end__gte=first_day).values('employee_id', 'type').annotate(hours=Sum('hours_number')).order_by()
+    absence_hours = {(a['employee_id'], a['type']): a['hours'] for a in absences}
+    for employee_id, employee_statistics in statistics.items():
+        for ab_type in Absence.ABSENCE_TYPE:
+            employee_statistics[ab_type[0]] = absence_hours.get((employee_id, ab_type[0]))
+
+    return statistics
+
+
 def convert_to_float(frac_str):
     try:
         return float(frac_str)
@@ -126,171 +176,243 @@ class ScheduleCreateApiView(APIView):
         month = self.request.data.get('month')
         workplace_list = self.request.data.get('workplace_list')
         org_id = request.user.user_org_id
-        username = request.user.username
-        if settings.USE_HUEY:
-            run_algorithm(year, month, org_id, workplace_list, username)
 
-        else:
-            if not year or not month or not workplace_list:
+        # Repair mode only changes the schedule around changed employees and days, the rest of the month is kept
+        repair = None
+        if self.request.data.get('mode') == 'repair':
+            changed_employees = self.request.data.get('changed_employees')
+            if not changed_employees:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
+            repair = {'employees': changed_employees, 'days': self.request.data.get('changed_days') or []}
 
-            workplace_query = Workplace.objects.filter(id__in=workplace_list)
-            schedule_dict = dict()
-
-            for workplace in workplace_query:
-                schedule = Schedule(year=year, month=month,
-                                    workplace=workplace)
-                # schedule.save()
-                schedule_dict.setdefault(workplace.id, schedule)
-
-            shiftType_list = list(
-                ShiftType.objects.filter(workplace_id__in=workplace_list).filter(is_used=True).filter(is_archive=False))
-
-            emp_for_workplaces = {}
-
-            for work_id in workplace_list:
-                emp_for_workplaces[work_id] = Employee.objects.filter(
-                    user_workplace__in=Workplace.objects.filter(id__in=[work_id])).exclude(is_supervisor=True).exclude(
-                    groups__name='supervisor').exclude(is_superuser=True).distinct().order_by('id')
-
-            employee_list = Employee.objects.filter(user_workplace__in=workplace_query).exclude(is_supervisor=True).exclude(
-                    groups__name='supervisor').exclude(is_superuser=True).distinct().order_by('id')
-            preferences = Preference.objects.filter(employee__in=employee_list)
-
-            # Sprawdzamy pierwszą datę w miesiącu i ostatnią
-            first_day = datetime.date(int(year), int(month), 1)
-            last_day = datetime.date(int(year), int(month), calendar.monthrange(int(year), int(month))[1])
-
-            absences = Absence.objects.filter(employee__in=employee_list).filter(start__lte=last_day).filter(
-                end__gte=first_day)
-            emp_preferences = {}
-            for preference in preferences:
-                emp_preferences.setdefault(preference.employee.id, []).append(preference)
-
-            emp_absences = {}
-            for absence in absences:
-                emp_absences.setdefault(absence.employee.id, []).append(absence)
-
-            term_assignments = Assignment.objects.filter(employee__in=employee_list).filter(start__lte=last_day).filter(
-                end__gte=first_day)
-            general_assignments = Assignment.objects.filter(employee__in=employee_list).filter(start=None).filter(
-                end=None)
-
-            emp_assignments = {}
-            for assignment in term_assignments:
-                emp_assignments.setdefault(assignment.employee.id, []).append(assignment)
-
-            for assignment in general_assignments:
-                emp_assignments.setdefault(assignment.employee.id, []).append(assignment)
-
-            work_for_workplace_closing = {}
-            for work_id in workplace_list:
-                work_for_workplace_closing[work_id] = WorkplaceClosing.objects.filter(start__lte=last_day).filter(
-                    end__gte=first_day).filter(workplace_id=work_id)
-
-            jobtime = JobTime.objects.filter(year=int(year)).values_list(calendar.month_name[month].lower(),
-                                                                         flat=True).first()
-
-            seven_before = first_day - datetime.timedelta(days=7)
-            seven_after = last_day + datetime.timedelta(days=7)
-
-            shifts_before = {}
-            shifts_after = {}
-
-            shifts_b = Shift.objects.filter(date__gte=seven_before).filter(date__lt=first_day).filter(
-                schedule__workplace_id__in=workplace_list).order_by('date')
-            shifts_a = Shift.objects.filter(date__gt=last_day).filter(date__lte=seven_after).filter(
-                schedule__workplace_id__in=workplace_list).order_by('date')
-
-            for shift in shifts_b:
-                shifts_before.setdefault(shift.date, []).append(shift)
-            for shift in shifts_a:
-                shifts_after.setdefault(shift.date, []).append(shift)
-
-            response = scripts.run_algorithm.main_algorithm(schedule_dict, employee_list, shiftType_list, year, month,
-                                                            emp_for_workplaces, emp_preferences, emp_absences,
-                                                            emp_assignments, jobtime, work_for_workplace_closing,
-                                                            shifts_before, shifts_after, username)
-            if response.get('status'):
-                for workplace in workplace_query:
-                    old_schedule = Schedule.objects.filter(year=year).filter(month=month).filter(
-                        workplace=workplace).first()
-                    if old_schedule is not None:
-                        old_schedule.delete()
-                for schedule in schedule_dict:
-                    schedule_dict[schedule].save()
-                data = response.get('data')
-                for shift in data:
-                    shift.save()
-            else:
-                org = Organization.objects.get(id=org_id)
-                message = Message(organization=org, content="Nie udało się wygenerować nowego grafiku",
-                                  type='SCHEDULE')
-                message.save()
-            '''for workplace in workplace_query:
-                old_schedule = Schedule.objects.filter(year=year).filter(month=month).filter(
-                    workplace=workplace).first()
-                if old_schedule is not None:
-                    old_schedule.message = "Nie udało się wygenerować nowego grafiku"
-                    old_schedule.save()
-                else:
-                    schedule = schedule_dict[workplace.id]
-                    schedule.message = "Nie udało się wygenerować nowego grafiku"
-                    schedule.save()'''
+        if not year or not month or not workplace_list:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        return Response()
+        # Generation always runs in the background, progress and result are available through the job
+        job, created = submit_generation_job(org_id, request.user, year, month, workplace_list, repair)
+
+        return Response(status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK, data=GenerationJobSerializer(job).data)
+
+
+class GenerationJobGetApiView(APIView):
+    permission_classes = [Issupervisor]
+
+    def get(self, request, job_pk):
+        job = GenerationJob.objects.filter(pk=job_pk, organization_id=request.user.user_org_id).first()
+        if not job:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(GenerationJobSerializer(job).data)
+
+
+class GenerationJobCancelApiView(APIView):
+    permission_classes = [Issupervisor]
+
+    def post(self, request, job_pk):
+        job = GenerationJob.objects.filter(pk=job_pk, organization_id=request.user.user_org_id).first()
+        if not job:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        # Queued job is cancelled at once, running one is stopped by the solver at the next progress check
+        if GenerationJob.objects.filter(pk=job.pk, status='QUEUED').update(status='CANCELLED', finished_at=timezone.now()):
+            if settings.USE_HUEY and job.task_id:
+                HUEY.revoke_by_id(job.task_id)
+                dispatch_generation_jobs(job.organization_id)
+        elif not GenerationJob.objects.filter(pk=job.pk, status='RUNNING').update(cancel_requested=True):
+            return Response(status=status.HTTP_409_CONFLICT, data={'detail': 'Job has already finished'})
+
+        job.refresh_from_db()
+        return Response(GenerationJobSerializer(job).data)
+
+
+class GenerationJobDraftApiView(APIView):
+    permission_classes = [Issupervisor]
+
+    def get(self, request, job_pk):
+        job = GenerationJob.objects.filter(pk=job_pk, organization_id=request.user.user_org_id).first()
+        if not job:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if job.draft is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({'id': job.id, 'status': job.status, 'draft_updated_at': job.draft_updated_at, 'draft': job.draft})
+
+
+class GenerationJobAcceptApiView(APIView):
+    permission_classes = [Issupervisor]
+
+    def post(self, request, job_pk):
+        job = GenerationJob.objects.filter(pk=job_pk, organization_id=request.user.user_org_id).first()
+        if not job:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        # The solver stops at the next progress check and the best schedule found so far is saved
+        if not GenerationJob.objects.filter(pk=job.pk, status='RUNNING', draft__isnull=False).update(accept_requested=True):
+            return Response(status=status.HTTP_409_CONFLICT, data={'detail': 'Job has no draft to accept', 'status': job.status})
+
+        job.refresh_from_db()
+        return Response(GenerationJobSerializer(job).data)
+
+
+class GenerationJobResultApiView(APIView):
+    permission_classes = [Issupervisor]
+
+    def get(self, request, job_pk):
+        job = GenerationJob.objects.filter(pk=job_pk, organization_id=request.user.user_org_id).first()
+        if not job:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if not job.is_finished():
+            return Response(status=status.HTTP_409_CONFLICT, data={'detail': 'Job hasn\'t finished yet', 'status': job.status})
+        return Response({'id': job.id, 'status': job.status, 'result': job.result})
+
+
+class GenerationRunListApiView(APIView):
+    permission_classes = [Issupervisor]
+
+    def get(self, request):
+        """Lists the latest runs of the algorithm of the organization, optionally filtered by year, month, mode and status."""
+        runs = GenerationRun.objects.filter(organization_id=request.user.user_org_id)
+        for field in ('year', 'month', 'mode', 'status'):
+            if request.query_params.get(field):
+                runs = runs.filter(**{field: request.query_params[field]})
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response(GenerationRunSerializer(runs[:max(0, limit)], many=True).data)
+
+
+class GenerationRunTrendApiView(APIView):
+    permission_classes = [Issupervisor]
+
+    def get(self, request):
+        """Sums up runs of the organization per scheduled month, so it can be seen how the algorithm copes over time."""
+        trend = GenerationRun.objects.filter(organization_id=request.user.user_org_id).values('year', 'month').annotate(
+            runs=Count('id'), successful=Count('id', filter=Q(status='SUCCESS')), optimal=Count('id', filter=Q(solver_status='OPTIMAL')),
+            employees=Max('employees'), avg_total_time=Avg('total_time'), avg_solve_time=Avg('solve_time'),
+            avg_model_time=Avg('model_time'), avg_conflicts=Avg('conflicts'), avg_objective=Avg('objective')).order_by('year', 'month')
+        return Response(list(trend))
+
+
+def schedule_report(unit_pk, year, month):
+    """Yields employees of the unit who have shifts in given month together with their shifts and absences.
+
+    Shifts, absences and employees are read by three queries sorted the same way (employee order, employee id), so
+    they are grouped in one pass over the rows without keeping the whole month in memory.
+    """
+    first_day = datetime.date(year, month, 1)
+    last_day = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    unit_shifts = Shift.objects.filter(schedule__workplace__workplace_unit__pk=unit_pk).filter(schedule__month=month).filter(
+        schedule__year=year)
+    employee_order = ('employee__order_number', 'employee_id')
+
+    employees = Employee.objects.filter(pk__in=unit_shifts.values('employee_id')).order_by('order_number', 'id').values(
+        'id', 'username', 'first_name', 'last_name', 'job_time')
+    shifts = unit_shifts.order_by(*employee_order, 'date').values(
+        'id', 'date', 'employee_id', 'shift_type_id', 'shift_type__color', 'shift_type__name', 'shift_type__shift_code',
+        'shift_type__workplace_id', 'shift_type__workplace__name').iterator()
+    absences = Absence.objects.filter(employee__in=unit_shifts.values('employee_id')).filter(start__lte=last_day).filter(
+        end__gte=first_day).order_by(*employee_order, 'start').values('employee_id', 'id', 'start', 'end', 'type').iterator()
+
+    def rows_of(rows, employee_id, pending):
+        # Rows of one employee from an iterator sorted by employees, the first row of the next employee stays pending
+        row = pending
+        result = []
+        while row is not None and row['employee_id'] == employee_id:
+            result.append(row)
+            row = next(rows, None)
+        return result, row
+
+    next_shift = next(shifts, None)
+    next_absence = next(absences, None)
+    for employee in employees.iterator():
+        employee_shifts, next_shift = rows_of(shifts, employee['id'], next_shift)
+        employee_absences, next_absence = rows_of(absences, employee['id'], next_absence)
+        yield employee, employee_shifts, employee_absences
 
 
 class ScheduleReportGetApiView(APIView):
+    CSV_HEADER = ['employee_id', 'employee_login', 'employee_first_name', 'employee_last_name', 'employee_work_hours', 'date',
+                  'id', 'shift_type_id', 'shift_type_name', 'shift_code', 'workplace_id', 'workplace_name']
+
     def get(self, request, unit_pk):
         # 127.0.0.1:8000/schedules/api/1/schedule_report_get?year=2022&month=10
+        # Large units can be streamed with &output=json_stream or &output=csv
         year = self.request.GET.get('year')
         month = self.request.GET.get('month')
-        date_format = '%Y-%m-%d'
+        output = self.request.GET.get('output', 'json')
         if year and month:
-            employee_list_pk = Shift.objects.filter(schedule__month=month).filter(schedule__year=year).filter(
-                schedule__workplace__workplace_unit__pk=unit_pk).values_list('employee_id', flat=True).distinct()
-            employee_list = Employee.objects.filter(pk__in=employee_list_pk)
-            data = {'employees': {}}
-            for employee in employee_list:
-                days = {}
-                days_num = calendar.monthrange(int(year), int(month))[1]
-                for x in range(1, days_num + 1):
-                    date = datetime.date(int(year), int(month), x).strftime(date_format)
-                    days.update({date: []})
-                shifts = Shift.objects.select_related('shift_type__workplace').filter(employee__pk=employee.pk).filter(
-                    schedule__workplace__workplace_unit__pk=unit_pk).filter(
-                    schedule__month=month).filter(schedule__year=year).order_by('date')
-                for shift in shifts:
-                    days[shift.date.strftime(date_format)].append((
-                        {
-                            'id': shift.id,
-                            'shift_type_id': shift.shift_type.id,
-                            'shift_type_color': shift.shift_type.color,
-                            'shift_type_name': shift.shift_type.name,
-                            'shift_code': shift.shift_type.shift_code,
-                            'workplace_id': shift.shift_type.workplace.id,
-                            'workplace_name': shift.shift_type.workplace.name
-                        }
-                    ))
-                first_day = datetime.date(int(year), int(month), 1)
-                last_day = datetime.date(int(year), int(month), days_num)
-                absences = Absence.objects.filter(employee__pk=employee.pk).filter(start__lte=last_day).filter(
-                    end__gte=first_day).values('id', 'start', 'end', 'type')
-
-                data['employees'][employee.pk] = {
-                    'employee_id': employee.pk,
-                    'employee_login': employee.username,
-                    'employee_first_name': employee.first_name,
-                    'employee_last_name': employee.last_name,
-                    'employee_work_hours': employee.job_time,
-                    'days': days,
-                    'absences': absences,
-                }
-
-            data['free_days'] = free_days(int(year), int(month))
-
-            return Response(data=data)
+            year, month = int(year), int(month)
+            days_num = calendar.monthrange(year, month)[1]
+            dates = [datetime.date(year, month, x).isoformat() for x in range(1, days_num + 1)]
+            report = schedule_report(unit_pk, year, month)
+
+            match output:
+                case 'csv':
+                    response = StreamingHttpResponse(self.csv_lines(report), content_type='text/csv')
+                    response['Content-Disposition'] = f'attachment; filename="report_{unit_pk}_{year}_{month:02d}.csv"'
+                    return response
+                case 'json_stream':
+                    return StreamingHttpResponse(self.json_chunks(report, dates, free_days(year, month)), content_type='application/json')
+
+            return cached_response(request, request.user.user_org_id, 'schedule_report_get', (unit_pk, year, month),
+                                   [unit_version_key(unit_pk, year, month)], lambda: self.build(report, dates, year, month))
+
+    def build(self, report, dates, year, month):
+        data = {'employees': {employee['id']: self.employee_data(employee, shifts, absences, dates)
+                              for employee, shifts, absences in report}}
+        data['free_days'] = free_days(year, month)
+        return data
+
+    @staticmethod
+    def employee_data(employee, shifts, absences, dates):
+        days = {date: [] for date in dates}
+        for shift in shifts:
+            days[shift['date'].isoformat()].append({
+                'id': shift['id'],
+                'shift_type_id': shift['shift_type_id'],
+                'shift_type_color': shift['shift_type__color'],
+                'shift_type_name': shift['shift_type__name'],
+                'shift_code': shift['shift_type__shift_code'],
+                'workplace_id': shift['shift_type__workplace_id'],
+                'workplace_name': shift['shift_type__workplace__name']
+            })
+
+        return {
+            'employee_id': employee['id'],
+            'employee_login': employee['username'],
+            'employee_first_name': employee['first_name'],
+            'employee_last_name': employee['last_name'],
+            'employee_work_hours': employee['job_time'],
+            'days': days,
+            'absences': [{key: value for key, value in absence.items() if key != 'employee_id'} for absence in absences],
+        }
+
+    def json_chunks(self, report, dates, month_free_days):
+        """Same document as the regular response, written employee by employee."""
+        yield '{"employees": {'
+        for i, (employee, shifts, absences) in enumerate(report):
+            employee_data = json.dumps(self.employee_data(employee, shifts, absences, dates), cls=DjangoJSONEncoder)
+            yield f'{", " if i else ""}"{employee["id"]}": {employee_data}'
+        yield '}, "free_days": ' + json.dumps(month_free_days, cls=DjangoJSONEncoder) + '}'
+
+    def csv_lines(self, report):
+        """One line per shift."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush():
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return line
+
+        writer.writerow(self.CSV_HEADER)
+        yield flush()
+        for employee, shifts, _ in report:
+            for shift in shifts:
+                writer.writerow([employee['id'], employee['username'], employee['first_name'], employee['last_name'], employee['job_time'],
+                                 shift['date'].isoformat(), shift['id'], shift['shift_type_id'], shift['shift_type__name'],
+                                 shift['shift_type__shift_code'], shift['shift_type__workplace_id'], shift['shift_type__workplace__name']])
+            yield flush()
 
 
 class ScheduleEmployeeGetApiView(APIView):
@@ -300,35 +422,38 @@ class ScheduleEmployeeGetApiView(APIView):
         # 127.0.0.1:8000/schedules/api/3/schedule_employee_get?year=2023&month=1
         year = self.request.GET.get('year')
         month = self.request.GET.get('month')
-        date_format = '%Y-%m-%d'
         if year and month:
-
-            days_num = calendar.monthrange(int(year), int(month))[1]
-            days = {}
-            for x in range(1, days_num + 1):
-                date = datetime.date(int(year), int(month), x).strftime(date_format)
-                days.update({date: []})
-            shifts = Shift.objects.filter(employee_id=employee_pk).filter(schedule__month=month).filter(
-                schedule__year=year).order_by('date')
-
-            for shift in shifts:
-                days[shift.date.strftime(date_format)].append((
-                    {
-                        'id': shift.id,
-                        'shift_type_id': shift.shift_type.id,
-                        'shift_type_color': shift.shift_type.color,
-                        'shift_code': shift.shift_type.shift_code,
-                        'time_start': shift.shift_type.hour_start,
-                        'time_end': shift.shift_type.hour_end,
-                        'name': shift.shift_type.name,
-                    }
-                ))
-            data = {'days': days
-                    }
-            return Response(data=data)
+            return cached_response(request, request.user.user_org_id, 'schedule_employee_get', (employee_pk, year, month),
+                                   [employee_version_key(employee_pk, int(year), int(month))],
+                                   lambda: self.build(employee_pk, year, month))
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def build(employee_pk, year, month):
+        date_format = '%Y-%m-%d'
+        days_num = calendar.monthrange(int(year), int(month))[1]
+        days = {}
+        for x in range(1, days_num + 1):
+            date = datetime.date(int(year), int(month), x).strftime(date_format)
+            days.update({date: []})
+        shifts = Shift.objects.select_related('shift_type').filter(employee_id=employee_pk).filter(schedule__month=month).filter(
+            schedule__year=year).order_by('date')
+
+        for shift in shifts:
+            days[shift.date.strftime(date_format)].append((
+                {
+                    'id': shift.id,
+                    'shift_type_id': shift.shift_type.id,
+                    'shift_type_color': shift.shift_type.color,
+                    'shift_code': shift.shift_type.shift_code,
+                    'time_start': shift.shift_type.hour_start,
+                    'time_end': shift.shift_type.hour_end,
+                    'name': shift.shift_type.name,
+                }
+            ))
+        return {'days': days}
+
 
 class ScheduleGetApiView(APIView):
     permission_classes = [Issupervisor]
@@ -337,100 +462,69 @@ class ScheduleGetApiView(APIView):
         # 127.0.0.1:8000/schedules/api/2/schedule_get?year=2023&month=1
         year = self.request.GET.get('year')
         month = self.request.GET.get('month')
-        date_format = '%Y-%m-%d'
         if year and month:
-            workplace = Workplace.objects.get(id=workplace_pk)
-            unit = workplace.workplace_unit
-            shifts = Shift.objects.select_related('employee').select_related('shift_type').filter(
-                schedule__workplace=workplace).filter(schedule__month=month).filter(
-                schedule__year=year).order_by('date')
-            shifts_statistic = Shift.objects.select_related('employee').select_related('shift_type').filter(
-                schedule__workplace__workplace_unit=unit).filter(
-                schedule__month=month).filter(schedule__year=year).order_by('employee__order_number',
-                                                                            'shift_type__hour_start')
-            shifts_types = list(Shift.objects.filter(schedule__workplace__workplace_unit=unit).filter(
-                schedule__month=month).filter(schedule__year=year).values_list('shift_type__name',
-                                                                               flat=True).distinct())
-
-            days_num = calendar.monthrange(int(year), int(month))[1]
-            days = {}
-            statistics = {}
-
-            for x in range(1, days_num + 1):
-                date = datetime.date(int(year), int(month), x).strftime(date_format)
-                days.update({date: []})
-
-            jobtime = JobTime.objects.filter(year=int(year)).values_list(
-                calendar.month_name[int(month)].lower(), flat=True).first()
-            if jobtime is None:
-                jobtime = 160
-            for shift in shifts_statistic:
-                shift_len = datetime.datetime.combine(datetime.date.min, shift.shift_type.hour_end) - \
-                            datetime.datetime.combine(datetime.date.min, shift.shift_type.hour_start)
-                statistics.setdefault(shift.employee.id, {
-                    'hours': 0,
-                    'order_number': shift.employee.order_number,
-                    'name': shift.employee.first_name + ' ' + shift.employee.last_name,
-                    'jobtime': convert_to_float(shift.employee.job_time) * jobtime,
-                    'shift_type': {},
-                    'absence': {}
-                })
-                statistics[shift.employee.id]['hours'] += shift_len.seconds / 3600
-
-                if not statistics[shift.employee.id].get('shift_type'):
-                    for shift_type in shifts_types:
-                        statistics[shift.employee.id]['shift_type'][shift_type] = 0
-
-                statistics[shift.employee.id]['shift_type'][shift.shift_type.name] += 1
-
-                if Absence.ABSENCE_TYPE[0][0] not in statistics[shift.employee.id]:
-                    first_day = datetime.date(int(year), int(month), 1)
-                    last_day = datetime.date(int(year), int(month), days_num)
-                    for ab_type in Absence.ABSENCE_TYPE:
-                        # TODO ZMIENIJSZY LICZBĘ QUERY Z ~30 do 1
-                        h_sum = Absence.objects.filter(employee=shift.employee).filter(start__lte=last_day).filter(
-                            end__gte=first_day).filter(type=ab_type[0]).aggregate(Sum('hours_number'))[
-                            'hours_number__sum']
-                        statistics[shift.employee.id][ab_type[0]] = h_sum
-            for shift in shifts:
-                days[shift.date.strftime(date_format)].append((
-                    {
-                        'id': shift.id,
-                        'shift_type_id': shift.shift_type.id,
-                        'shift_type_color': shift.shift_type.color,
-                        'shift_code': shift.shift_type.shift_code,
-                        'time_start': shift.shift_type.hour_start,
-                        'time_end': shift.shift_type.hour_end,
-                        'name': shift.shift_type.name,
-                        'worker': {
-                            'id': shift.employee.id,
-                            'first_name': shift.employee.first_name,
-                            'last_name': shift.employee.last_name,
-                            'order_number': shift.employee.order_number,
-                        }
-                    }
-                ))
-            message = Message.objects.filter(organization=request.user.user_org).filter(type='SCHEDULE')
-            content = None
-            if message.exists() is True:
-                content = message.first().content
-                message.delete()
-
-            response = {
-                'unit_id': workplace.workplace_unit.id,
-                'workplace_id': workplace.id,
-                'unit_name': workplace.workplace_unit.name,
-                'workplace_name': workplace.name,
-                'days': days,
-                'statistics': statistics,
-                'free_days': free_days(int(year), int(month)),
-                'jobtime': jobtime,
-                'message': content
-            }
-            return Response(data=response)
+            unit_id = workplace_unit_id(workplace_pk)
+            if unit_id is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+
+            # Message is shown only once, so it isn't a part of the cached schedule
+            content = pop_schedule_message(request.user.user_org_id)
+            return cached_response(request, request.user.user_org_id, 'schedule_get', (workplace_pk, year, month),
+                                   [unit_version_key(unit_id, int(year), int(month))], lambda: self.build(workplace_pk, year, month),
+                                   extra={'message': content})
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def build(workplace_pk, year, month):
+        date_format = '%Y-%m-%d'
+        workplace = Workplace.objects.select_related('workplace_unit').get(id=workplace_pk)
+        unit = workplace.workplace_unit
+        shifts = Shift.objects.select_related('employee').select_related('shift_type').filter(
+            schedule__workplace=workplace).filter(schedule__month=month).filter(
+            schedule__year=year).order_by('date')
+        days_num = calendar.monthrange(int(year), int(month))[1]
+        days = {}
+
+        for x in range(1, days_num + 1):
+            date = datetime.date(int(year), int(month), x).strftime(date_format)
+            days.update({date: []})
+
+        jobtime = JobTime.objects.filter(year=int(year)).values_list(
+            calendar.month_name[int(month)].lower(), flat=True).first()
+        if jobtime is None:
+            jobtime = 160
+        statistics = unit_statistics(unit.id, int(year), int(month), jobtime)
+
+        for shift in shifts:
+            days[shift.date.strftime(date_format)].append((
+                {
+                    'id': shift.id,
+                    'shift_type_id': shift.shift_type.id,
+                    'shift_type_color': shift.shift_type.color,
+                    'shift_code': shift.shift_type.shift_code,
+                    'time_start': shift.shift_type.hour_start,
+                    'time_end': shift.shift_type.hour_end,
+                    'name': shift.shift_type.name,
+                    'worker': {
+                        'id': shift.employee.id,
+                        'first_name': shift.employee.first_name,
+                        'last_name': shift.employee.last_name,
+                        'order_number': shift.employee.order_number,
+                    }
+                }
+            ))
+        return {
+            'unit_id': workplace.workplace_unit.id,
+            'workplace_id': workplace.id,
+            'unit_name': workplace.workplace_unit.name,
+            'workplace_name': workplace.name,
+            'days': days,
+            'statistics': statistics,
+            'free_days': free_days(int(year), int(month)),
+            'jobtime': jobtime,
+        }
+
 
 class ScheduleUnitGetApiView(APIView):
     permission_classes = [Issupervisor]
@@ -439,115 +533,85 @@ class ScheduleUnitGetApiView(APIView):
         # 127.0.0.1:8000/schedules/api/1/schedule_unit_get?year=2023&month=1
         year = self.request.GET.get('year')
         month = self.request.GET.get('month')
-        date_format = '%Y-%m-%d'
         if year and month:
-            workplace_list = Workplace.objects.filter(workplace_unit_id=unit_pk)
-            workplace_list_pk = list(workplace_list.values_list(flat=True))
-
-            shifts = Shift.objects.select_related('employee').select_related('shift_type').select_related(
-                'schedule__workplace').filter(schedule__workplace_id__in=workplace_list_pk).filter(
-                schedule__month=month).filter(
-                schedule__year=year).order_by('date')
-            shifts_statistic = Shift.objects.select_related('employee').select_related('shift_type').filter(
-                schedule__workplace__workplace_unit_id=unit_pk).filter(
-                schedule__month=month).filter(schedule__year=year).order_by('employee__order_number',
-                                                                            'shift_type__hour_start')
-            shifts_types = list(Shift.objects.filter(schedule__workplace__workplace_unit_id=unit_pk).filter(
-                schedule__month=month).filter(schedule__year=year).values_list('shift_type__name',
-                                                                               flat=True).distinct())
-
-            days_num = calendar.monthrange(int(year), int(month))[1]
-
-            workplace_days = {}
-            statistics = {}
-
-            for workplace in workplace_list:
-                workplace_days[workplace.id] = {'days': {}}
-                for x in range(1, days_num + 1):
-                    date = datetime.date(int(year), int(month), x).strftime(date_format)
-                    workplace_days[workplace.id]['days'].update({date: []})
-
-            jobtime = JobTime.objects.filter(year=int(year)).values_list(
-                calendar.month_name[int(month)].lower(), flat=True).first()
-            if jobtime is None:
-                jobtime = 160
-
-            for shift in shifts_statistic:
-                shift_len = datetime.datetime.combine(datetime.date.min, shift.shift_type.hour_end) - \
-                            datetime.datetime.combine(datetime.date.min, shift.shift_type.hour_start)
-                statistics.setdefault(shift.employee.id, {
-                    'hours': 0,
-                    'order_number': shift.employee.order_number,
-                    'name': shift.employee.first_name + ' ' + shift.employee.last_name,
-                    'jobtime': convert_to_float(shift.employee.job_time) * jobtime,
-                    'shift_type': {},
-                    'absence': {}
-                })
-                statistics[shift.employee.id]['hours'] += shift_len.seconds / 3600
-
-                if not statistics[shift.employee.id].get('shift_type'):
-                    for shift_type in shifts_types:
-                        statistics[shift.employee.id]['shift_type'][shift_type] = 0
-
-                statistics[shift.employee.id]['shift_type'][shift.shift_type.name] += 1
-
-                if Absence.ABSENCE_TYPE[0][0] not in statistics[shift.employee.id]:
-                    first_day = datetime.date(int(year), int(month), 1)
-                    last_day = datetime.date(int(year), int(month), days_num)
-                    for ab_type in Absence.ABSENCE_TYPE:
-                        # TODO ZMIENIJSZY LICZBĘ QUERY Z ~30 do 1
-                        h_sum = Absence.objects.filter(employee=shift.employee).filter(start__lte=last_day).filter(
-                            end__gte=first_day).filter(type=ab_type[0]).aggregate(Sum('hours_number'))[
-                            'hours_number__sum']
-                        statistics[shift.employee.id][ab_type[0]] = h_sum
+            return cached_response(request, request.user.user_org_id, 'schedule_unit_get', (unit_pk, year, month),
+                                   [unit_version_key(unit_pk, int(year), int(month))], lambda: self.build(unit_pk, year, month))
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
-            for shift in shifts:
-                workplace_days[shift.schedule.workplace.id]['days'][shift.date.strftime(date_format)].append((
-                    {
-                        'id': shift.id,
-                        'shift_type_id': shift.shift_type.id,
-                        'shift_type_color': shift.shift_type.color,
-                        'shift_code': shift.shift_type.shift_code,
-                        'time_start': shift.shift_type.hour_start,
-                        'time_end': shift.shift_type.hour_end,
-                        'name': shift.shift_type.name,
-                        'worker': {
-                            'id': shift.employee.id,
-                            'first_name': shift.employee.first_name,
-                            'last_name': shift.employee.last_name,
-                            'order_number': shift.employee.order_number,
-                        }
+    @staticmethod
+    def build(unit_pk, year, month):
+        date_format = '%Y-%m-%d'
+        workplace_list = {workplace.id: workplace for workplace in
+                          Workplace.objects.select_related('workplace_unit').filter(workplace_unit_id=unit_pk)}
+        workplace_list_pk = list(workplace_list)
+
+        shifts = Shift.objects.select_related('employee').select_related('shift_type').select_related(
+            'schedule__workplace').filter(schedule__workplace_id__in=workplace_list_pk).filter(
+            schedule__month=month).filter(
+            schedule__year=year).order_by('date')
+        days_num = calendar.monthrange(int(year), int(month))[1]
+
+        workplace_days = {}
+
+        for workplace in workplace_list.values():
+            workplace_days[workplace.id] = {'days': {}}
+            for x in range(1, days_num + 1):
+                date = datetime.date(int(year), int(month), x).strftime(date_format)
+                workplace_days[workplace.id]['days'].update({date: []})
+
+        jobtime = JobTime.objects.filter(year=int(year)).values_list(
+            calendar.month_name[int(month)].lower(), flat=True).first()
+        if jobtime is None:
+            jobtime = 160
+        statistics = unit_statistics(unit_pk, int(year), int(month), jobtime)
+
+        for shift in shifts:
+            workplace_days[shift.schedule.workplace.id]['days'][shift.date.strftime(date_format)].append((
+                {
+                    'id': shift.id,
+                    'shift_type_id': shift.shift_type.id,
+                    'shift_type_color': shift.shift_type.color,
+                    'shift_code': shift.shift_type.shift_code,
+                    'time_start': shift.shift_type.hour_start,
+                    'time_end': shift.shift_type.hour_end,
+                    'name': shift.shift_type.name,
+                    'worker': {
+                        'id': shift.employee.id,
+                        'first_name': shift.employee.first_name,
+                        'last_name': shift.employee.last_name,
+                        'order_number': shift.employee.order_number,
                     }
-                ))
-            respone_table = []
-            for workplace, value in workplace_days.items():
-                workplace_obj = workplace_list.filter(id=workplace).first()
-                data = {
-                    'unit_id': workplace_obj.workplace_unit.id,
-                    'workplace_id': workplace_obj.id,
-                    'unit_name': workplace_obj.workplace_unit.name,
-                    'workplace_name': workplace_obj.name,
-                    'days': value.get('days'),
-                    'statistics': statistics,
-                    'free_days': free_days(int(year), int(month)),
-                    'jobtime': jobtime,
                 }
-                respone_table.append(
-                    {'schedule': data, 'workplace': {'id': workplace_obj.id, 'name': workplace_obj.name},
-                     'date': {'month': month, 'year': year}})
-            '''response = {
-                'unit_id': unit.id,
-                # 'workplace_id': workplace.id,
-                'unit_name': unit.name,
-                # 'workplace_name': workplace.name,
-                'workplace_days': workplace_days,
+            ))
+        respone_table = []
+        month_free_days = free_days(int(year), int(month))
+        for workplace, value in workplace_days.items():
+            workplace_obj = workplace_list[workplace]
+            data = {
+                'unit_id': workplace_obj.workplace_unit.id,
+                'workplace_id': workplace_obj.id,
+                'unit_name': workplace_obj.workplace_unit.name,
+                'workplace_name': workplace_obj.name,
+                'days': value.get('days'),
                 'statistics': statistics,
-                'free_days': free_days(int(year), int(month)),
+                'free_days': month_free_days,
                 'jobtime': jobtime,
-            }'''
-            return Response(data=respone_table)
-        else:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+            }
+            respone_table.append(
+                {'schedule': data, 'workplace': {'id': workplace_obj.id, 'name': workplace_obj.name},
+                 'date': {'month': month, 'year': year}})
+        '''response = {
+            'unit_id': unit.id,
+            # 'workplace_id': workplace.id,
+            'unit_name': unit.name,
+            # 'workplace_name': workplace.name,
+            'workplace_days': workplace_days,
+            'statistics': statistics,
+            'free_days': free_days(int(year), int(month)),
+            'jobtime': jobtime,
+        }'''
+        return respone_table
 
 
 class ShiftManageApiView(APIView):
@@ -571,6 +635,7 @@ class ShiftManageApiView(APIView):
                     return Response(status=status.HTTP_400_BAD_REQUEST)
                 schedule = Schedule(year=date.year, month=date.month, workplace=workplace)
                 schedule.save()
+            # Cached months are invalidated by signals of Shift
             Shift(date=date, employee=employee, schedule=schedule, shift_type=shift_type).save()
 
         return Response()
@@ -579,7 +644,7 @@ class ShiftManageApiView(APIView):
         employee = self.request.data.get("Employee")
         shift = self.request.data.get("Shift")
         if shift and employee:
-            shift = Shift.objects.filter(pk=shift).first()
+            shift = Shift.objects.select_related('schedule').filter(pk=shift).first()
             employee = Employee.objects.filter(pk=employee).first()
             if not shift or not employee:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -590,10 +655,117 @@ class ShiftManageApiView(APIView):
     def delete(self, request):
         shift = self.request.data.get("Shift")
         if shift:
-            Shift.objects.filter(pk=shift).delete()
+            shift = Shift.objects.select_related('schedule').filter(pk=shift).first()
+            if shift:
+                shift.delete()
         return Response()
 
 
+class ShiftBatchApiView(APIView):
+    """Applies a list of shift operations of one month at once.
+
+    Operations are validated together against the loaded month and applied in one transaction, so either all of them
+    are saved or none:
+        {"op": "add", "date": "2023-01-05", "employee": 1, "shift_type": 2, "workplace": 3}
+        {"op": "move", "shift": 10, "employee": 2, "date": "2023-01-06"} (employee and date are optional)
+        {"op": "delete", "shift": 11}
+    The response contains new month versions of the changed units (the same as in ETags of the month views, None if
+    schedules aren't cached).
+    """
+    permission_classes = [Issupervisor]
+
+    def post(self, request):
+        org_id = request.user.user_org_id
+        try:
+            year, month = int(request.data.get('year')), int(request.data.get('month'))
+        except (TypeError, ValueError):
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'detail': 'Year and month are required'})
+        operations = request.data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'detail': 'Operations are required'})
+
+        # Everything the operations refer to is loaded up front, one query per model
+        def ids(key, ops=('add', 'move', 'delete')):
+            return {o.get(key) for o in operations if isinstance(o, dict) and o.get('op') in ops and o.get(key) is not None}
+
+        shifts = Shift.objects.select_related('schedule').filter(pk__in=ids('shift', ('move', 'delete'))).filter(
+            schedule__workplace__workplace_unit__unit_org_id=org_id).filter(schedule__year=year).filter(schedule__month=month).in_bulk()
+        employees = Employee.objects.filter(user_org_id=org_id).in_bulk(ids('employee'))
+        shift_types = ShiftType.objects.in_bulk(ids('shift_type', ('add',)))
+        workplaces = Workplace.objects.filter(workplace_unit__unit_org_id=org_id).in_bulk(ids('workplace', ('add',)))
+        schedules = {schedule.workplace_id: schedule for schedule in
+                     Schedule.objects.filter(year=year).filter(month=month).filter(workplace_id__in=workplaces)}
+
+        def month_date(value):
+            try:
+                date = datetime.date.fromisoformat(value)
+            except (TypeError, ValueError):
+                return None
+            return date if (date.year, date.month) == (year, month) else None
+
+        errors = []
+        added, moved, deleted = [], {}, set()
+        for i, operation in enumerate(operations):
+            operation = operation if isinstance(operation, dict) else {}
+            match operation.get('op'):
+                case 'add':
+                    date = month_date(operation.get('date'))
+                    employee = employees.get(operation.get('employee'))
+                    shift_type = shift_types.get(operation.get('shift_type'))
+                    workplace = workplaces.get(operation.get('workplace'))
+                    if not date or not employee or not shift_type or not workplace or shift_type.workplace_id != workplace.id:
+                        errors.append({'index': i, 'detail': 'Invalid date, employee, shift type or workplace'})
+                        continue
+                    added.append((workplace, Shift(date=date, employee=employee, shift_type=shift_type)))
+                case 'move':
+                    shift = shifts.get(operation.get('shift'))
+                    employee = employees.get(operation.get('employee')) if 'employee' in operation else None
+                    date = month_date(operation.get('date')) if 'date' in operation else None
+                    if not shift or shift.pk in deleted or ('employee' in operation and not employee) or ('date' in operation and not date):
+                        errors.append({'index': i, 'detail': 'Invalid shift, employee or date'})
+                        continue
+                    moved.setdefault(shift.pk, shift.employee_id)
+                    if employee:
+                        shift.employee = employee
+                    if date:
+                        shift.date = date
+                case 'delete':
+                    shift = shifts.get(operation.get('shift'))
+                    if not shift or shift.pk in deleted:
+                        errors.append({'index': i, 'detail': 'Invalid shift'})
+                        continue
+                    deleted.add(shift.pk)
+                case _:
+                    errors.append({'index': i, 'detail': 'Unknown operation'})
+
+        if errors:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'errors': errors})
+
+        with transaction.atomic():
+            for workplace, shift in added:
+                if workplace.id not in schedules:
+                    schedules[workplace.id] = Schedule.objects.create(year=year, month=month, workplace=workplace)
+                shift.schedule = schedules[workplace.id]
+            added = [shift for _, shift in added]
+            Shift.objects.bulk_create(added)
+            Shift.objects.bulk_update([shifts[pk] for pk in moved if pk not in deleted], ['employee', 'date'])
+            with bulk_shift_writes():
+                Shift.objects.filter(pk__in=deleted).delete()
+
+            changed = [shifts[pk] for pk in moved.keys() | deleted]
+            invalidate_shifts(year, month, workplace_ids={shift.schedule.workplace_id for shift in added + changed},
+                              employee_ids={shift.employee_id for shift in added + changed} | set(moved.values()))
+
+        units = set(Workplace.objects.filter(pk__in={shift.schedule.workplace_id for shift in added + changed}).values_list(
+            'workplace_unit_id', flat=True))
+        return Response(data={
+            'created': [shift.pk for shift in added],
+            'moved': len(moved.keys() - deleted),
+            'deleted': len(deleted),
+            'versions': {unit_id: month_version(unit_id, year, month) for unit_id in units},
+        })
+
+
 class PreferenceViewSet(viewsets.ModelViewSet):
     queryset = Preference.objects.all()
     serializer_class = PreferenceSerializer
@@ -739,8 +911,5 @@ class FreeDayViewSet(viewsets.ModelViewSet):
 class CheckAlgorithmView(APIView):
 
     def get(self, request):
-        a_task = AlgorithmTask.objects.filter(organization_id=request.user.user_org_id).exists()
-        task_status = False
-        if a_task:
-            task_status = True
+        task_status = AlgorithmTask.is_running(request.user.user_org_id)
         return Response(status=status.HTTP_200_OK, data={'task_status': task_status})
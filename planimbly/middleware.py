@@ -2,7 +2,8 @@ from django.http import HttpResponse
 from django.template.loader import render_to_string
 
 from apps.schedules.models import AlgorithmTask
-from apps.schedules.views import CheckAlgorithmView
+from apps.schedules.views import CheckAlgorithmView, GenerationJobGetApiView, GenerationJobCancelApiView, \
+    GenerationJobResultApiView, GenerationJobDraftApiView, GenerationJobAcceptApiView, GenerationRunListApiView, GenerationRunTrendApiView
 
 
 class DenyAccesHueyMiddleware:
@@ -26,11 +27,13 @@ class DenyAccesHueyMiddleware:
         else:
             view_class = None
 
+        # Views used while the algorithm is running don't need the check at all
+        if view_class in (CheckAlgorithmView, GenerationJobGetApiView, GenerationJobCancelApiView, GenerationJobResultApiView,
+                          GenerationJobDraftApiView, GenerationJobAcceptApiView, GenerationRunListApiView, GenerationRunTrendApiView):
+            return None
+
         if not request.user.is_anonymous:
-            if AlgorithmTask.objects.filter(organization_id=request.user.user_org_id).exists():
-                if view_class is not None:
-                    if view_class == CheckAlgorithmView:
-                        return None
+            if AlgorithmTask.is_running(request.user.user_org_id):
                 rendered = render_to_string('schedules/schedule_generating.html')
                 return HttpResponse(rendered)
         return None
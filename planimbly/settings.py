@@ -12,8 +12,9 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 from pathlib import Path
 
 import django.conf.global_settings
+from django.core.exceptions import ImproperlyConfigured
 from environs import Env
-from huey import RedisHuey
+from huey import PriorityRedisHuey
 from redis import ConnectionPool
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -210,7 +211,27 @@ if DEBUG:
 USE_HUEY = env.bool("USE_HUEY", default=False)
 REDIS_HOST = env.str("REDIS_HOST", default='localhost')
 pool = ConnectionPool(host=REDIS_HOST, port=6379, max_connections=20)
-HUEY = RedisHuey('planimbly', connection_pool=pool)
+HUEY = PriorityRedisHuey('planimbly', connection_pool=pool)
+# Huey worker and web server workers run in separate processes, so flags and schedules shared by them have to be cached
+# in Redis. Without it schedules aren't cached at all (see apps.schedules.read_model)
+USE_REDIS_CACHE = env.bool("USE_REDIS_CACHE", default=USE_HUEY)
+if USE_REDIS_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:6379/1',
+        }
+    }
+elif USE_HUEY:
+    raise ImproperlyConfigured("USE_HUEY requires USE_REDIS_CACHE, the huey worker and web server share flags through the cache")
+ALGORITHM_RUNNING_TTL = env.int("ALGORITHM_RUNNING_TTL", default=15 * 60)
+# Cached month schedules are invalidated by versions, the TTL only limits memory used by unused ones
+SCHEDULE_CACHE_TTL = env.int("SCHEDULE_CACHE_TTL", default=60 * 60)
+# Number of generation jobs of one organization which can be queued in huey or solved at the same time
+GENERATION_MAX_RUNNING_PER_ORG = env.int("GENERATION_MAX_RUNNING_PER_ORG", default=1)
+# Running job without a heartbeat for this many seconds (or dispatched one not started in time) has lost its worker
+GENERATION_HEARTBEAT_TIMEOUT = env.int("GENERATION_HEARTBEAT_TIMEOUT", default=5 * 60)
+GENERATION_DISPATCH_TIMEOUT = env.int("GENERATION_DISPATCH_TIMEOUT", default=60 * 60)
 
 # Log 500 Error
 DEBUG_PROPAGATE_EXCEPTIONS = True
@@ -2,8 +2,7 @@ from datetime import date, datetime as dt, timedelta
 
 from loguru import logger
 
-from apps.accounts.models import Employee
-from apps.schedules.models import ShiftType
+from scripts.data import EmployeeData, ShiftTypeData
 from scripts.helpers import get_month_by_weeks, get_month_by_billing_weeks, get_letters_for_weekday
 
 
@@ -13,16 +12,18 @@ class ShiftTypeInfo:
 
     Attributes:
     -------
-    shift_type : ShiftType
-        Variable to keep certain ShiftType object (shift).
+    shift_type : ShiftTypeData
+        Variable to keep certain ShiftTypeData object (shift).
     duration : int
         The number representing shift durations in minutes.
     id = int
         Shift's id.
     closings : list
-        The list of WorkplaceClosing objects containing information about closed days for certain shift.
+        The list of ClosingData objects containing information about closed days for certain shift.
     closing_days : list
         The list containing days, when workplace is closed and shift unused.
+    closing_days_in_month : set
+        The set of days of the considered month, when shift is unused (prepared once by Context).
 
     Methods:
     -------
@@ -31,21 +32,22 @@ class ShiftTypeInfo:
     get_duration_in_hours
         Calculates shift duration in hours.
     prepare_closing_days
-        Turns WorkplaceClosing objects into the list of days when shift is unused.
+        Turns ClosingData objects into the list of days when shift is unused.
     get_closing_days_in_month
         Fetches all days in certain month, when shift is unused.
     get
-        Simple function to quickly get ShiftType object from ShiftTypeInfo object.
+        Simple function to quickly get ShiftTypeData object from ShiftTypeInfo object.
     """
 
-    shift_type = ShiftType
+    shift_type = ShiftTypeData
     duration = int()
     id = int()
 
     closings = list()
     closing_days = list()
+    closing_days_in_month = set()
 
-    def __init__(self, st: ShiftType, index: int()) -> None:
+    def __init__(self, st: ShiftTypeData, index: int()) -> None:
         self.shift_type = st
         self.id = index
         self.duration = (dt.combine(date.min, self.shift_type.hour_end) - dt.combine(date.min, self.shift_type.hour_start)).seconds // 60
@@ -69,7 +71,7 @@ class ShiftTypeInfo:
         return self.duration // 60
 
     def prepare_closing_days(self) -> list:
-        """ Turns WorkplaceClosing objects into the list of days when shift is unused.
+        """ Turns ClosingData objects into the list of days when shift is unused.
 
         Returns:
             list of days when shift is unused.
@@ -97,16 +99,16 @@ class ShiftTypeInfo:
         """
         return [d.day for d in self.closing_days if d.month == month and d.year == year]
 
-    def get(self) -> ShiftType:
-        """Simple function to quickly get ShiftType object from ShiftTypeInfo object.
+    def get(self) -> ShiftTypeData:
+        """Simple function to quickly get ShiftTypeData object from ShiftTypeInfo object.
 
         Returns:
-            ShiftType object from given ShiftTypeInfo object.
+            ShiftTypeData object from given ShiftTypeInfo object.
         """
         return self.shift_type
 
     def __str__(self) -> str:
-        return f"[SHIFT] ID: {self.id} | {self.shift_type.workplace} | {self.shift_type.name} | " \
+        return f"[SHIFT] ID: {self.id} | {self.shift_type.workplace_name} | {self.shift_type.name} | " \
                f"DURATION: {self.get_duration_in_hours():.1f} | DEMAND: {self.shift_type.demand}"
 
 
@@ -115,7 +117,7 @@ class EmployeeInfo:
         # TODO: docstrings here
     """
     # Bases: employee and his/her workplaces
-    employee = Employee
+    employee = EmployeeData
     workplaces = []
 
     # Preferences and assignments
@@ -128,6 +130,7 @@ class EmployeeInfo:
     # Absences (objects, separated days, time)
     absences = []
     absent_days = []
+    absent_days_in_month = set()  # Days of the considered month, prepared once by Context
     num_absent_days = 0
     absent_time = 0
 
@@ -141,7 +144,7 @@ class EmployeeInfo:
     weekly_constraints = []
     work_time_constraint = [0, 0, 0, 0, 0, 0]  # (hard_min, soft_min, min_cost, soft_max, hard_max, max_cost)
 
-    def __init__(self, emp: Employee, wp: list, pref: list, ab: list, ass: list, jt: int):
+    def __init__(self, emp: EmployeeData, wp: list, pref: list, ab: list, ass: list, jt: int):
         # Preparing bases - employee and workplaces
         self.employee = emp
         logger.debug(f"[EMPLOYEE] ID: {self.employee.pk:2d} | {self.employee.first_name} {self.employee.last_name}")
@@ -191,7 +194,7 @@ class EmployeeInfo:
                 for i in range((a.end - a.start).days + 1):
                     inter_date = a.start + timedelta(days=i)
                     ta.append((a.shift_type, a.negative_flag, inter_date))
-                    logger.debug(f"[CTX] | [TERM ASSIGNMENT] EMP: {a.employee.pk:2d} | DATE: {inter_date} | ST: {a.shift_type.id:2d} | "
+                    logger.debug(f"[CTX] | [TERM ASSIGNMENT] EMP: {a.employee_id:2d} | DATE: {inter_date} | ST: {a.shift_type.id:2d} | "
                                  f"TYPE: {'- (NEG)' if a.negative_flag else '+ (POS)'}")
 
             else:
@@ -200,7 +203,7 @@ class EmployeeInfo:
                     nia.append(a.shift_type)
                 else:
                     pia.append(a.shift_type)
-                logger.debug(f"[CTX] | [INDEF. ASSIGNMENT] EMP: {a.employee.pk:2d} | ST: {a.shift_type.id:2d} | "
+                logger.debug(f"[CTX] | [INDEF. ASSIGNMENT] EMP: {a.employee_id:2d} | ST: {a.shift_type.id:2d} | "
                              f"TYPE: {'- (NEG)' if a.negative_flag else '+ (POS)'}")
 
         logger.trace("Preparing assignments ended.")
@@ -218,7 +221,7 @@ class EmployeeInfo:
             for i in range((ab.end - ab.start).days + 1):
                 inter_date = ab.start + timedelta(days=i)
                 ad.append(inter_date)
-                logger.debug(f"[CTX] | [ABSENCE] EMP: {ab.employee.pk:2d} | DATE: {inter_date}")
+                logger.debug(f"[CTX] | [ABSENCE] EMP: {ab.employee_id:2d} | DATE: {inter_date}")
 
         logger.trace("Preparing absent days ended.")
 
@@ -228,7 +231,7 @@ class EmployeeInfo:
         """ Returns days on which given employee is absent """
         return [d.day for d in self.absent_days if d.month == month and d.year == year]
 
-    def get(self) -> Employee:
+    def get(self) -> EmployeeData:
         return self.employee
 
     def __str__(self) -> str:
@@ -243,8 +246,14 @@ class Context:
     -------
     employees : list[EmployeeInfo]
         The list containing EmployeeInfo objects with all considered employees
-    shift_types : list[ShiftType]
-        The list containing ShiftType objects with all considered shifts
+    shift_types : list[ShiftTypeInfo]
+        The list containing ShiftTypeInfo objects with all considered shifts
+    employees_by_id : dict[int, EmployeeInfo]
+        Index of EmployeeInfo objects by employee's pk.
+    shift_types_by_id : dict[int, ShiftTypeInfo]
+        Index of ShiftTypeInfo objects by shift's id.
+    shift_types_by_object : dict[ShiftTypeData, ShiftTypeInfo]
+        Index of ShiftTypeInfo objects by ShiftTypeData objects.
     month : int
         The month we generate schedule for.
     year : int
@@ -288,6 +297,8 @@ class Context:
         Determines which shifts are happening overnight.
     get_shift_info_by_id
         Simple function to quickly get ShiftTypeInfo object from shift id.
+    get_shift_info
+        Simple function to quickly get ShiftTypeInfo object from ShiftTypeData object.
     calculate_total_worktime
         Calculates total worktime during month (IN HOURS!), based on cover demands.
     prepare_requests
@@ -298,15 +309,23 @@ class Context:
         Returns EmployeeInfo object of given id.
     get_full_time_employees
         Filters employees and gets a list of full time employees.
+    is_full_time_employee
+        Checks whether given employee is a full time employee.
     """
 
     # Bases: shifts and employees
     employees = []
     shift_types = []
 
+    # Lookup tables built once per context
+    employees_by_id = {}
+    shift_types_by_id = {}
+    shift_types_by_object = {}
+
     # Timing and billing variables
     month = 0
     year = 0
+    num_days = 0
     month_by_weeks = []
     month_by_billing_weeks = []
     weekends = []
@@ -335,11 +354,11 @@ class Context:
     overtime_for_full_timers = bool
     overtime_above_full_time = int
 
-    def __init__(self, emp: list[EmployeeInfo], st: list[ShiftType], year: int, month: int, jt: int, work_for_workplace_closing: dict) -> None:
+    def __init__(self, emp: list[EmployeeInfo], st: list[ShiftTypeData], year: int, month: int, jt: int, work_for_workplace_closing: dict) -> None:
         """
         Args:
             emp: list of EmployeeInfo objects containing information about employees,
-            st - list of ShiftType objects containing information about shifts,
+            st - list of ShiftTypeData objects containing information about shifts,
             year - considered year passed from main function,
             month - considered month passed from main function,
             jt - full-time job worktime for given month,
@@ -349,10 +368,16 @@ class Context:
         self.employees = emp
         self.shift_types = [ShiftTypeInfo(s, s.pk) for s in st]
 
+        # Preparing lookup tables, so we don't have to scan lists in the model building loops
+        self.employees_by_id = {ei.get().pk: ei for ei in self.employees}
+        self.shift_types_by_id = {s.id: s for s in self.shift_types}
+        self.shift_types_by_object = {s.get(): s for s in self.shift_types}
+
         # Preparing timing and billing stuff
         self.month = month
         self.year = year
         self.month_by_weeks = get_month_by_weeks(year, month)
+        self.num_days = self.month_by_weeks[-1][-1][0]
         self.month_by_billing_weeks = get_month_by_billing_weeks(year, month)
         self.weekends = [x[-2:] for x in self.month_by_weeks if len(x) == 7]
         self.job_time = jt
@@ -362,12 +387,18 @@ class Context:
         self.overnight_shifts = self.find_overnight_shifts()
 
         for s in self.shift_types:
-            if s.get().workplace.id not in work_for_workplace_closing:
+            if s.get().workplace_id not in work_for_workplace_closing:
                 s.closings = []
             else:
-                s.closings = work_for_workplace_closing[s.get().workplace.id]
+                s.closings = work_for_workplace_closing[s.get().workplace_id]
                 s.closing_days = s.prepare_closing_days()
 
+        # Preparing absent and closing days for considered month, so we don't have to filter them for every day
+        for s in self.shift_types:
+            s.closing_days_in_month = set(s.get_closing_days_in_month(self.month, self.year))
+        for ei in self.employees:
+            ei.absent_days_in_month = set(ei.get_absent_days_in_month(self.month, self.year))
+
         # Calculating worktime and job time stuff
         self.total_work_time = self.calculate_total_work_time()
         self.ft_job_time = sum(ei.job_time for ei in self.get_full_time_employees())
@@ -478,7 +509,18 @@ class Context:
             wanted ShiftTypeInfo object
         """
 
-        return next(x for x in self.shift_types if x.id == index)
+        return self.shift_types_by_id[index]
+
+    def get_shift_info(self, shift_type: ShiftTypeData) -> ShiftTypeInfo:
+        """ Simple function to quickly get ShiftTypeInfo object from ShiftTypeData object.
+
+        Args:
+            shift_type: given ShiftTypeData object
+        Returns:
+            wanted ShiftTypeInfo object
+        """
+
+        return self.shift_types_by_object[shift_type]
 
     def get_employee_by_id(self, index: int) -> EmployeeInfo:
         """ Simple function to quickly get EmployeeInfo object from shift id.
@@ -489,7 +531,7 @@ class Context:
             wanted EmployeeInfo object
         """
 
-        return next(x for x in self.employees if x.get().pk == index)
+        return self.employees_by_id[index]
 
     def calculate_total_work_time(self) -> int:
         """ Calculates total work time during month (IN HOURS!), based on cover demands.
@@ -505,7 +547,7 @@ class Context:
         for s in self.shift_types[1:]:
             for week in self.month_by_billing_weeks:
                 for d in week:
-                    if d[0] in s.get_closing_days_in_month(self.month, self.year):
+                    if d[0] in s.closing_days_in_month:
                         continue
                     total_minutes += s.duration * s.get().demand
 
@@ -526,8 +568,8 @@ class Context:
         mwt = 0
 
         for ei in self.employees:
-            for week in get_month_by_billing_weeks(self.year, self.month):
-                num_absences = sum(x in ei.get_absent_days_in_month(self.month, self.year) for x in [d[0] for d in week])
+            for week in self.month_by_billing_weeks:
+                num_absences = sum(d[0] in ei.absent_days_in_month for d in week)
                 max_week_work_time = 8 * len(week)
                 if num_absences > 1:
                     max_week_work_time -= num_absences * 8
@@ -554,12 +596,16 @@ class Context:
 
         for ei in self.employees:
             for pref in ei.preferences:
+                if pref.shift_type not in self.shift_types_by_object:
+                    logger.warning(f"[CTX] | [PREFERENCE] EMP: {ei.employee.pk:2d} | SHIFT: {pref.shift_type.id} - shift is not considered, skipping")
+                    continue
+                st = self.get_shift_info(pref.shift_type)
                 for week in self.month_by_billing_weeks:
                     for d in week:
                         if pref.active_days[d[1]] == "1":
-                            req.append((ei.employee.pk, next(st.get().id for st in self.shift_types if pref.shift_type == st.get()), d[0], -1))
+                            req.append((ei.employee.pk, st.id, d[0], -1))
                             logger.debug(f"[CTX] | [PREFERENCE] EMP: {ei.employee.pk:2d} | "
-                                         f"SHIFT: {next(st.get().name for st in self.shift_types if pref.shift_type == st.get())} | "
+                                         f"SHIFT: {st.get().name} | "
                                          f"DAY: {d[0]:2d} | WEEKDAY: {get_letters_for_weekday(d[1])} | WEIGHT: {-1}")
 
         logger.trace("Preparing requests ended.")
@@ -578,7 +624,7 @@ class Context:
         fa = []
 
         for ei in self.employees:
-            for d in ei.get_absent_days_in_month(self.month, self.year):
+            for d in sorted(ei.absent_days_in_month):
                 logger.debug(f"[CTX] | [ABSENCE] EMP: {ei.employee.pk:2d} | DAY: {d:2d} | MONTH: {self.month:2d}")
                 fa.append((ei.employee.pk, 0, d))
 
@@ -593,7 +639,16 @@ class Context:
             list of full time employees or empty list if there are no full time employees.
         """
 
-        return [ei for ei in self.employees if ei.desired_job_time == self.job_time]
+        return [ei for ei in self.employees if self.is_full_time_employee(ei)]
+
+    def is_full_time_employee(self, ei: EmployeeInfo) -> bool:
+        """Checks whether given employee is a full time employee.
+
+        Returns:
+            True if employee's desired job time is equal to full-time job time.
+        """
+
+        return ei.desired_job_time == self.job_time
 
     def log_context_data(self):
         if not self.employees:
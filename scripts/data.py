@@ -0,0 +1,75 @@
+"""Plain data classes the algorithm works on.
+
+The algorithm doesn't depend on Django, objects of these classes are prepared from database rows by the adapter
+(apps.schedules.generation) and generated shifts are turned back into Shift model objects there.
+"""
+
+from dataclasses import dataclass
+from datetime import date, time
+
+
+@dataclass(slots=True, frozen=True)
+class EmployeeData:
+    id: int
+    job_time: str
+    first_name: str = ""
+    last_name: str = ""
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+
+@dataclass(slots=True, frozen=True)
+class ShiftTypeData:
+    id: int
+    workplace_id: int
+    hour_start: time
+    hour_end: time
+    name: str = ""
+    shift_code: str = ""
+    demand: int = 1
+    active_days: str = "1111111"
+    workplace_name: str = ""
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+
+@dataclass(slots=True, frozen=True)
+class PreferenceData:
+    employee_id: int
+    shift_type: ShiftTypeData
+    active_days: str
+
+
+@dataclass(slots=True, frozen=True)
+class AbsenceData:
+    employee_id: int
+    start: date
+    end: date
+    hours_number: int
+
+
+@dataclass(slots=True, frozen=True)
+class AssignmentData:
+    employee_id: int
+    shift_type: ShiftTypeData
+    negative_flag: bool
+    start: date = None
+    end: date = None
+
+
+@dataclass(slots=True, frozen=True)
+class ClosingData:
+    workplace_id: int
+    start: date
+    end: date
+
+
+@dataclass(slots=True, frozen=True)
+class ShiftData:
+    date: date
+    employee_id: int
+    shift_type_id: int
@@ -1,5 +1,9 @@
 import calendar
+import json
+import os
+import threading
 import time
+from contextlib import contextmanager
 from math import floor, ceil
 
 from loguru import logger
@@ -81,16 +85,264 @@ def ceil_to_multiple(number, multiple: int):
     return multiple * ceil(number / multiple)
 
 
+# Solver presets chosen automatically by instance size (number of possible employee, shift, day assignments)
+SOLVER_PRESETS = [
+    (10000, {"num_workers": 4, "max_time_in_seconds": 60.0, "relative_gap_limit": 0.0, "presolve_level": "DEFAULT",
+             "stop_after_first_solution": False, "plateau_window": 15.0, "plateau_delta": 0}),
+    (60000, {"num_workers": 8, "max_time_in_seconds": 180.0, "relative_gap_limit": 0.01, "presolve_level": "DEFAULT",
+             "stop_after_first_solution": False, "plateau_window": 30.0, "plateau_delta": 0}),
+    (None, {"num_workers": 8, "max_time_in_seconds": 300.0, "relative_gap_limit": 0.02, "presolve_level": "AGGRESSIVE",
+            "stop_after_first_solution": False, "plateau_window": 45.0, "plateau_delta": 0}),
+]
+
+
+def choose_solver_preset(num_employees: int, num_shift_types: int, num_days: int) -> dict:
+    """Chooses solver preset based on the size of the instance.
+
+    Returns:
+        dictionary with solver profile values
+    """
+    size = num_employees * (num_shift_types + 1) * num_days
+    for max_size, preset in SOLVER_PRESETS:
+        if max_size is None or size <= max_size:
+            return dict(preset)
+
+
+def get_solver_params(profile: dict) -> str:
+    """Turns solver profile into CP-SAT parameters string.
+
+    Args:
+        profile: dictionary with num_workers, max_time_in_seconds, relative_gap_limit, presolve_level
+            and stop_after_first_solution keys
+
+    Returns:
+        parameters string for CP-SAT solver
+    """
+    num_workers = max(1, min(profile["num_workers"], os.cpu_count() or 1))
+    params = [f"max_time_in_seconds:{float(profile['max_time_in_seconds'])}", f"num_workers:{num_workers}"]
+
+    if profile["relative_gap_limit"] > 0:
+        params.append(f"relative_gap_limit:{float(profile['relative_gap_limit'])}")
+
+    match profile["presolve_level"]:
+        case "OFF":
+            params.append("cp_model_presolve:false")
+        case "AGGRESSIVE":
+            params.append("cp_model_probing_level:3")
+            params.append("max_presolve_iterations:10")
+
+    if profile["stop_after_first_solution"]:
+        params.append("stop_after_first_solution:true")
+
+    return " ".join(params)
+
+
 class SolutionsLoggerPrinter(cp_model.ObjectiveSolutionPrinter):
-    def __init__(self):
-        cp_model.ObjectiveSolutionPrinter.__init__(self)
+    """Logs every improving solution and stops the search once it has converged.
+
+    The search is stopped when the objective hasn't improved by more than plateau_delta within plateau_window seconds
+    or when the relative gap between the objective and the best bound has reached gap_limit. As callbacks are only
+    called on new solutions, the plateau is also watched by a separate thread between start_watchdog and finish.
+    The reason of stopping the search is kept in stop_reason.
+
+    If progress_callback is given, it is called with progress dictionary after every solution and once a second while
+    searching. The search is stopped when it returns a truthy value, a string returned is used as the stop reason
+    (e.g. "accepted"), anything else stops the search as cancelled.
+
+    If draft_callback is given, it is called with the printer itself on every draft_every-th improving solution, but not
+    more often than once per draft_interval seconds. It's called from the solver thread while the solution is current,
+    so it can read it with Value/BooleanValue, and should only copy what it needs.
+    """
+
+    def __init__(self, plateau_window: float = None, plateau_delta: int = 0, gap_limit: float = None, progress_callback=None,
+                 draft_callback=None, draft_every: int = 1, draft_interval: float = 5.0):
         super().__init__()
         self.__solution_count = 0
         self.__start_time = time.time()
 
+        self.plateau_window = plateau_window
+        self.plateau_delta = plateau_delta
+        self.gap_limit = gap_limit
+        self.progress_callback = progress_callback
+        self.draft_callback = draft_callback
+        self.draft_every = max(1, draft_every)
+        self.draft_interval = draft_interval
+
+        self.best_objective = None
+        self.best_bound = None
+        self.first_solution_time = None
+        self.last_improvement_time = None
+        self.stop_reason = None
+
+        self.__reference_objective = None
+        self.__last_draft_time = None
+        self.__finished = threading.Event()
+        self.__watchdog = None
+
     def on_solution_callback(self):
         """Called on each new solution."""
         current_time = time.time()
         obj = self.ObjectiveValue()
         logger.log("MODEL", f"Solution {self.__solution_count} | Time = {current_time - self.__start_time:.2f} s | Objective = {int(obj)}")
         self.__solution_count += 1
+
+        if self.first_solution_time is None:
+            self.first_solution_time = current_time - self.__start_time
+
+        # Only improvements bigger than plateau_delta count as progress
+        if self.__reference_objective is None or self.__reference_objective - obj > self.plateau_delta:
+            self.__reference_objective = obj
+            self.last_improvement_time = current_time
+
+        self.best_objective = obj
+        self.best_bound = self.BestObjectiveBound()
+
+        if self.gap_limit and self.get_relative_gap() <= self.gap_limit:
+            self.stop(f"gap {self.get_relative_gap():.4f} reached")
+        elif self.plateau_reached(current_time):
+            self.stop("plateau")
+        else:
+            self.report_progress()
+            self.report_draft(current_time)
+
+    def solution_count(self) -> int:
+        return self.__solution_count
+
+    def progress(self) -> dict:
+        return {"solutions": self.__solution_count, "objective": self.best_objective, "bound": self.best_bound,
+                "elapsed": time.time() - self.__start_time}
+
+    def report_progress(self):
+        if self.progress_callback is not None:
+            reason = self.progress_callback(self.progress())
+            if reason:
+                self.stop(reason if isinstance(reason, str) else "cancelled")
+
+    def report_draft(self, current_time: float):
+        """Passes the current solution to draft_callback, starting with the first one, every draft_every-th solution
+        and at most once per draft_interval."""
+        if self.draft_callback is None or self.stop_reason is not None or (self.__solution_count - 1) % self.draft_every != 0:
+            return
+        if self.__last_draft_time is not None and current_time - self.__last_draft_time < self.draft_interval:
+            return
+        self.__last_draft_time = current_time
+        self.draft_callback(self)
+
+    def get_relative_gap(self) -> float:
+        """Calculates relative gap between the best objective and the best bound (same formula as CP-SAT uses)."""
+        if self.best_objective is None:
+            return float("inf")
+        return abs(self.best_objective - self.best_bound) / max(1.0, abs(self.best_objective))
+
+    def plateau_reached(self, current_time: float) -> bool:
+        return self.plateau_window is not None and self.last_improvement_time is not None \
+            and current_time - self.last_improvement_time >= self.plateau_window
+
+    def stop(self, reason: str):
+        if self.stop_reason is None:
+            self.stop_reason = reason
+            logger.log("MODEL", f"Stopping search: {reason}")
+            self.StopSearch()
+
+    def start_watchdog(self):
+        """Starts a thread stopping the search when no solution has improved the objective within plateau window
+        and reporting progress."""
+        if self.plateau_window or self.progress_callback is not None:
+            self.__watchdog = threading.Thread(target=self.__watch, daemon=True)
+            self.__watchdog.start()
+
+    def __watch(self):
+        while not self.__finished.wait(min(1.0, self.plateau_window or 1.0)):
+            if self.plateau_reached(time.time()):
+                self.stop("plateau")
+                return
+            self.report_progress()
+            if self.stop_reason is not None:
+                return
+
+    def finish(self, status: int):
+        """Stops the watchdog and sets stop reason when the search has ended by itself."""
+        self.__finished.set()
+        if self.__watchdog is not None:
+            self.__watchdog.join()
+
+        if self.stop_reason is None:
+            match status:
+                case cp_model.OPTIMAL:
+                    self.stop_reason = "optimal"
+                case cp_model.FEASIBLE:
+                    self.stop_reason = "limit reached"
+                case cp_model.INFEASIBLE:
+                    self.stop_reason = "infeasible"
+                case cp_model.MODEL_INVALID:
+                    self.stop_reason = "model invalid"
+                case _:
+                    self.stop_reason = "no solution found"
+
+
+class WorkVariables(dict):
+    """Sparse storage of the (employee, shift, day) decision variables.
+
+    Only triples an employee is eligible for get a BoolVar, looking up any other key returns a shared constant false
+    literal. Thanks to that constraint builders don't have to know which variables have been materialized.
+    """
+
+    def __init__(self, model: cp_model.CpModel):
+        super().__init__()
+        self.false_literal = model.NewConstant(0)
+
+    def __missing__(self, key):
+        return self.false_literal
+
+
+class ModelStatistics:
+    """Keeps track of the model size and build time per constraint family.
+
+    Counts are calculated from the model proto before and after given family has been added, so constraint builders
+    don't need to report anything by themselves.
+    """
+
+    BOOL_CLAUSES = ("bool_or", "bool_and", "at_most_one", "exactly_one", "bool_xor")
+
+    def __init__(self, model: cp_model.CpModel):
+        self.model = model
+        self.families = dict()
+
+    @contextmanager
+    def family(self, name: str):
+        """Counts variables and constraints added to the model within the context as the ones of given family."""
+        proto = self.model.Proto()
+        first_variable = len(proto.variables)
+        first_constraint = len(proto.constraints)
+        start_time = time.perf_counter()
+
+        yield
+
+        stats = self.families.setdefault(name, {"variables": 0, "linear_constraints": 0, "bool_clauses": 0, "build_time": 0.0})
+        stats["build_time"] += time.perf_counter() - start_time
+        stats["variables"] += len(proto.variables) - first_variable
+        for ct in proto.constraints[first_constraint:]:
+            if ct.WhichOneof("constraint") in self.BOOL_CLAUSES:
+                stats["bool_clauses"] += 1
+            else:
+                stats["linear_constraints"] += 1
+
+    def totals(self) -> dict:
+        """Sums up statistics of all constraint families."""
+        totals = {"variables": 0, "linear_constraints": 0, "bool_clauses": 0, "build_time": 0.0}
+        for stats in self.families.values():
+            for key in totals:
+                totals[key] += stats[key]
+        return totals
+
+    def as_dict(self) -> dict:
+        return {"families": self.families, "totals": self.totals()}
+
+    def log(self):
+        for name, stats in self.families.items():
+            logger.log("MODEL", f"  - {name:<22}: {stats['variables']:7d} vars | {stats['linear_constraints']:7d} linear | "
+                                f"{stats['bool_clauses']:7d} bool clauses | {stats['build_time']:7.3f} s")
+        totals = self.totals()
+        logger.log("MODEL", f"  - {'TOTAL':<22}: {totals['variables']:7d} vars | {totals['linear_constraints']:7d} linear | "
+                            f"{totals['bool_clauses']:7d} bool clauses | {totals['build_time']:7.3f} s")
+        logger.bind(statistics=True).debug(json.dumps(self.as_dict()))
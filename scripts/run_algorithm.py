@@ -13,22 +13,30 @@
 # limitations under the License.
 """Creates a shift scheduling problem and solves it."""
 
+import multiprocessing
 import operator
+import re
 import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime as dt, timedelta
+from os import cpu_count
 
 from absl import flags
 from google.protobuf import text_format
 from loguru import logger
 from ortools.sat.python import cp_model
 
-from apps.accounts.models import Employee
-from apps.organizations.models import Workplace
-from apps.schedules.models import Shift, ShiftType
 from scripts.context import Context, EmployeeInfo
-from scripts.helpers import get_month_by_weeks, get_letters_for_weekday, flatten, floor_to_multiple, ceil_to_multiple, SolutionsLoggerPrinter
+from scripts.data import EmployeeData, ShiftTypeData, ShiftData
+from scripts.helpers import get_month_by_weeks, get_letters_for_weekday, flatten, floor_to_multiple, ceil_to_multiple, \
+    SolutionsLoggerPrinter, WorkVariables, ModelStatistics, \
+    choose_solver_preset, get_solver_params
 
-global num_days
+# Sinks and levels of loguru are global, so one process solves one month at a time, otherwise runs would mix (and remove)
+# each other's logs
+ALGORITHM_LOCK = threading.Lock()
 
 FLAGS = flags.FLAGS
 flags.DEFINE_string('output_proto', 'cp_model.proto', 'Output file to write the cp_model proto to.')
@@ -197,7 +205,7 @@ def add_weekly_soft_sum_constraint(model, works, hard_min, soft_min, min_cost,
 
 
 def add_monthly_soft_sum_constraint(model, works, hard_min, soft_min, min_cost,
-                                    soft_max, hard_max, max_cost, prefix):
+                                    soft_max, hard_max, max_cost, prefix, num_days):
     """Sum constraint with soft and hard bounds.
 
   This constraint counts the variables assigned to true from works.
@@ -220,6 +228,7 @@ def add_monthly_soft_sum_constraint(model, works, hard_min, soft_min, min_cost,
     max_cost: the coefficient of the linear penalty if the sum is more than
       soft_max.
     prefix: a base name for penalty variables.
+    num_days: number of days of the month.
 
   Returns:
     a tuple (variables_list, coefficient_list) containing the different
@@ -254,9 +263,260 @@ def add_monthly_soft_sum_constraint(model, works, hard_min, soft_min, min_cost,
     return cost_variables, cost_coefficients
 
 
-def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, emp_assignments, schedule_dict,
-                           employees: list[Employee], shift_types: list[ShiftType], work_for_workplace_closing,
-                           shifts_before, year: int, month: int, job_time, params, output_proto):
+def weekend_transition_clauses(ctx: Context, work, forbidden_work, weekend_days):
+    """Generates clauses for weekend transition constraints.
+
+    - night shift on Friday and free weekend -> shift on Monday should start at least at 11:00,
+    - working on the weekend -> 24 hours of rest before the next shift.
+
+    Each clause is a tuple of (employee, shift, day) keys of the work variables and at least one of them has to be false.
+    Every clause is generated exactly once, no matter how many employees, overnight shifts or days share it.
+
+    Args:
+        ctx: context of the solved problem
+        work: work variables of the model
+        forbidden_work: set of forbidden (employee, shift, day) triples
+        weekend_days: list of (day, weekday) tuples of Fridays and Saturdays to consider
+
+    Yields:
+        tuples of work keys
+    """
+
+    # Shifts starting before 11:00
+    midnight = dt.min
+    early_shifts = []
+    for i in ctx.shift_types[1:]:
+        delta = dt.combine(dt.min, i.get().hour_start) - midnight
+        if int(delta.total_seconds() // 60) < (11 * 60):
+            early_shifts.append(i.id)
+
+    # Shifts starting less than 24 hours after the end of the previous day shift (previous shift id: list of next shift ids)
+    overnight_shifts = [x[0] for x in ctx.overnight_shifts[0]]
+    short_rest_transitions = {}
+    for i in ctx.shift_types[1:]:
+        hr_end = dt.combine(dt.min, i.get().hour_end)
+        if i.id in overnight_shifts:
+            hr_end = hr_end + timedelta(days=1)
+        for j in ctx.shift_types[1:]:
+            delta = dt.combine(dt.min + timedelta(days=1), j.get().hour_start) - hr_end
+            if int(delta.total_seconds() // 60) < (24 * 60):
+                short_rest_transitions.setdefault(i.id, []).append(j.id)
+
+    emitted = set()
+
+    def emit(clause):
+        if clause not in emitted:
+            emitted.add(clause)
+            return True
+        return False
+
+    num_days = ctx.num_days
+    for d, weekday in weekend_days:
+        if weekday == 4 and 0 < d + 3 <= num_days:
+            # Night shift on Friday, free weekend -> shift on Monday should start at least at 11:00
+            for os in overnight_shifts:
+                for ei in ctx.employees:
+                    e = ei.get().pk
+                    if (e, os, d) in forbidden_work or (e, os, d) not in work \
+                            or (e, 0, d + 1) in forbidden_work or (e, 0, d + 2) in forbidden_work:
+                        continue
+                    for fs in early_shifts:
+                        if (e, fs, d + 3) in forbidden_work:
+                            continue
+                        clause = ((e, os, d), (e, 0, d + 1), (e, 0, d + 2), (e, fs, d + 3))
+                        if emit(clause):
+                            yield clause
+
+        elif weekday == 5 and 0 < d + 2 <= num_days:
+            # Working on the weekend -> 24hrs of rest
+            for ei in ctx.employees:
+                e = ei.get().pk
+                if (e, 0, d) in forbidden_work or (e, 0, d + 1) in forbidden_work or (e, 0, d + 2) in forbidden_work:
+                    continue
+                shift_types = list(ei.allowed_shift_types.keys())[1:]
+                for i in shift_types:
+                    if d not in ei.allowed_shift_types[i]:
+                        continue
+                    for j in shift_types:
+                        if d + 1 not in ei.allowed_shift_types[j]:
+                            continue
+                        for k in short_rest_transitions.get(j.id, []):
+                            if (e, k, d + 2) in forbidden_work:
+                                continue
+                            clause = ((e, i.id, d), (e, j.id, d + 1), (e, k, d + 2))
+                            if emit(clause):
+                                yield clause
+
+
+def solution_hints(ctx, work, forbidden_work, shifts_hint, year: int, month: int):
+    """Maps existing shifts onto work variables of the model so they can be used as a warm start.
+
+    Shifts of the scheduled month are mapped onto their own day. Shifts from before the month (the last four weeks of
+    the previous month) are rolled forward in steps of four weeks, so weekdays are preserved. Every variable of an
+    employee present in hinted shifts is hinted, days without hinted shift are hinted as free.
+
+    Args:
+        ctx: Context object
+        work: work variables of the model
+        forbidden_work: set of forbidden (employee, shift, day) triples
+        shifts_hint: dictionary with existing shifts (date: list of shifts)
+        year: year of the schedule
+        month: month of the schedule
+
+    Returns:
+        dictionary with hinted values of work variables (work key: 0 or 1)
+    """
+
+    num_days = ctx.num_days
+    first_day = dt(year, month, 1).date()
+    hinted_days = dict()  # Key: (employee pk, day), Value: shift type id
+    for date, d_shifts in sorted(shifts_hint.items()):
+        offset = (date - first_day).days + 1
+        days = [offset] if offset > 0 else range(offset + 28, num_days + 1, 28)
+        for d in days:
+            if 0 < d <= num_days:
+                for s in d_shifts:
+                    hinted_days.setdefault((s.employee_id, d), s.shift_type_id)
+
+    hinted_employees = {e for e, _ in hinted_days}
+    hints = dict()
+    for ei in ctx.employees:
+        e = ei.get().pk
+        if e not in hinted_employees:
+            continue
+        for d in range(1, num_days + 1):
+            hinted_shift = hinted_days.get((e, d), 0)
+            if (e, hinted_shift, d) in forbidden_work or (e, hinted_shift, d) not in work:
+                hinted_shift = 0
+            for s in ctx.shift_types:
+                if (e, s.id, d) in work and (e, s.id, d) not in forbidden_work:
+                    hints[e, s.id, d] = int(s.id == hinted_shift)
+
+    return hints
+
+
+def repair_window(ctx, repair, radius: int = 2):
+    """Prepares the part of the schedule which is solved again in repair mode.
+
+    The window consists of changed employees and their co-workers (employees sharing a workplace with them) on changed
+    days and the days within the radius around them. If no days were changed, changed employees are freed for the
+    whole month.
+
+    Args:
+        ctx: Context object
+        repair: dictionary with ids of changed employees and numbers of changed days ({"employees": [], "days": []})
+        radius: number of days around each changed day which are freed too
+
+    Returns:
+        set of (employee pk, day) tuples which aren't pinned to the existing schedule
+    """
+
+    num_days = ctx.num_days
+    changed_employees = set(repair.get("employees", []))
+    changed_days = set(repair.get("days", []))
+
+    if not changed_days:
+        return {(e, d) for e in changed_employees for d in range(1, num_days + 1)}
+
+    days = {d + r for d in changed_days for r in range(-radius, radius + 1) if 0 < d + r <= num_days}
+    workplaces = {wp for ei in ctx.employees if ei.get().pk in changed_employees for wp in ei.workplaces}
+    employees = {ei.get().pk for ei in ctx.employees if ei.get().pk in changed_employees or workplaces.intersection(ei.workplaces)}
+
+    return {(e, d) for e in employees for d in days}
+
+
+def pinned_hints(hints, window):
+    """Selects hinted values which are fixed in repair mode, i.e. all hinted variables outside of the repair window.
+
+    Args:
+        hints: dictionary with hinted values of work variables (work key: 0 or 1)
+        window: set of (employee pk, day) tuples which are solved again
+
+    Returns:
+        dictionary with values of work variables which can't be changed (work key: 0 or 1)
+    """
+
+    return {(e, s, d): value for (e, s, d), value in hints.items() if (e, d) not in window}
+
+
+def partition_workplaces(emp_for_workplaces, emp_assignments):
+    """Splits workplaces into independent groups which can be solved separately.
+
+    Groups are connected components of the bipartite employee-workplace graph. Employee is connected with workplaces
+    he/she belongs to and with workplaces of shift types he/she is assigned to.
+
+    Args:
+        emp_for_workplaces: dictionary with employees assigned to workplace (workplace id: list of employees from workplace)
+        emp_assignments: dictionary with assignments objects assigned to employees (employee id: list of his/her assignments)
+
+    Returns:
+        list of (list of workplace ids, set of employee pks) tuples
+    """
+
+    parent = {wp: wp for wp in emp_for_workplaces}
+
+    def find(wp):
+        while parent[wp] != wp:
+            parent[wp] = parent[parent[wp]]
+            wp = parent[wp]
+        return wp
+
+    emp_workplaces = dict()  # Key: employee pk, Value: set of workplace ids
+    for wp, employees in emp_for_workplaces.items():
+        for e in employees:
+            emp_workplaces.setdefault(e.pk, set()).add(wp)
+
+    for e, workplaces in emp_workplaces.items():
+        for a in emp_assignments.get(e, []):
+            if not a.negative_flag and a.shift_type.workplace_id in parent:
+                workplaces.add(a.shift_type.workplace_id)
+
+        first, *rest = workplaces
+        for wp in rest:
+            parent[find(wp)] = find(first)
+
+    components = dict()  # Key: root workplace id, Value: (list of workplace ids, set of employee pks)
+    for wp in emp_for_workplaces:
+        components.setdefault(find(wp), ([], set()))[0].append(wp)
+    for e, workplaces in emp_workplaces.items():
+        components[find(next(iter(workplaces)))][1].add(e)
+
+    return list(components.values())
+
+
+def penalty_breakdown(solver, obj_bool_vars, obj_bool_coeffs, obj_int_vars, obj_int_coeffs) -> dict:
+    """Sums up the objective of a solution by kind of soft constraint.
+
+    Kind is the name of the penalty variable up to its parameters (e.g. "excess_demand" or "weekly_sum_constraint"),
+    requests are plain work variables. Fulfilled requests have negative cost (gain).
+
+    Returns:
+        dictionary with number of non-zero terms and their cost (kind: {"count": int, "cost": int})
+    """
+    breakdown = dict()
+
+    def add(name, cost):
+        kind = re.match(r"[a-z_]*", name).group().rstrip("_")
+        kind = "requests" if kind == "work" else kind or "other"
+        terms = breakdown.setdefault(kind, {"count": 0, "cost": 0})
+        terms["count"] += 1
+        terms["cost"] += cost
+
+    for var, coeff in zip(obj_bool_vars, obj_bool_coeffs):
+        if coeff != 0 and solver.BooleanValue(var):
+            add(var.Name(), coeff)
+    for var, coeff in zip(obj_int_vars, obj_int_coeffs):
+        value = solver.Value(var)
+        if coeff != 0 and value != 0:
+            add(var.Name(), coeff * value)
+    return breakdown
+
+
+def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, emp_assignments,
+                           employees: list[EmployeeData], shift_types: list[ShiftTypeData], work_for_workplace_closing,
+                           shifts_before, year: int, month: int, job_time, params, output_proto, sparse_variables=True,
+                           plateau_window=None, plateau_delta=0, gap_limit=None, shifts_hint=None, repair=None, progress_callback=None,
+                           draft_callback=None, draft_every=1, draft_interval=5.0):
     """Main algorithm function. It solves the whole problem.
 
     Steps:
@@ -269,7 +529,6 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
         emp_preferences: dictionary with preference objects assigned to employees (employee id: list of his/her preferences)
         emp_absences: dictionary with absence objects assigned to employees (employee id: list of his/her absences)
         emp_assignments: dictionary with assignments objects assigned to employees (employee id: list of his/her absences)
-        schedule_dict: # TODO explain what schedule_dict is
         employees: list of employees objects forwarded from backend and filtered in main algorithm function
         shift_types: list of shifts (objects) considered while creating schedule
         work_for_workplace_closing: dictionary with workplace closing dates (workplace id: list of WorkplaceClosing objects)
@@ -279,10 +538,24 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
         shifts_before: ...
         params: parameters for CP-Sat solver
         output_proto: output for CP-Sat solver (?)
+        sparse_variables: only create decision variables for (employee, shift, day) triples the employee is allowed to work
+        plateau_window: stop the search if the objective hasn't improved within this number of seconds
+        plateau_delta: improvements of the objective up to this value don't count as progress
+        gap_limit: stop the search when relative gap between the objective and the best bound is reached
+        shifts_hint: dictionary with existing shifts used as a warm start (date: list of shifts)
+        repair: dictionary with changed employees and days, every existing shift outside of their neighbourhood is pinned
+            (if the pins make the model infeasible, the whole month is solved)
+        progress_callback: function called with progress of the search, the search is stopped if it returns True
+            (or the stop reason)
+        draft_callback: function called with progress and shifts of intermediate solutions (draft schedules)
+        draft_every: only every draft_every-th improving solution is passed to draft_callback...
+        draft_interval: ...and not more often than once per this number of seconds
 
       Returns:
-        list of shifts objects (date, employee, shift)
+        dictionary with list of ShiftData objects (date, employee, shift), solving status and model statistics
       """
+    build_start = time.time()
+    num_days = get_month_by_weeks(year, month)[-1][-1][0]
 
     # Dictionaries with:
     work_time = dict()
@@ -324,6 +597,7 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
     emp_info = [ei for ei in emp_info if num_days > ei.num_absent_days]
 
     ctx = Context(emp_info, shift_types, year, month, job_time, work_for_workplace_closing)
+    context_time = time.time() - build_start
 
     for ei in ctx.employees:
         logger.log("ADDED", f"{ei}")
@@ -332,7 +606,7 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
         logger.log("ADDED", f"{st}")
 
     for st in ctx.shift_types:
-        logger.log("ADDED", f"[CLOSINGS] ST: {st.id:2d} | DAYS: {st.get_closing_days_in_month(month, year)}")
+        logger.log("ADDED", f"[CLOSINGS] ST: {st.id:2d} | DAYS: {sorted(st.closing_days_in_month)}")
 
     # Shift constraints on continuous sequence :
     #     (shift, hard_min, soft_min, min_penalty, soft_max, hard_max, max_penalty)
@@ -358,112 +632,121 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
     penalized_transitions = ctx.illegal_transitions
 
     model = cp_model.CpModel()
+    statistics = ModelStatistics(model)
 
     # Prepare list of allowed shift types for employees
-    for ei in ctx.employees:
-        allowed_shift_types = dict()
+    with statistics.family("allowed shift types"):
+        for ei in ctx.employees:
+            allowed_shift_types = dict()
 
-        for s in ctx.shift_types:
-            allowed_shift_types[s.get()] = []
+            for s in ctx.shift_types:
+                allowed_shift_types[s.get()] = []
 
-        allowed_shift_types[ctx.shift_types[0].get()] = [d for d in range(1, num_days + 1)]
+            allowed_shift_types[ctx.shift_types[0].get()] = [d for d in range(1, num_days + 1)]
 
-        # Firstly, check for positive indefinite assignments
-        for pia in ei.positive_indefinite_assignments:
-            allowed_shift_types[pia] = [d for d in range(1, num_days + 1)]
-            logger.log("ADDED", f"[ASSIGNMENTS] | [POSITIVE INDEF. ASSIGNMENT] | ASSIGNED | SHIFT: {pia.id} EMP: {ei.get().pk:2d}")
+            # Firstly, check for positive indefinite assignments
+            for pia in ei.positive_indefinite_assignments:
+                allowed_shift_types[pia] = [d for d in range(1, num_days + 1)]
+                logger.log("ADDED", f"[ASSIGNMENTS] | [POSITIVE INDEF. ASSIGNMENT] | ASSIGNED | SHIFT: {pia.id} EMP: {ei.get().pk:2d}")
 
-        # Assign all shifts to employee if there are no positive indefinite assignments
-        if len(ei.positive_indefinite_assignments) == 0:
-            # Only allow shifts in workplaces assigned to employee
-            logger.log("ADDED", f"[ASSIGNMENTS] | ASSIGNED ALL SHIFTS | EMP: {ei.get().pk:2d}")
+            # Assign all shifts to employee if there are no positive indefinite assignments
+            if len(ei.positive_indefinite_assignments) == 0:
+                # Only allow shifts in workplaces assigned to employee
+                logger.log("ADDED", f"[ASSIGNMENTS] | ASSIGNED ALL SHIFTS | EMP: {ei.get().pk:2d}")
 
-            for s in ctx.shift_types[1:]:
-                if s.get().workplace.id in ei.workplaces:
-                    allowed_shift_types[s.get()] = [d for d in range(1, num_days + 1)]
-                else:
-                    logger.log("ADDED", f"[WORKPLACE] | [NOT IN WORKPLACE {s.get().workplace.name}] | REMOVED | SHIFT: {s.get().name} | EMP: {ei.get().pk:2d}")
+                for s in ctx.shift_types[1:]:
+                    if s.get().workplace_id in ei.workplaces:
+                        allowed_shift_types[s.get()] = [d for d in range(1, num_days + 1)]
+                    else:
+                        logger.log("ADDED", f"[WORKPLACE] | [NOT IN WORKPLACE {s.get().workplace_name}] | REMOVED | SHIFT: {s.get().name} | "
+                                            f"EMP: {ei.get().pk:2d}")
 
-        # Now we handle negative indefinite assignments
-        for nia in ei.negative_indefinite_assignments:
-            allowed_shift_types[nia] = []
-            logger.log("ADDED", f"[ASSIGNMENTS] | [NEGATIVE INDEF. ASSIGNMENT] | REMOVED | SHIFT: {nia.id} EMP: {ei.get().pk:2d}")
+            # Now we handle negative indefinite assignments
+            for nia in ei.negative_indefinite_assignments:
+                allowed_shift_types[nia] = []
+                logger.log("ADDED", f"[ASSIGNMENTS] | [NEGATIVE INDEF. ASSIGNMENT] | REMOVED | SHIFT: {nia.id} EMP: {ei.get().pk:2d}")
 
-        # Allow shifts from term assignments
-        for ta in ei.term_assignments:
-            if ta[1] is False:  # if assignment is positive
-                allowed_shift_types[ta[0]].append(ta[2].day)
+            # Allow shifts from term assignments
+            for ta in ei.term_assignments:
+                if ta[1] is False:  # if assignment is positive
+                    allowed_shift_types[ta[0]].append(ta[2].day)
 
-                for ast in allowed_shift_types:
-                    if ast.id == 0:
-                        continue
-                    if ast.id != ta[0].id:
-                        for d in allowed_shift_types[ast]:
-                            if d == ta[2].day:
-                                allowed_shift_types[ast].remove(d)
-
-        for x in allowed_shift_types:
-            allowed_shift_types[x] = set(allowed_shift_types[x])
-            allowed_shift_types[x] = list(allowed_shift_types[x])
-
-        # Handle workplace closings
-        for ast in allowed_shift_types.keys():
-            if ast.id == 0:
-                continue
-            allowed_shift_types[ast] = [d for d in allowed_shift_types[ast] if d not in ctx.get_shift_info_by_id(ast.id).get_closing_days_in_month(month, year)]
+                    for ast in allowed_shift_types:
+                        if ast.id == 0:
+                            continue
+                        if ast.id != ta[0].id:
+                            for d in allowed_shift_types[ast]:
+                                if d == ta[2].day:
+                                    allowed_shift_types[ast].remove(d)
+
+            for x in allowed_shift_types:
+                allowed_shift_types[x] = set(allowed_shift_types[x])
+                allowed_shift_types[x] = list(allowed_shift_types[x])
+
+            # Handle workplace closings
+            for ast in allowed_shift_types.keys():
+                if ast.id == 0:
+                    continue
+                allowed_shift_types[ast] = [d for d in allowed_shift_types[ast] if d not in ctx.get_shift_info(ast).closing_days_in_month]
 
-        for x in allowed_shift_types:
-            allowed_shift_types[x] = set(allowed_shift_types[x])
-        ei.allowed_shift_types = allowed_shift_types
+            for x in allowed_shift_types:
+                allowed_shift_types[x] = set(allowed_shift_types[x])
+            ei.allowed_shift_types = allowed_shift_types
 
     for ei in ctx.employees:
         for ast in ei.allowed_shift_types:
             logger.debug(f"EMP: {ei.get().pk:2d} | ST: {ast.pk} | ALLOWED DAYS: {[d for d in ei.allowed_shift_types[ast]]}")
 
     # Create model variables
-    work = {}
-    forbidden_work = []
+    # In sparse mode we only materialize variables for allowed (employee, shift, day) triples, every other triple
+    # (including days of the previous month nobody worked) is resolved by WorkVariables to constant false
+    with statistics.family("work variables"):
+        work = WorkVariables(model)
+        # Set of forbidden (employee, shift, day) triples, shared by all constraint builders and the post-processing below
+        forbidden_work = set()
 
-    for ei in ctx.employees:
-        for s in ctx.shift_types:
-            for d in range(-6, num_days + 1):
-                work[ei.get().pk, s.id, d] = model.NewBoolVar(f"work{ei.get().pk}_{s.id}_{d}")
-                if d not in ei.allowed_shift_types[s.get()] and d > 0:
-                    forbidden_work.append((ei.get().pk, s.id, d))
-        # for s in ei.allowed_shift_types.keys():
-        #     for d in ei.allowed_shift_types[s]:
-        #         work[ei.get().pk, s.id, d] = model.NewBoolVar("work{:d}_{:d}_{:d}".format(ei.get().pk, s.id, d))
+        for ei in ctx.employees:
+            for s in ctx.shift_types:
+                for d in range(1 if sparse_variables else -6, num_days + 1):
+                    allowed = d in ei.allowed_shift_types[s.get()]
+                    if not allowed and d > 0:
+                        forbidden_work.add((ei.get().pk, s.id, d))
+                    if allowed or not sparse_variables:
+                        work[ei.get().pk, s.id, d] = model.NewBoolVar(f"work{ei.get().pk}_{s.id}_{d}")
 
     worked_month_before = []
     friday_before = saturday_before = 999
     # Add shifts to the model if employee has worked in last week of previous month
-    if shifts_before:
-        for i, sb in enumerate(shifts_before):
-            if len(shifts_before.keys()) < 1:
-                break
-            d_shifts = shifts_before[sb]
-            if sb.weekday() == 4:
-                friday_before = -6 + i
-            elif sb.weekday() == 5:
-                saturday_before = -6 + i
-            for s in d_shifts:
-                work[s.employee.pk, s.shift_type.id, -6 + i] = model.NewBoolVar(f"work{s.employee.pk}_{s.shift_type.id}_{-6 + i}")
-                model.AddExactlyOne(work[s.employee.pk, s.shift_type.id, -6 + i])
-                worked_month_before.append((s.employee.pk, s.shift_type.id, -6 + i))
-
-    # Add free shift to the model if employee hasn't worked month before
-    for ei in ctx.employees:
-        for d in range(-6, 1):
-            worked = False
-            for st in ctx.shift_types[1:]:
-                if (ei.get().pk, st.get().id, d) in worked_month_before:
-                    worked = True
+    with statistics.family("previous month"):
+        if shifts_before:
+            for i, sb in enumerate(shifts_before):
+                if len(shifts_before.keys()) < 1:
                     break
-            if not worked:
-                model.AddExactlyOne(work[ei.get().pk, 0, d])
-                worked_month_before.append((ei.get().pk, 0, d))
+                d_shifts = shifts_before[sb]
+                if sb.weekday() == 4:
+                    friday_before = -6 + i
+                elif sb.weekday() == 5:
+                    saturday_before = -6 + i
+                for s in d_shifts:
+                    work[s.employee_id, s.shift_type_id, -6 + i] = model.NewBoolVar(f"work{s.employee_id}_{s.shift_type_id}_{-6 + i}")
+                    model.AddExactlyOne(work[s.employee_id, s.shift_type_id, -6 + i])
+                    worked_month_before.append((s.employee_id, s.shift_type_id, -6 + i))
+
+        # Add free shift to the model if employee hasn't worked month before
+        for ei in ctx.employees:
+            for d in range(-6, 1):
+                worked = False
+                for st in ctx.shift_types[1:]:
+                    if (ei.get().pk, st.get().id, d) in worked_month_before:
+                        worked = True
+                        break
+                if not worked:
+                    if (ei.get().pk, 0, d) not in work:
+                        work[ei.get().pk, 0, d] = model.NewBoolVar(f"work{ei.get().pk}_0_{d}")
+                    model.AddExactlyOne(work[ei.get().pk, 0, d])
+                    worked_month_before.append((ei.get().pk, 0, d))
 
-    worked_month_before = sorted(sorted(worked_month_before, key=lambda x: x[2]), key=lambda x: x[0])
+        worked_month_before = sorted(sorted(worked_month_before, key=lambda x: x[2]), key=lambda x: x[0])
 
     # Linear terms of the objective in a minimization context.
     obj_int_vars = []
@@ -472,82 +755,85 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
     obj_bool_coeffs = []
 
     # Add shifts to model, we're handling positive term assignments here too
-    for ei in ctx.employees:
-        term_assignments = {}  # Key: day, Value: Shift_type object
-        for d in range(1, num_days + 1):
-            term_assignments[d] = -1
-
-        # Check for positive term assignments
-        for ta in ei.term_assignments:
-            if ta[1] is False:
-                if ta[2].day in ei.allowed_shift_types[ta[0]]:
-                    term_assignments[ta[2].day] = ta[0]
-
-        # Add exactly one shift per day
-        for d in range(1, num_days + 1):
-            if term_assignments[d] == -1:
-                # No assignments for this day, allow all shifts
-                model.AddExactlyOne(work[ei.get().pk, s.id, d] for s in ei.allowed_shift_types.keys() if (ei.get().pk, s.id, d) not in forbidden_work)
-            else:
-                # Allow only assigned shift for this day
-                if (ei.get().pk, term_assignments[d].id, d) in forbidden_work:
+    with statistics.family("daily assignments"):
+        for ei in ctx.employees:
+            term_assignments = {}  # Key: day, Value: Shift_type object
+            for d in range(1, num_days + 1):
+                term_assignments[d] = -1
+
+            # Check for positive term assignments
+            for ta in ei.term_assignments:
+                if ta[1] is False:
+                    if ta[2].day in ei.allowed_shift_types[ta[0]]:
+                        term_assignments[ta[2].day] = ta[0]
+
+            # Add exactly one shift per day
+            for d in range(1, num_days + 1):
+                if term_assignments[d] == -1:
+                    # No assignments for this day, allow all shifts
                     model.AddExactlyOne(work[ei.get().pk, s.id, d] for s in ei.allowed_shift_types.keys() if (ei.get().pk, s.id, d) not in forbidden_work)
-                    continue
+                else:
+                    # Allow only assigned shift for this day
+                    if (ei.get().pk, term_assignments[d].id, d) in forbidden_work:
+                        model.AddExactlyOne(work[ei.get().pk, s.id, d] for s in ei.allowed_shift_types.keys() if (ei.get().pk, s.id, d) not in forbidden_work)
+                        continue
 
-                # model.AddExactlyOne(work[ei.get().pk, term_assignments[d].id, d])
-                # TODO: decide whether it's worth increasing feasibility - maybe consult with client?
-                model.AddExactlyOne(work[ei.get().pk, s, d] for s in [term_assignments[d].id, 0])
-                logger.log("ADDED", f"[ASSIGNMENTS] | [POSITIVE TERM ASSIGNMENT] | SHIFT: {term_assignments[d].id} | EMP: {ei.get().pk:2d} | DAY: {d:2d}")
+                    # model.AddExactlyOne(work[ei.get().pk, term_assignments[d].id, d])
+                    # TODO: decide whether it's worth increasing feasibility - maybe consult with client?
+                    model.AddExactlyOne(work[ei.get().pk, s, d] for s in [term_assignments[d].id, 0])
+                    logger.log("ADDED", f"[ASSIGNMENTS] | [POSITIVE TERM ASSIGNMENT] | SHIFT: {term_assignments[d].id} | EMP: {ei.get().pk:2d} | DAY: {d:2d}")
 
-    # Deny shifts with negative term assignments
-    for ei in ctx.employees:
-        for ta in ei.term_assignments:
-            if ta[1] is True:
-                if (ei.get().pk, ta[0].id, ta[2].day) in forbidden_work:
-                    logger.warning(f"[ASSIGNMENTS] | [NEGATIVE TERM ASSIGNMENT] | SHIFT: {ta[0].id} | EMP: {ei.get().pk:2d} | DAY: {ta[2].day:2d}"
-                                   f" - conflicting with indef. assignment/absence")
-                    continue
-                model.Add(work[ei.get().pk, ta[0].id, ta[2].day] == 0)
-                logger.log("ADDED", f"[ASSIGNMENTS] | [NEGATIVE TERM ASSIGNMENT] | REMOVED | SHIFT: {ta[0].name} | EMP: {ei.get().pk:2d} | DAY: {ta[2].day:2d}")
+        # Deny shifts with negative term assignments
+        for ei in ctx.employees:
+            for ta in ei.term_assignments:
+                if ta[1] is True:
+                    if (ei.get().pk, ta[0].id, ta[2].day) in forbidden_work:
+                        logger.warning(f"[ASSIGNMENTS] | [NEGATIVE TERM ASSIGNMENT] | SHIFT: {ta[0].id} | EMP: {ei.get().pk:2d} | DAY: {ta[2].day:2d}"
+                                       f" - conflicting with indef. assignment/absence")
+                        continue
+                    model.Add(work[ei.get().pk, ta[0].id, ta[2].day] == 0)
+                    logger.log("ADDED", f"[ASSIGNMENTS] | [NEGATIVE TERM ASSIGNMENT] | REMOVED | SHIFT: {ta[0].name} | EMP: {ei.get().pk:2d} | "
+                                        f"DAY: {ta[2].day:2d}")
 
     # TODO: this will be used for generating schedule on top of existing schedule (in specific date range)
     # Fixed assignments.
-    for e, s, d in ctx.fixed_assignments:
-        if (e, s, d) in forbidden_work:
-            continue
-        logger.log("ADDED", f"[ABSENCE] EMP: {e:2d} | SHIFT: {s:2d} | DAY: {d:2d}")
-        model.Add(work[e, s, d] == 1)
+    with statistics.family("fixed assignments"):
+        for e, s, d in ctx.fixed_assignments:
+            if (e, s, d) in forbidden_work:
+                continue
+            logger.log("ADDED", f"[ABSENCE] EMP: {e:2d} | SHIFT: {s:2d} | DAY: {d:2d}")
+            model.Add(work[e, s, d] == 1)
 
     # Employee requests (soft)
-    for e, s, d, w in ctx.requests:
-        if (e, s, d) in forbidden_work:
-            logger.warning(f"[REQUEST] EMP: {e:2d} | SHIFT: {s} | DAY: {d:2d} - conflicting with indef. assignment/absence")
-            continue
-        logger.log("ADDED", f"[REQUEST] EMP: {e:2d} | SHIFT: {s} | DAY: {d:2d} | WEIGHT: {w}")
-        obj_bool_vars.append(work[e, s, d])
-        obj_bool_coeffs.append(w)
-
-    # Shift constraints
-    for ct in shift_constraints:
-        shift, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = ct
-        for ei in ctx.employees:
-            if len(ei.allowed_shift_types[ctx.get_shift_info_by_id(shift).get()]) == 0:
+    with statistics.family("requests"):
+        for e, s, d, w in ctx.requests:
+            if (e, s, d) in forbidden_work:
+                logger.warning(f"[REQUEST] EMP: {e:2d} | SHIFT: {s} | DAY: {d:2d} - conflicting with indef. assignment/absence")
                 continue
+            logger.log("ADDED", f"[REQUEST] EMP: {e:2d} | SHIFT: {s} | DAY: {d:2d} | WEIGHT: {w}")
+            obj_bool_vars.append(work[e, s, d])
+            obj_bool_coeffs.append(w)
 
-            absences = ei.get_absent_days_in_month(month, year)
+    # Shift constraints
+    with statistics.family("shift sequences"):
+        for ct in shift_constraints:
+            shift, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = ct
+            for ei in ctx.employees:
+                if len(ei.allowed_shift_types[ctx.get_shift_info_by_id(shift).get()]) == 0:
+                    continue
 
-            works = [work[ei.get().pk, shift, d] for d in ei.allowed_shift_types[ctx.get_shift_info_by_id(shift).get()] if d not in absences]
+                works = [work[ei.get().pk, shift, d] for d in ei.allowed_shift_types[ctx.get_shift_info_by_id(shift).get()] if d not in ei.absent_days_in_month]
 
-            pre_works = [work[ei.get().pk, shift, d] for d in range(-6, 1) if (ei.get().pk, shift, d) not in forbidden_work]
-            pre_works.extend(works)
+                pre_works = [work[ei.get().pk, shift, d] for d in range(-6, 1)]
+                pre_works.extend(works)
 
-            works = pre_works
+                works = pre_works
 
-            variables, coeffs = add_soft_sequence_constraint(
-                model, works, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost,
-                f"shift_constraint(employee {ei.get().pk}, shift {shift})")
-            obj_bool_vars.extend(variables)
-            obj_bool_coeffs.extend(coeffs)
+                variables, coeffs = add_soft_sequence_constraint(
+                    model, works, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost,
+                    f"shift_constraint(employee {ei.get().pk}, shift {shift})")
+                obj_bool_vars.extend(variables)
+                obj_bool_coeffs.extend(coeffs)
 
     logger.log("MODEL", f"Job time for month : {ctx.job_time:4d}")
     logger.log("MODEL", f"FT job time        : {ctx.ft_job_time:4d}")
@@ -562,368 +848,376 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
 
     # Calculate work time constraints
     # Phase 1: Estimation
-    for ei in ctx.employees:
-        hard_min = 0
-        soft_min = 0
-        min_cost = 75
-        soft_max = 0
-        hard_max = 0
-        max_cost = 25
-
-        if ctx.job_time_multiplier < 1:
-            if ctx.ft_job_time < ctx.total_work_time and ctx.rest_job_time > 0:  # case 4
-                if ei in ctx.get_full_time_employees():  # we give full-timers full job time
-                    hard_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
-                    soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
-                    soft_max = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
-                    hard_max = min(ei.max_work_time, ei.job_time)
-                    min_cost = max_cost = 0
-                else:
-                    hard_min = 0  # min(ei.max_work_time, floor_to_multiple(ei.job_time * ctx.overtime_multiplier, 8) - 8)
-                    soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
-                    soft_max = min(ei.max_work_time, ceil_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
-                    hard_max = min(ei.max_work_time, ceil_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
-                    # hard_max = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
-            else:  # case 5 and 6
-                if ei in ctx.get_full_time_employees():  # we give full-timers full job time
-                    hard_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8),
-                                   floor_to_multiple(ctx.total_work_time // len(ctx.get_full_time_employees()), 8))
-                    soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8),
-                                   floor_to_multiple(ctx.total_work_time // len(ctx.get_full_time_employees()), 8))
-                    soft_max = min(ei.max_work_time, ei.job_time, ceil_to_multiple(ei.job_time, 8))
-                    hard_max = min(ei.max_work_time, ei.job_time)
-                else:
-                    hard_min = 0
-                    soft_min = 0
-                    soft_max = 0
-                    hard_max = 8
+    num_full_time_employees = len(ctx.get_full_time_employees())
+    with statistics.family("work time sums"):
+        for ei in ctx.employees:
+            hard_min = 0
+            soft_min = 0
+            min_cost = 75
+            soft_max = 0
+            hard_max = 0
+            max_cost = 25
+
+            if ctx.job_time_multiplier < 1:
+                if ctx.ft_job_time < ctx.total_work_time and ctx.rest_job_time > 0:  # case 4
+                    if ctx.is_full_time_employee(ei):  # we give full-timers full job time
+                        hard_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
+                        soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
+                        soft_max = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
+                        hard_max = min(ei.max_work_time, ei.job_time)
+                        min_cost = max_cost = 0
+                    else:
+                        hard_min = 0  # min(ei.max_work_time, floor_to_multiple(ei.job_time * ctx.overtime_multiplier, 8) - 8)
+                        soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
+                        soft_max = min(ei.max_work_time, ceil_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
+                        hard_max = min(ei.max_work_time, ceil_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
+                        # hard_max = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
+                else:  # case 5 and 6
+                    if ctx.is_full_time_employee(ei):  # we give full-timers full job time
+                        hard_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8),
+                                       floor_to_multiple(ctx.total_work_time // num_full_time_employees, 8))
+                        soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8),
+                                       floor_to_multiple(ctx.total_work_time // num_full_time_employees, 8))
+                        soft_max = min(ei.max_work_time, ei.job_time, ceil_to_multiple(ei.job_time, 8))
+                        hard_max = min(ei.max_work_time, ei.job_time)
+                    else:
+                        hard_min = 0
+                        soft_min = 0
+                        soft_max = 0
+                        hard_max = 8
+                        min_cost = 0
+                        max_cost = 250
+                        # hard_max = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
+
+            elif ctx.job_time_multiplier >= 1:
+                hard_min = min(ei.max_work_time, ei.job_time - 8)
+                soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
+                soft_max = min(ei.max_work_time, ceil_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
+                hard_max = min(ei.max_work_time, soft_max + 8)
+                if ei.job_time == ctx.job_time:
+                    hard_min = soft_min = soft_max = hard_max = min(ei.max_work_time, ctx.job_time)
                     min_cost = 0
-                    max_cost = 250
-                    # hard_max = min(ei.max_work_time, floor_to_multiple(ei.job_time, 8))
-
-        elif ctx.job_time_multiplier >= 1:
-            hard_min = min(ei.max_work_time, ei.job_time - 8)
-            soft_min = min(ei.max_work_time, floor_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
-            soft_max = min(ei.max_work_time, ceil_to_multiple(ei.job_time * ctx.overtime_multiplier, 8))
-            hard_max = min(ei.max_work_time, soft_max + 8)
-            if ei.job_time == ctx.job_time:
-                hard_min = soft_min = soft_max = hard_max = min(ei.max_work_time, ctx.job_time)
-                min_cost = 0
-                max_cost = 0
-
-        # Why?
-        if ei.job_time < ctx.job_time:
-            soft_min = min(ctx.job_time - 8, soft_min)
-
-        if not ctx.overtime_for_full_timers:
-            soft_max = min(ei.max_work_time, min(ctx.job_time, soft_max))
-            hard_max = min(ei.max_work_time, min(ctx.job_time, hard_max))
-        else:
-            # We probably don't need to do accurate estimates here for now, though it might spare us some computing power
-            # soft_max = min(ei.max_work_time, min(soft_max,
-            #                ctx.job_time + floor_to_multiple(ctx.overtime_above_full_time // len(ctx.employees), 8)))
-            # hard_max = min(ei.max_work_time, min(hard_max,
-            #                ctx.job_time + ceil_to_multiple(ctx.overtime_above_full_time // len(ctx.employees), 8)))
-            hard_min = min(ctx.job_time, ei.max_work_time - 8)
-            soft_min = min(ei.max_work_time, max(floor_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
-            soft_max = min(ei.max_work_time, max(ceil_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
-            hard_max = ei.max_work_time
-
-        ei.work_time_constraint = [hard_min, soft_min, min_cost, soft_max, hard_max, max_cost]
-
-    # Phase 2: Corrections and adding constraints
-    # Check if the scenario is feasible
-    if ctx.total_work_time < ctx.max_work_time:
-        # Check if we have underestimated work time
-        work_time_diff = sum(x.work_time_constraint[4] for x in ctx.employees) - ctx.total_work_time
-        logger.info(f"Worktime diff: {work_time_diff}")
-        if work_time_diff < 0:
-            hard_max = int
-            # Yes, we did.. :(
-            if ctx.overtime_for_full_timers:  # This block of code should never be hit!
-                logger.critical("There were some unknown problems calculating work time...")
-                # Increase hard_max for everyone
-                corr: int = ceil_to_multiple(work_time_diff / len(ctx.employees), 8)
-                for ei in ctx.employees:
-                    hard_max = ei.work_time_constraint[4]
-                    hard_max = min(hard_max + corr, ei.max_work_time)
-                    ei.work_time_constraint[4] = hard_max
-            else:
-                # Increase hard_max only for people who haven't reached full time
-                # These "correction" calculations need to be more complex, we need to consider max_work_time etc.
-                corr: int = ceil_to_multiple(work_time_diff / len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]), 8)
-                i = 0
-                for ei in ctx.employees:
-                    if i >= len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]):
-                        ctx.overtime_for_full_timers = True
-                        break
-                    corr = ceil_to_multiple(work_time_diff / len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]) - i, 8)
+                    max_cost = 0
 
-                    hard_max = ei.work_time_constraint[4]
-                    if hard_max >= ei.max_work_time or hard_max >= ctx.job_time:
-                        i += 1
+            # Why?
+            if ei.job_time < ctx.job_time:
+                soft_min = min(ctx.job_time - 8, soft_min)
 
-                for ei in sorted(ctx.employees, key=lambda e: e.work_time_constraint[4], reverse=True):
-                    if not ctx.overtime_for_full_timers:
-                        hard_max = ei.work_time_constraint[4]
-                        if hard_max >= ctx.job_time:
-                            i += 1
-                            corr = ceil_to_multiple(work_time_diff / len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]) - i, 8)
-                            continue
-                        # Clamp work time to job time
-                        if hard_max + corr > ctx.job_time:
-                            hard_max = min(ctx.job_time, ei.max_work_time)
-                            ei.work_time_constraint[4] = hard_max
-                        else:
-                            hard_max = min(hard_max + corr, ei.max_work_time)
-                            ei.work_time_constraint[4] = hard_max
-                    else:
-                        # hard_min, soft_min, soft_max, hard_max
-                        if ei.job_time == ctx.job_time:
-                            ei.work_time_constraint[0] = min(ctx.job_time, ei.max_work_time - 8)
-                        else:
-                            ei.work_time_constraint[0] = min(ctx.job_time - 8, ei.max_work_time - 8)
-                        ei.work_time_constraint[1] = min(ei.max_work_time, max(floor_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
-                        ei.work_time_constraint[3] = min(ei.max_work_time, max(ceil_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
-                        ei.work_time_constraint[4] = ei.max_work_time
+            if not ctx.overtime_for_full_timers:
+                soft_max = min(ei.max_work_time, min(ctx.job_time, soft_max))
+                hard_max = min(ei.max_work_time, min(ctx.job_time, hard_max))
+            else:
+                # We probably don't need to do accurate estimates here for now, though it might spare us some computing power
+                # soft_max = min(ei.max_work_time, min(soft_max,
+                #                ctx.job_time + floor_to_multiple(ctx.overtime_above_full_time // len(ctx.employees), 8)))
+                # hard_max = min(ei.max_work_time, min(hard_max,
+                #                ctx.job_time + ceil_to_multiple(ctx.overtime_above_full_time // len(ctx.employees), 8)))
+                hard_min = min(ctx.job_time, ei.max_work_time - 8)
+                soft_min = min(ei.max_work_time, max(floor_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
+                soft_max = min(ei.max_work_time, max(ceil_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
+                hard_max = ei.max_work_time
+
+            ei.work_time_constraint = [hard_min, soft_min, min_cost, soft_max, hard_max, max_cost]
+
+        # Phase 2: Corrections and adding constraints
+        # Check if the scenario is feasible
+        if ctx.total_work_time < ctx.max_work_time:
+            # Check if we have underestimated work time
             work_time_diff = sum(x.work_time_constraint[4] for x in ctx.employees) - ctx.total_work_time
+            logger.info(f"Worktime diff: {work_time_diff}")
+            if work_time_diff < 0:
+                hard_max = int
+                # Yes, we did.. :(
+                if ctx.overtime_for_full_timers:  # This block of code should never be hit!
+                    logger.critical("There were some unknown problems calculating work time...")
+                    # Increase hard_max for everyone
+                    corr: int = ceil_to_multiple(work_time_diff / len(ctx.employees), 8)
+                    for ei in ctx.employees:
+                        hard_max = ei.work_time_constraint[4]
+                        hard_max = min(hard_max + corr, ei.max_work_time)
+                        ei.work_time_constraint[4] = hard_max
+                else:
+                    # Increase hard_max only for people who haven't reached full time
+                    # These "correction" calculations need to be more complex, we need to consider max_work_time etc.
+                    corr: int = ceil_to_multiple(work_time_diff / len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]), 8)
+                    i = 0
+                    for ei in ctx.employees:
+                        if i >= len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]):
+                            ctx.overtime_for_full_timers = True
+                            break
+                        corr = ceil_to_multiple(work_time_diff / len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]) - i, 8)
 
-            if sum(x.work_time_constraint[0] for x in ctx.employees) > ctx.total_work_time:
-                logger.error(f"Overestimated hard_mins by {sum(x.work_time_constraint[0] for x in ctx.employees) - ctx.total_work_time}h")
-
-            logger.info(f"Worktime diff after corrections: {work_time_diff}")
+                        hard_max = ei.work_time_constraint[4]
+                        if hard_max >= ei.max_work_time or hard_max >= ctx.job_time:
+                            i += 1
 
-        # Add work time constraints to the model
-        for ei in ctx.employees:
-            works = [work[ei.get().pk, s.id, d] for s in ei.allowed_shift_types.keys() for d in ei.allowed_shift_types[s] if s.id != 0]
-            hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = ei.work_time_constraint
-            logger.log("ADDED", f"EMP {ei.get().pk:2d} | JT {ei.job_time:3d} | hard_min {hard_min:3d} | soft_min {soft_min:3d} | soft_max {soft_max:3d} | "
-                                f"hard_max {hard_max:3d} | overtime {hard_max - ei.job_time:3d} | max_wt {ei.max_work_time:3d}")
-            variables, coeffs = add_monthly_soft_sum_constraint(
-                model, works, hard_min // 8, soft_min // 8, min_cost, soft_max // 8,
-                hard_max // 8, max_cost, f"work_time_constraint(employee {ei.get().pk}, job_time {ei.job_time})")
-            obj_int_vars.extend(variables)
-            obj_int_coeffs.extend(coeffs)
-    else:
-        logger.critical("Total allowed work time is not enough to fill the schedule for this month!")
+                    for ei in sorted(ctx.employees, key=lambda e: e.work_time_constraint[4], reverse=True):
+                        if not ctx.overtime_for_full_timers:
+                            hard_max = ei.work_time_constraint[4]
+                            if hard_max >= ctx.job_time:
+                                i += 1
+                                corr = ceil_to_multiple(work_time_diff / len([ei for ei in ctx.employees if ei.work_time_constraint[4] < ctx.job_time]) - i, 8)
+                                continue
+                            # Clamp work time to job time
+                            if hard_max + corr > ctx.job_time:
+                                hard_max = min(ctx.job_time, ei.max_work_time)
+                                ei.work_time_constraint[4] = hard_max
+                            else:
+                                hard_max = min(hard_max + corr, ei.max_work_time)
+                                ei.work_time_constraint[4] = hard_max
+                        else:
+                            # hard_min, soft_min, soft_max, hard_max
+                            if ei.job_time == ctx.job_time:
+                                ei.work_time_constraint[0] = min(ctx.job_time, ei.max_work_time - 8)
+                            else:
+                                ei.work_time_constraint[0] = min(ctx.job_time - 8, ei.max_work_time - 8)
+                            ei.work_time_constraint[1] = min(ei.max_work_time,
+                                                             max(floor_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
+                            ei.work_time_constraint[3] = min(ei.max_work_time, max(ceil_to_multiple(ctx.total_work_time / len(ctx.employees), 8), ctx.job_time))
+                            ei.work_time_constraint[4] = ei.max_work_time
+                work_time_diff = sum(x.work_time_constraint[4] for x in ctx.employees) - ctx.total_work_time
+
+                if sum(x.work_time_constraint[0] for x in ctx.employees) > ctx.total_work_time:
+                    logger.error(f"Overestimated hard_mins by {sum(x.work_time_constraint[0] for x in ctx.employees) - ctx.total_work_time}h")
+
+                logger.info(f"Worktime diff after corrections: {work_time_diff}")
+
+            # Add work time constraints to the model
+            for ei in ctx.employees:
+                works = [work[ei.get().pk, s.id, d] for s in ei.allowed_shift_types.keys() for d in ei.allowed_shift_types[s] if s.id != 0]
+                hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = ei.work_time_constraint
+                logger.log("ADDED", f"EMP {ei.get().pk:2d} | JT {ei.job_time:3d} | hard_min {hard_min:3d} | soft_min {soft_min:3d} | soft_max {soft_max:3d} | "
+                                    f"hard_max {hard_max:3d} | overtime {hard_max - ei.job_time:3d} | max_wt {ei.max_work_time:3d}")
+                variables, coeffs = add_monthly_soft_sum_constraint(
+                    model, works, hard_min // 8, soft_min // 8, min_cost, soft_max // 8,
+                    hard_max // 8, max_cost, f"work_time_constraint(employee {ei.get().pk}, job_time {ei.job_time})", num_days)
+                obj_int_vars.extend(variables)
+                obj_int_coeffs.extend(coeffs)
+        else:
+            logger.critical("Total allowed work time is not enough to fill the schedule for this month!")
 
     # Weekly sum constraints
     # BUG: when dealing with 6 week months, the algorithm fails because of this constraint
-    for ct in weekly_sum_constraints:
-        for ei in ctx.employees:
-            for w, week in enumerate(ctx.month_by_billing_weeks):
-                shift, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = ct
+    with statistics.family("weekly sums"):
+        for ct in weekly_sum_constraints:
+            for ei in ctx.employees:
+                for w, week in enumerate(ctx.month_by_billing_weeks):
+                    shift, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = ct
 
-                if len(ei.allowed_shift_types[ctx.get_shift_info_by_id(shift).get()]) == 0:
-                    continue
+                    if len(ei.allowed_shift_types[ctx.get_shift_info_by_id(shift).get()]) == 0:
+                        continue
 
-                if len(week) <= 3:  # TODO: this is a temporary fix...
-                    continue
+                    if len(week) <= 3:  # TODO: this is a temporary fix...
+                        continue
 
-                works = [work[ei.get().pk, shift, d[0]] for d in week if (ei.get().pk, shift, d[0]) not in forbidden_work]
+                    works = [work[ei.get().pk, shift, d[0]] for d in week if (ei.get().pk, shift, d[0]) not in forbidden_work]
 
-                # Account for absences
-                if shift == 0:
-                    num_absences = sum(x in ei.get_absent_days_in_month(month, year) for x in [d[0] for d in week])
-                    if num_absences > 0:
-                        if num_absences > soft_max:
-                            hard_max = min(num_absences + 1, len(works))
-                            soft_max = min(num_absences, len(works))
-                            logger.debug(f"[WEEKLY CONSTRAINT CORRECTION] WEEK: {w} | EMP: {ei.get().pk:2d} NUM ABSENCES: {num_absences:3d}")
+                    # Account for absences
+                    if shift == 0:
+                        num_absences = sum(d[0] in ei.absent_days_in_month for d in week)
+                        if num_absences > 0:
+                            if num_absences > soft_max:
+                                hard_max = min(num_absences + 1, len(works))
+                                soft_max = min(num_absences, len(works))
+                                logger.debug(f"[WEEKLY CONSTRAINT CORRECTION] WEEK: {w} | EMP: {ei.get().pk:2d} NUM ABSENCES: {num_absences:3d}")
 
-                variables, coeffs = add_weekly_soft_sum_constraint(model, works, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost,
-                                                                   f"weekly_sum_constraint(employee {ei.get().pk}, shift {shift}, week {w})")
-                obj_int_vars.extend(variables)
-                obj_int_coeffs.extend(coeffs)
+                    variables, coeffs = add_weekly_soft_sum_constraint(model, works, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost,
+                                                                       f"weekly_sum_constraint(employee {ei.get().pk}, shift {shift}, week {w})")
+                    obj_int_vars.extend(variables)
+                    obj_int_coeffs.extend(coeffs)
 
     # Weekend constraints
-    for ei in ctx.employees:
-        hard_max_hours = ei.work_time_constraint[4]
-        min_free_shifts = 1
-
-        # No overtime over job time
-        if hard_max_hours == ei.calculate_job_time(ctx.job_time):
-            match ei.get().job_time:
-                case "1":
+    with statistics.family("sunday rules"):
+        for ei in ctx.employees:
+            hard_max_hours = ei.work_time_constraint[4]
+            min_free_shifts = 1
+
+            # No overtime over job time
+            if hard_max_hours == ei.calculate_job_time(ctx.job_time):
+                match ei.get().job_time:
+                    case "1":
+                        min_free_shifts = 1
+                    case "3/4":
+                        min_free_shifts = 2
+                    case "1/2":
+                        min_free_shifts = 3
+
+            # Overtime, but not over full job time
+            elif ei.calculate_job_time(ctx.job_time) < hard_max_hours <= ctx.job_time:
+                if hard_max_hours == ctx.job_time:
                     min_free_shifts = 1
-                case "3/4":
+                elif ctx.job_time // 2 < hard_max_hours < ctx.job_time * 3 // 4:
                     min_free_shifts = 2
-                case "1/2":
+                elif hard_max_hours <= ctx.job_time // 2:
                     min_free_shifts = 3
 
-        # Overtime, but not over full job time
-        elif ei.calculate_job_time(ctx.job_time) < hard_max_hours <= ctx.job_time:
-            if hard_max_hours == ctx.job_time:
-                min_free_shifts = 1
-            elif ctx.job_time // 2 < hard_max_hours < ctx.job_time * 3 // 4:
-                min_free_shifts = 2
-            elif hard_max_hours <= ctx.job_time // 2:
-                min_free_shifts = 3
-
-        works_sunday = [work[ei.get().pk, 0, d[0]] for d in flatten(get_month_by_weeks(year, month))
-                        if d[1] == 6 and (ei.get().pk, 0, d[0]) not in forbidden_work]
+            works_sunday = [work[ei.get().pk, 0, d[0]] for d in flatten(get_month_by_weeks(year, month))
+                            if d[1] == 6 and (ei.get().pk, 0, d[0]) not in forbidden_work]
 
-        logger.debug(f"[R_A] | [MIN FREE SUNDAYS] EMP: {ei.get().pk:2d} | NUM: {min_free_shifts}")
+            logger.debug(f"[R_A] | [MIN FREE SUNDAYS] EMP: {ei.get().pk:2d} | NUM: {min_free_shifts}")
 
-        hard_min = model.NewIntVar(min_free_shifts, len(works_sunday), '')
-        model.Add(sum(works_sunday) == hard_min)
+            hard_min = model.NewIntVar(min_free_shifts, len(works_sunday), '')
+            model.Add(sum(works_sunday) == hard_min)
 
     # Weekend transition constraints
-    for d in flatten([[(friday_before, 4), (saturday_before, 5)], [x for x in flatten(ctx.month_by_billing_weeks) if x[1] in [4, 5]]]):
-        if d[1] == 4 and 0 < d[0] + 3 <= num_days:
-            # Night shift on Friday, free weekend -> shift on Monday should start at least at 11:00
-            transitions = []
-            forbidden_shifts = []
-            midnight = dt.min
-            for i in ctx.shift_types[1:]:
-                hr_start = dt.combine(dt.min, i.get().hour_start)
-                delta = hr_start - midnight
-                delta = int(delta.total_seconds() // 60)
-                if delta < (11 * 60):
-                    forbidden_shifts.append(i.id)
-            for os in ctx.overnight_shifts[0]:
-                for ei in ctx.employees:
-                    if (ei.get().pk, os[0], d[0]) in forbidden_work:
-                        continue
-                    for fs in forbidden_shifts:
-                        if (ei.get().pk, 0, d[0] + 1) in forbidden_work \
-                            or (ei.get().pk, 0, d[0] + 2) in forbidden_work \
-                                or (ei.get().pk, fs, d[0] + 3) in forbidden_work:
-                            continue
-
-                        transitions.append([work[ei.get().pk, os[0], d[0]].Not(),
-                                            work[ei.get().pk, 0, d[0] + 1].Not(),
-                                            work[ei.get().pk, 0, d[0] + 2].Not(),
-                                            work[ei.get().pk, fs, d[0] + 3].Not()])
-
-                    for t in transitions:
-                        model.AddBoolOr(t)
-
-        elif d[1] == 5 and 0 < d[0] + 2 <= num_days:
-            # Working on the weekend -> 24hrs of rest
-            transitions = []
-            illegal_transitions = []
-            for i in ctx.shift_types[1:]:
-                hr_end = dt.combine(dt.min, i.get().hour_end)
-                if i.id in [x[0] for x in ctx.overnight_shifts[0]]:
-                    hr_end = hr_end + timedelta(days=1)
-                for j in ctx.shift_types[1:]:
-                    hr_start = dt.combine(dt.min + timedelta(days=1), j.get().hour_start)
-                    delta = hr_start - hr_end
-                    delta = int(delta.total_seconds() // 60)
-                    if delta < (24 * 60):
-                        illegal_transitions.append((i.id, j.id))
-
-            for ei in ctx.employees:
-                if (ei.get().pk, 0, d[0]) in forbidden_work \
-                        or (ei.get().pk, 0, d[0] + 1) in forbidden_work \
-                        or (ei.get().pk, 0, d[0] + 2) in forbidden_work:
-                    continue
-                transitions = []
-                for i in list(ei.allowed_shift_types.keys())[1:]:
-                    for j in list(ei.allowed_shift_types.keys())[1:]:
-                        if d[0] not in ei.allowed_shift_types[i] \
-                           or d[0] + 1 not in ei.allowed_shift_types[j]:
-                            continue
-                        t = [work[ei.get().pk, i.id, d[0]], work[ei.get().pk, j.id, d[0] + 1]]
-                        for it in illegal_transitions:
-                            if j.id == it[0] and (ei.get().pk, it[1], d[0] + 2) not in forbidden_work:
-                                transitions.append([work[ei.get().pk, i.id, d[0]].Not(),
-                                                    work[ei.get().pk, j.id, d[0] + 1].Not(),
-                                                    work[ei.get().pk, it[1], d[0] + 2].Not()])
-
-                for t in transitions:
-                    model.AddBoolOr(t)
+    weekend_days = flatten([[(friday_before, 4), (saturday_before, 5)], [x for x in flatten(ctx.month_by_billing_weeks) if x[1] in [4, 5]]])
+    with statistics.family("weekend transitions"):
+        for clause in weekend_transition_clauses(ctx, work, forbidden_work, weekend_days):
+            model.AddBoolOr([work[key].Not() for key in clause])
 
     # Minimum one free weekend per employee
-    for ei in ctx.employees:
-        works = [[work[ei.get().pk, 0, d[0]], work[ei.get().pk, 0, d[0] + 1]] for d in flatten(get_month_by_weeks(year, month))
-                 if d[1] == 5 and ((ei.get().pk, 0, d[0]) not in forbidden_work and (ei.get().pk, 0, d[0] + 1) not in forbidden_work) and d[0] + 1 <= num_days]
+    with statistics.family("free weekend"):
+        for ei in ctx.employees:
+            works = [[work[ei.get().pk, 0, d[0]], work[ei.get().pk, 0, d[0] + 1]] for d in flatten(get_month_by_weeks(year, month))
+                     if d[1] == 5 and ((ei.get().pk, 0, d[0]) not in forbidden_work and (ei.get().pk, 0, d[0] + 1) not in forbidden_work)
+                     and d[0] + 1 <= num_days]
 
-        for w in works:
-            model.AddBoolAnd(w[0]).OnlyEnforceIf(w[1])
+            for w in works:
+                model.AddBoolAnd(w[0]).OnlyEnforceIf(w[1])
 
     # Penalized transitions
-    for previous_shift, next_shift, cost in penalized_transitions:
-        for ei in ctx.employees:
-            for d in range(0, num_days):
-                if (ei.get().pk, previous_shift, d) in forbidden_work or (ei.get().pk, next_shift, d + 1) in forbidden_work:
-                    continue
+    with statistics.family("penalized transitions"):
+        for previous_shift, next_shift, cost in penalized_transitions:
+            for ei in ctx.employees:
+                for d in range(0, num_days):
+                    if (ei.get().pk, previous_shift, d) in forbidden_work or (ei.get().pk, next_shift, d + 1) in forbidden_work \
+                            or (ei.get().pk, previous_shift, d) not in work:
+                        continue
 
-                transition = [work[ei.get().pk, previous_shift, d].Not(), work[ei.get().pk, next_shift, d + 1].Not()]
-                if cost == 0:
-                    model.AddBoolOr(transition)
-                else:
-                    trans_var = model.NewBoolVar(f"transition(employee={ei.get().pk}, day={d})")
-                    transition.append(trans_var)
-                    model.AddBoolOr(transition)
-                    obj_bool_vars.append(trans_var)
-                    obj_bool_coeffs.append(cost)
+                    transition = [work[ei.get().pk, previous_shift, d].Not(), work[ei.get().pk, next_shift, d + 1].Not()]
+                    if cost == 0:
+                        model.AddBoolOr(transition)
+                    else:
+                        trans_var = model.NewBoolVar(f"transition(employee={ei.get().pk}, day={d})")
+                        transition.append(trans_var)
+                        model.AddBoolOr(transition)
+                        obj_bool_vars.append(trans_var)
+                        obj_bool_coeffs.append(cost)
 
     # Guarantee at least one (optimally two) days of rest within 7 days range
-    for ei in ctx.employees:
-        # Account for the last week of previous month
-        wmb = [w for w in worked_month_before if w[0] == ei.get().pk]
-        wmb = sorted(wmb, key=lambda x: x[2], reverse=True)
-        wmb.pop()
+    with statistics.family("rest sequence"):
+        for ei in ctx.employees:
+            # Account for the last week of previous month
+            wmb = [w for w in worked_month_before if w[0] == ei.get().pk]
+            wmb = sorted(wmb, key=lambda x: x[2], reverse=True)
+            wmb.pop()
 
-        possible_free_shifts = [i for i in range(1, 8)]
+            possible_free_shifts = [i for i in range(1, 8)]
 
-        for w in wmb:
-            if w[1] == 0:
-                break
-            else:
-                possible_free_shifts.pop()
-        # print(ei.get().pk, wmb, possible_free_shifts)
-        works = [work[ei.get().pk, 0, d] for d in possible_free_shifts]
+            for w in wmb:
+                if w[1] == 0:
+                    break
+                else:
+                    possible_free_shifts.pop()
+            # print(ei.get().pk, wmb, possible_free_shifts)
+            works = [work[ei.get().pk, 0, d] for d in possible_free_shifts]
 
-        model.AddBoolOr(works)
+            model.AddBoolOr(works)
 
-        # Current month
-        works = [work[ei.get().pk, 0, day].Not() for day in range(1, num_days + 1)]
+            # Current month
+            works = [work[ei.get().pk, 0, day].Not() for day in range(1, num_days + 1)]
 
-        variables, coeffs = add_soft_sequence_constraint(
-                model, works, 1, 2, 5, 5, 6, 5, f"sequence_rest_constraint(employee {ei.get().pk:d}))")
-        obj_bool_vars.extend(variables)
-        obj_bool_coeffs.extend(coeffs)
+            variables, coeffs = add_soft_sequence_constraint(
+                    model, works, 1, 2, 5, 5, 6, 5, f"sequence_rest_constraint(employee {ei.get().pk:d}))")
+            obj_bool_vars.extend(variables)
+            obj_bool_coeffs.extend(coeffs)
 
     # Cover constraints
-    for s in ctx.shift_types[1:]:
-        for w, week in enumerate(ctx.month_by_billing_weeks):
-            for d in week:
-                if d[0] in s.get_closing_days_in_month(month, year):
-                    continue
-                works = [work[ei.get().pk, s.id, d[0]] for ei in
-                         [e for e in ctx.employees] if (ei.get().pk, s.id, d[0]) not in forbidden_work]
-                # Ignore Off shift.
-                demand = s.get().demand
-                worked = model.NewIntVar(demand, len(ctx.employees), '')
-                model.Add(worked == sum(works))
-                over_penalty = 100
-                if over_penalty > 0:
-                    name = f"excess_demand(shift={s.id}, week={w}, day={d[0]})"
-                    excess = model.NewIntVar(0, len(ctx.employees) - demand, name)
-                    model.Add(excess == worked - demand)
-                    obj_int_vars.append(excess)
-                    obj_int_coeffs.append(over_penalty)
+    with statistics.family("cover"):
+        for s in ctx.shift_types[1:]:
+            for w, week in enumerate(ctx.month_by_billing_weeks):
+                for d in week:
+                    if d[0] in s.closing_days_in_month:
+                        continue
+                    works = [work[ei.get().pk, s.id, d[0]] for ei in
+                             [e for e in ctx.employees] if (ei.get().pk, s.id, d[0]) not in forbidden_work]
+                    # Ignore Off shift.
+                    demand = s.get().demand
+                    worked = model.NewIntVar(demand, len(ctx.employees), '')
+                    model.Add(worked == sum(works))
+                    over_penalty = 100
+                    if over_penalty > 0:
+                        name = f"excess_demand(shift={s.id}, week={w}, day={d[0]})"
+                        excess = model.NewIntVar(0, len(ctx.employees) - demand, name)
+                        model.Add(excess == worked - demand)
+                        obj_int_vars.append(excess)
+                        obj_int_coeffs.append(over_penalty)
 
     # Objective
-    model.Minimize(sum(obj_bool_vars[i] * obj_bool_coeffs[i] for i in range(len(obj_bool_vars))) +
-                   sum(obj_int_vars[i] * obj_int_coeffs[i] for i in range(len(obj_int_vars))))
+    with statistics.family("objective"):
+        model.Minimize(sum(obj_bool_vars[i] * obj_bool_coeffs[i] for i in range(len(obj_bool_vars))) +
+                       sum(obj_int_vars[i] * obj_int_coeffs[i] for i in range(len(obj_int_vars))))
 
     if output_proto:
         print(f"Writing proto to {output_proto}")
         with open(output_proto, "w") as text_file:
             text_file.write(str(model))
 
+    # Warm start from the existing schedule of the month or the previous month rolled forward
+    hints = solution_hints(ctx, work, forbidden_work, shifts_hint, year, month) if shifts_hint else {}
+    for key, value in hints.items():
+        model.AddHint(work[key], value)
+
+    # Repair mode, existing shifts outside of the window around changes can't be changed
+    pinned = 0
+    if repair:
+        if any(date.year == year and date.month == month for date in shifts_hint or {}):
+            window = repair_window(ctx, repair)
+            pins = pinned_hints(hints, window)
+            for key, value in pins.items():
+                model.Add(work[key] == value)
+            pinned = len(pins)
+            logger.log("MODEL", f"Repair window      : {len(window):6d} (employee, day) pairs")
+        else:
+            logger.warning("Repair mode requested, but the month has no existing schedule. Solving the whole month.")
+
+    logger.log("MODEL", f"Work variables     : {len(work):6d}")
+    logger.log("MODEL", f"Solution hints     : {len(hints):6d}")
+    logger.log("MODEL", f"Pinned variables   : {pinned:6d}")
+    logger.log("MODEL", "Model statistics:")
+    statistics.log()
     logger.log("MODEL", "Solving model:")
 
+    build_time = time.time() - build_start
+
     # Solve the model.
     solver = cp_model.CpSolver()
     if params:
         text_format.Parse(params, solver.parameters)
-    solution_printer = SolutionsLoggerPrinter()
+
+    # Shifts of a solution, boolean_value reads it either from the solver or from inside of the solution callback
+    def collect_shifts(boolean_value):
+        output_shifts = []
+        for ei in ctx.employees:
+            for s in ei.allowed_shift_types.keys():
+                if s.id == 0:
+                    continue
+                for d in ei.allowed_shift_types[s]:
+                    if boolean_value(work[ei.get().pk, s.id, d]):
+                        output_shifts.append(ShiftData(date=dt(year, month, d).date(), employee_id=ei.get().pk, shift_type_id=s.id))
+        return output_shifts
+
+    def report_draft(printer):
+        draft_callback(dict(printer.progress(), shifts=collect_shifts(printer.BooleanValue)))
+
+    solution_printer = SolutionsLoggerPrinter(plateau_window, plateau_delta, gap_limit, progress_callback,
+                                              report_draft if draft_callback else None, draft_every, draft_interval)
+    solution_printer.start_watchdog()
     status = solver.Solve(model, solution_printer)
+    solution_printer.finish(status)
+
+    # Pins can contradict the changed input (e.g. new absence moving coverage onto pinned co-workers), the whole month
+    # is solved again rather than failing the repair
+    if status == cp_model.INFEASIBLE and pinned:
+        logger.warning(f"Repair model with {pinned} pinned variables is infeasible. Solving the whole month.")
+        response = solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, emp_assignments, employees, shift_types,
+                                          work_for_workplace_closing, shifts_before, year, month, job_time, params, output_proto,
+                                          sparse_variables, plateau_window, plateau_delta, gap_limit, shifts_hint, None,
+                                          progress_callback, draft_callback, draft_every, draft_interval)
+        response["repair_fallback"] = True
+        return response
+
+    post_process_start = time.time()
 
     def update_working_hours():
         for d in range(1, num_days + 1):
@@ -1021,6 +1315,7 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
                                  f"\nList of excess shifts: {candidates}")
 
     # Print solution.
+    penalties = dict()
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
         update_working_hours()
 
@@ -1033,6 +1328,8 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
                 else:
                     logger.log("MODEL", f"  - {var.Name()} fulfilled, gain={-penalty}")
 
+        penalties = penalty_breakdown(solver, obj_bool_vars, obj_bool_coeffs, obj_int_vars, obj_int_coeffs)
+
         for i, var in enumerate(obj_int_vars):
             if solver.Value(var) > 0:
                 logger.log("MODEL", f"  - {var.Name()} violated by {solver.Value(var)}, linear penalty={obj_int_coeffs[i]}")
@@ -1080,13 +1377,7 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
     def output_inflate():
         output_shifts = []
         if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            for ei in ctx.employees:
-                for s in ei.allowed_shift_types.keys():
-                    for d in ei.allowed_shift_types[s]:
-                        if s.id == 0:
-                            continue
-                        if solver.BooleanValue(work[ei.get().pk, s.id, d]):
-                            output_shifts.append(Shift(date=dt(year, month, d).date(), schedule=schedule_dict[s.workplace.id], employee=ei.get(), shift_type=s))
+            output_shifts = collect_shifts(solver.BooleanValue)
         # else:
         #     for el in obj_int_vars:
         #         logger.trace(el)
@@ -1100,18 +1391,36 @@ def solve_shift_scheduling(emp_for_workplaces, emp_preferences, emp_absences, em
     logger.log("MODEL", f"  - conflicts  : {solver.NumConflicts():d}")
     logger.log("MODEL", f"  - branches   : {solver.NumBranches():d}")
     logger.log("MODEL", f"  - wall time  : {solver.WallTime():.3f} s")
+    logger.log("MODEL", f"  - stopped    : {solution_printer.stop_reason}")
+    hints_kept = 0
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        hints_kept = sum(1 for key, value in hints.items() if solver.BooleanValue(work[key]) == bool(value))
+        logger.log("MODEL", f"  - hints kept : {hints_kept:d} / {len(hints):d}")
     logger.log("MODEL", "")
     # logger.info("{}".format(solver.SufficientAssumptionsForInfeasibility()))
 
-    return {"data": output_inflate(), "status": True if (status == cp_model.OPTIMAL or status == cp_model.FEASIBLE) else False}
+    output_shifts = output_inflate()
 
+    return {"data": output_shifts, "status": True if (status == cp_model.OPTIMAL or status == cp_model.FEASIBLE) else False,
+            "statistics": statistics.as_dict(), "stop_reason": solution_printer.stop_reason,
+            "hints": {"total": len(hints), "kept": hints_kept, "pinned": pinned},
+            "build_time": build_time, "context_time": context_time, "model_time": build_time - context_time,
+            "post_process_time": time.time() - post_process_start,
+            "wall_time": solver.WallTime(), "first_solution_time": solution_printer.first_solution_time,
+            "solver_status": solver.StatusName(status), "conflicts": solver.NumConflicts(), "branches": solver.NumBranches(),
+            "solutions": solution_printer.solution_count(), "objective": solution_printer.best_objective,
+            "best_bound": solution_printer.best_bound, "penalties": penalties}
 
-def main_algorithm(schedule_dict, emp, shift_types, year, month, emp_for_workplaces, emp_preferences, emp_absences,
-                   emp_assignments, job_time, work_for_workplace_closing, shifts_before, shifts_after, username):
-    # Starting logger
-    logger.remove()
 
-    # Adding custom logger levels
+def start_logging(log_files: dict) -> list:
+    """Adds custom levels and logging outputs of one run.
+
+    Args:
+        log_files: paths of debug, console and statistics log files of the run
+
+    Returns:
+        list of ids of added handlers
+    """
     try:
         logger.level("ADDED")
     except (Exception,):
@@ -1122,23 +1431,90 @@ def main_algorithm(schedule_dict, emp, shift_types, year, month, emp_for_workpla
     except (Exception,):
         logger.level("MODEL", no=24, color="<magenta><bold>")
 
-    # Configuring logging outputs
-    logger.add("./scripts/logs/debug/debug_{time}.log", level="TRACE", backtrace=True, diagnose=True)
-    logger.add("./scripts/logs/console/console_{time}.log", level="INFO", format="<level>{level} | {message}</level>", backtrace=True, diagnose=True)
-    logger.add(sys.stdout, format="<level>{level} | {message}</level>", level="INFO", backtrace=True, diagnose=True)
+    return [
+        logger.add(log_files["debug"], level="TRACE", backtrace=True, diagnose=True),
+        logger.add(log_files["console"], level="INFO", format="<level>{level} | {message}</level>", backtrace=True, diagnose=True),
+        logger.add(sys.stdout, format="<level>{level} | {message}</level>", level="INFO", backtrace=True, diagnose=True),
+        logger.add(log_files["statistics"], level="DEBUG", format="{message}", filter=lambda r: "statistics" in r["extra"])]
+
+
+def solve_component(log_files: dict, index: int, arguments: dict, events=None, stops=None, report_progress=False, report_drafts=False):
+    """Solves one sub-problem in a child process of main_algorithm.
+
+    Args:
+        log_files: paths of log files of the run
+        index: number of the sub-problem
+        arguments: keyword arguments of solve_shift_scheduling (plain data, the model is built here)
+        events: queue receiving ("progress" or "draft", value) events of the search, read by relay_events
+        stops: dictionary with reasons to stop sub-problems (index: reason), filled by relay_events
+        report_progress: put progress of the search into events
+        report_drafts: put draft schedules into events
+
+    Returns:
+        dictionary returned by solve_shift_scheduling
+    """
+    logger.remove()
+    handlers = start_logging(log_files)
+
+    def progress_callback(progress):
+        events.put(("progress", dict(progress, component=index)))
+        return stops.get(index)
+
+    def draft_callback(draft):
+        events.put(("draft", dict(draft, component=index)))
+
+    try:
+        return solve_shift_scheduling(**arguments, progress_callback=progress_callback if report_progress else None,
+                                      draft_callback=draft_callback if report_drafts else None)
+    finally:
+        for handler in handlers:
+            logger.remove(handler)
+
+
+def relay_events(events, stops, progress_callback, draft_callback):
+    """Passes events of sub-problems to callbacks of main_algorithm until None is received.
+
+    Reason returned by progress_callback is saved in stops, the sub-problem stops with it at its next progress report.
+    """
+    while (event := events.get()) is not None:
+        kind, value = event
+        if kind == "progress" and progress_callback is not None:
+            reason = progress_callback(value)
+            if reason:
+                stops[value["component"]] = reason
+        elif kind == "draft" and draft_callback is not None:
+            draft_callback(value)
+
+
+def main_algorithm(emp, shift_types, year, month, emp_for_workplaces, emp_preferences, emp_absences,
+                   emp_assignments, job_time, work_for_workplace_closing, shifts_before, shifts_after, username, solver_profile=None,
+                   shifts_hint=None, repair=None, progress_callback=None, draft_callback=None, draft_every=1, draft_interval=5.0):
+    with ALGORITHM_LOCK:
+        return solve_month(emp, shift_types, year, month, emp_for_workplaces, emp_preferences, emp_absences, emp_assignments, job_time,
+                           work_for_workplace_closing, shifts_before, shifts_after, username, solver_profile, shifts_hint, repair,
+                           progress_callback, draft_callback, draft_every, draft_interval)
+
+
+def solve_month(emp, shift_types, year, month, emp_for_workplaces, emp_preferences, emp_absences,
+                emp_assignments, job_time, work_for_workplace_closing, shifts_before, shifts_after, username, solver_profile=None,
+                shifts_hint=None, repair=None, progress_callback=None, draft_callback=None, draft_every=1, draft_interval=5.0):
+    # Starting logger, sub-problems solved by child processes append to the same files
+    logger.remove()
+    stamp = dt.now().strftime("%Y-%m-%d_%H-%M-%S_%f")
+    log_files = {"debug": f"./scripts/logs/debug/debug_{stamp}.log", "console": f"./scripts/logs/console/console_{stamp}.log",
+                 "statistics": f"./scripts/logs/statistics/statistics_{stamp}.json"}
+    handlers = start_logging(log_files)
 
     logger.success(f"Generating started by {username}...")
     logger.info(f"Month: {month} | Year: {year}")
 
     # Calendar data
-    global num_days
     num_days = get_month_by_weeks(year, month)[-1][-1][0]
 
-    # Adding free shift to shift_types
-    shift_free = ShiftType(hour_start=dt.time(dt.strptime("00:00", "%H:%M")), hour_end=dt.time(dt.strptime("00:00", "%H:%M")),
-                           name="-", workplace=Workplace.objects.all().first(), active_days="1111111", shift_code="---",
-                           is_used=True, is_archive=False)
-    shift_free.pk = 0
+    # Adding free shift to shift_types, it belongs to no real workplace (so it has no closings)
+    shift_free = ShiftTypeData(id=0, workplace_id=0, hour_start=dt.time(dt.strptime("00:00", "%H:%M")),
+                               hour_end=dt.time(dt.strptime("00:00", "%H:%M")), name="-", shift_code="---", active_days="1111111",
+                               workplace_name="-")
     shift_types.insert(0, shift_free)
 
     # Only consider employees with set job time
@@ -1152,24 +1528,90 @@ def main_algorithm(schedule_dict, emp, shift_types, year, month, emp_for_workpla
     if type(job_time) is not int or job_time == 0:
         logger.critical(f"Job time is not set! Current value: {job_time}")
 
+    # Workplaces which don't share any employee are solved as separate models
+    components = []
+    for workplaces, employees in partition_workplaces({wp: list(emp_for_workplaces[wp]) for wp in emp_for_workplaces}, emp_assignments):
+        component_emp = [e for e in new_emp if e.pk in employees]
+        if not component_emp:
+            logger.warning(f"Workplaces {workplaces} have no employees and won't be scheduled!")
+            continue
+        components.append((workplaces, component_emp))
+
+    scheduled = {e.pk for _, component_emp in components for e in component_emp}
+    for e in new_emp:
+        if e.pk not in scheduled:
+            logger.warning(f"Employee no. {e.pk} isn't assigned to any scheduled workplace and won't be used in solving!")
+
+    parallel = max(1, min(len(components), cpu_count() or 1))
+    logger.info(f"Independent sub-problems: {len(components)} | Solved in parallel: {parallel}")
+
+    def component_arguments(workplaces, component_emp):
+        employees = {e.pk for e in component_emp}
+        component_shift_types = [shift_types[0]] + [st for st in shift_types[1:] if st.workplace_id in workplaces]
+
+        # Choosing solver parameters, automatic profiles depend on the size of the instance
+        profile = solver_profile
+        if not profile or profile.get("automatic", True):
+            profile = choose_solver_preset(len(component_emp), len(component_shift_types) - 1, num_days)
+        profile = dict(profile, num_workers=max(1, profile["num_workers"] // parallel))
+
+        # Only inputs of the sub-problem are sent to its process, the model is built there
+        return dict(emp_for_workplaces={wp: emp_for_workplaces[wp] for wp in workplaces},
+                    emp_preferences={e: emp_preferences.get(e, []) for e in employees},
+                    emp_absences={e: emp_absences.get(e, []) for e in employees},
+                    emp_assignments={e: emp_assignments.get(e, []) for e in employees},
+                    employees=component_emp,
+                    shift_types=component_shift_types,
+                    work_for_workplace_closing={wp: work_for_workplace_closing[wp] for wp in workplaces},
+                    shifts_before={date: [s for s in d_shifts if s.employee_id in employees] for date, d_shifts in shifts_before.items()},
+                    year=year, month=month, job_time=job_time,
+                    params=get_solver_params(profile), output_proto=None,
+                    plateau_window=profile.get("plateau_window") or None,
+                    plateau_delta=profile.get("plateau_delta", 0),
+                    gap_limit=profile.get("relative_gap_limit") or None,
+                    shifts_hint={date: [s for s in d_shifts if s.employee_id in employees] for date, d_shifts in (shifts_hint or {}).items()},
+                    repair=repair, draft_every=draft_every, draft_interval=draft_interval)
+
     data = {}
+    solve_start = time.time()
+
+    # Building the model is pure Python and holds the GIL, so sub-problems are solved by separate processes. They are
+    # spawned rather than forked, the calling process may run other threads (web server, job progress).
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager() if progress_callback or draft_callback else None
+    events = manager.Queue() if manager else None
+    stops = manager.dict() if manager else None
+    relay = threading.Thread(target=relay_events, args=(events, stops, progress_callback, draft_callback), daemon=True) if manager else None
 
     try:
-        data = solve_shift_scheduling(emp_for_workplaces,
-                                      emp_preferences,
-                                      emp_absences,
-                                      emp_assignments,
-                                      schedule_dict,
-                                      new_emp,
-                                      shift_types,
-                                      work_for_workplace_closing,
-                                      shifts_before,
-                                      year, month,
-                                      job_time,
-                                      params="max_time_in_seconds:300.0", output_proto=None)
+        if relay is not None:
+            relay.start()
+        with ProcessPoolExecutor(max_workers=parallel, mp_context=context) as executor:
+            futures = []
+            for index, (workplaces, component_emp) in enumerate(components):
+                arguments = component_arguments(workplaces, component_emp)
+                logger.info(f"Sub-problem {index}: workplaces {workplaces} | employees: {len(component_emp)} | "
+                            f"solver parameters: {arguments['params']}")
+                futures.append(executor.submit(solve_component, log_files, index, arguments, events, stops,
+                                               progress_callback is not None, draft_callback is not None))
+            results = [future.result() for future in futures]
+        for result, (workplaces, component_emp) in zip(results, components):
+            result["workplaces"] = workplaces
+            result["employees"] = len(component_emp)
+
+        data = {"data": [shift for result in results for shift in result.pop("data")],
+                "status": bool(results) and all(result["status"] for result in results),
+                "components": results, "solve_time": time.time() - solve_start}
     except Exception as e:
         logger.exception(f"Something went wrong! {e}")
-
-    logger.remove()
+    finally:
+        if relay is not None:
+            events.put(None)
+            relay.join()
+        if manager is not None:
+            manager.shutdown()
+
+    for handler in handlers:
+        logger.remove(handler)
 
     return data
@@ -0,0 +1,119 @@
+import pytest
+from google.protobuf import text_format
+from loguru import logger
+from ortools.sat import sat_parameters_pb2
+from ortools.sat.python import cp_model
+
+from scripts.helpers import get_solver_params, SOLVER_PRESETS, SolutionsLoggerPrinter
+
+
+def test_solver_params_parse():
+    profile = dict(SOLVER_PRESETS[-1][1], num_workers=1)
+    parameters = text_format.Parse(get_solver_params(profile), sat_parameters_pb2.SatParameters())
+
+    assert parameters.num_workers == 1
+    assert not parameters.HasField("num_search_workers")
+    assert parameters.max_time_in_seconds == profile["max_time_in_seconds"]
+    assert parameters.relative_gap_limit == profile["relative_gap_limit"]
+
+
+@pytest.fixture(autouse=True)
+def model_level():
+    try:
+        logger.level("MODEL")
+    except ValueError:
+        logger.level("MODEL", no=24)
+
+
+def golomb_ruler(marks: int = 12):
+    """Model with many improving solutions, proving the optimum takes far longer than the tests."""
+    model = cp_model.CpModel()
+    ruler = [model.NewIntVar(0, marks * marks, f"mark_{i}") for i in range(marks)]
+    model.Add(ruler[0] == 0)
+    for left, right in zip(ruler, ruler[1:]):
+        model.Add(left < right)
+    differences = []
+    for i in range(marks):
+        for j in range(i + 1, marks):
+            difference = model.NewIntVar(1, marks * marks, f"difference_{i}_{j}")
+            model.Add(difference == ruler[j] - ruler[i])
+            differences.append(difference)
+    model.AddAllDifferent(differences)
+    model.Minimize(ruler[-1])
+    return model
+
+
+def solve(model, printer, max_time: float = 30.0):
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time
+    solver.parameters.num_workers = 8
+    printer.start_watchdog()
+    status = solver.Solve(model, printer)
+    printer.finish(status)
+    return solver, status
+
+
+def test_plateau_stops_search():
+    # No improvement is big enough, so the watchdog stops the search once the window has passed
+    printer = SolutionsLoggerPrinter(plateau_window=0.5, plateau_delta=10 ** 6)
+    solver, status = solve(golomb_ruler(), printer)
+
+    assert status == cp_model.FEASIBLE
+    assert printer.stop_reason == "plateau"
+    assert solver.WallTime() < 10
+
+
+def test_plateau_window():
+    printer = SolutionsLoggerPrinter(plateau_window=10.0)
+    assert not printer.plateau_reached(100.0)
+
+    printer.last_improvement_time = 100.0
+    assert not printer.plateau_reached(109.9)
+    assert printer.plateau_reached(110.0)
+    assert not SolutionsLoggerPrinter().plateau_reached(1000.0)
+
+
+def test_gap_limit_stops_search():
+    # Objective and bound are never further than 100 % apart, so the first solution is good enough
+    printer = SolutionsLoggerPrinter(gap_limit=1.0)
+    solver, status = solve(golomb_ruler(), printer)
+
+    assert status == cp_model.FEASIBLE
+    assert printer.stop_reason.startswith("gap")
+    assert printer.solution_count() == 1
+    assert printer.get_relative_gap() <= 1.0
+
+
+@pytest.mark.parametrize("answer, reason", [(True, "cancelled"), ("accepted", "accepted")])
+def test_progress_callback_stops_search(answer, reason):
+    progress = []
+
+    def progress_callback(p):
+        progress.append(p)
+        return answer
+
+    printer = SolutionsLoggerPrinter(progress_callback=progress_callback)
+    solver, status = solve(golomb_ruler(), printer)
+
+    assert status == cp_model.FEASIBLE
+    assert printer.stop_reason == reason
+    assert solver.WallTime() < 10
+    assert progress and all(p["solutions"] <= 1 for p in progress)
+
+
+def test_stop_reason_of_finished_search():
+    model = cp_model.CpModel()
+    x = model.NewIntVar(0, 10, "x")
+    model.Minimize(x)
+    printer = SolutionsLoggerPrinter(plateau_window=60.0)
+    assert solve(model, printer)[1] == cp_model.OPTIMAL
+    assert printer.stop_reason == "optimal"
+
+    model.Add(x > 10)
+    printer = SolutionsLoggerPrinter()
+    assert solve(model, printer)[1] == cp_model.INFEASIBLE
+    assert printer.stop_reason == "infeasible"
+
+    printer = SolutionsLoggerPrinter()
+    assert solve(golomb_ruler(), printer, max_time=0.5)[1] == cp_model.FEASIBLE
+    assert printer.stop_reason == "limit reached"
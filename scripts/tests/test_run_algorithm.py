@@ -0,0 +1,161 @@
+from datetime import date, time
+
+import pytest
+from loguru import logger
+
+from scripts.context import Context, EmployeeInfo
+from scripts.data import AbsenceData, AssignmentData, EmployeeData, ShiftData, ShiftTypeData
+from scripts.run_algorithm import partition_workplaces, pinned_hints, repair_window, solution_hints, solve_shift_scheduling, \
+    start_logging, weekend_transition_clauses
+
+FREE = ShiftTypeData(id=0, workplace_id=0, hour_start=time(0), hour_end=time(0), name="-", shift_code="---")
+MORNING = ShiftTypeData(id=1, workplace_id=10, hour_start=time(6), hour_end=time(14), name="Rano")
+NIGHT = ShiftTypeData(id=2, workplace_id=10, hour_start=time(22), hour_end=time(6), name="Noc")
+AFTERNOON = ShiftTypeData(id=3, workplace_id=20, hour_start=time(14), hour_end=time(22), name="Popołudnie")
+
+# October 2022 starts on Saturday and has 31 days
+YEAR, MONTH = 2022, 10
+
+
+@pytest.fixture
+def ctx():
+    """Employees 1 and 2 work in workplace 10 (morning and night shifts), employee 3 in workplace 20 (afternoon shift)."""
+    employees = {1: [10], 2: [10], 3: [20]}
+    emp_info = [EmployeeInfo(EmployeeData(id=e, job_time="1"), workplaces, [], [], [], 160) for e, workplaces in employees.items()]
+    ctx = Context(emp_info, [FREE, MORNING, NIGHT, AFTERNOON], YEAR, MONTH, 160, {})
+    for ei in ctx.employees:
+        ei.allowed_shift_types = {s.get(): list(range(1, ctx.num_days + 1)) for s in ctx.shift_types
+                                  if s.id == 0 or s.get().workplace_id in ei.workplaces}
+    return ctx
+
+
+@pytest.fixture
+def solver_logs(tmp_path):
+    """Logging levels and outputs the solver writes to, as set up by solve_month."""
+    handlers = start_logging({name: str(tmp_path / f"{name}.log") for name in ("debug", "console", "statistics")})
+    yield tmp_path
+    for handler in handlers:
+        logger.remove(handler)
+
+
+def work_keys(ctx):
+    return {(ei.get().pk, s.id, d) for ei in ctx.employees for s in ei.allowed_shift_types for d in range(1, ctx.num_days + 1)}
+
+
+def test_weekend_transition_clauses_are_emitted_once(ctx):
+    weekend_days = [(d, weekday) for week in ctx.month_by_billing_weeks for d, weekday in week if weekday in (4, 5)]
+    clauses = list(weekend_transition_clauses(ctx, work_keys(ctx), set(), weekend_days))
+
+    assert clauses
+    assert len(clauses) == len(set(clauses))
+    # Days repeated in the input (e.g. the Friday before the month falling into the first week) add nothing
+    assert list(weekend_transition_clauses(ctx, work_keys(ctx), set(), weekend_days + weekend_days)) == clauses
+
+    # Night on Friday 7th and free weekend -> no morning shift on Monday, only for the night shift's workplace
+    assert ((1, NIGHT.id, 7), (1, 0, 8), (1, 0, 9), (1, MORNING.id, 10)) in clauses
+    assert not any(key[0] == 3 and key[1] == NIGHT.id for clause in clauses for key in clause)
+    # Nothing reaches beyond the end of the month
+    assert all(0 < d <= ctx.num_days for clause in clauses for _, _, d in clause)
+
+
+def test_solution_hints_roll_previous_month_forward_by_four_weeks(ctx):
+    shifts_hint = {
+        date(2022, 9, 5): [ShiftData(date(2022, 9, 5), 1, MORNING.id)],  # Monday -> Mondays 3rd and 31st of October
+        date(2022, 10, 10): [ShiftData(date(2022, 10, 10), 1, NIGHT.id)],
+    }
+    hints = solution_hints(ctx, work_keys(ctx), set(), shifts_hint, YEAR, MONTH)
+
+    assert {d for (e, s, d), value in hints.items() if value and s != 0} == {3, 10, 31}
+    assert hints[1, MORNING.id, 3] == hints[1, MORNING.id, 31] == hints[1, NIGHT.id, 10] == 1
+    assert hints[1, 0, 4] == 1 and hints[1, MORNING.id, 4] == 0
+    # Employees without any hinted shift are left to the solver
+    assert {e for e, _, _ in hints} == {1}
+
+
+def test_solution_hints_skip_forbidden_shifts(ctx):
+    shifts_hint = {date(2022, 9, 5): [ShiftData(date(2022, 9, 5), 1, MORNING.id)]}
+    hints = solution_hints(ctx, work_keys(ctx), {(1, MORNING.id, 31)}, shifts_hint, YEAR, MONTH)
+
+    assert (1, MORNING.id, 31) not in hints
+    assert hints[1, 0, 31] == 1 and hints[1, MORNING.id, 3] == 1
+
+
+def test_repair_window_covers_changed_employees_and_coworkers(ctx):
+    window = repair_window(ctx, {"employees": [1], "days": [2, 30]})
+
+    # Employee 2 shares workplace 10 with employee 1, employee 3 works elsewhere
+    assert window == {(e, d) for e in (1, 2) for d in (1, 2, 3, 4, 28, 29, 30, 31)}
+
+
+def test_repair_window_without_days_frees_whole_month_of_changed_employees(ctx):
+    assert repair_window(ctx, {"employees": [3]}) == {(3, d) for d in range(1, ctx.num_days + 1)}
+
+
+def test_pinned_hints_are_outside_of_repair_window(ctx):
+    shifts_hint = {date(2022, 10, d): [ShiftData(date(2022, 10, d), e, MORNING.id if e != 3 else AFTERNOON.id) for e in (1, 2, 3)]
+                   for d in range(1, ctx.num_days + 1)}
+    hints = solution_hints(ctx, work_keys(ctx), set(), shifts_hint, YEAR, MONTH)
+    window = repair_window(ctx, {"employees": [1], "days": [15]})
+    pins = pinned_hints(hints, window)
+
+    assert {(e, d) for e, _, d in pins} == {(e, d) for e, _, d in hints} - window
+    assert all(pins[key] == hints[key] for key in pins)
+    assert not any(e in (1, 2) and 13 <= d <= 17 for e, _, d in pins)
+    assert {d for e, _, d in pins if e == 3} == set(range(1, ctx.num_days + 1))
+
+
+def test_repair_conflicting_with_pins_solves_whole_month(solver_logs):
+    employees = [EmployeeData(id=1, job_time="1"), EmployeeData(id=2, job_time="1")]
+
+    def solve(emp_absences, shifts_hint=None, repair=None):
+        return solve_shift_scheduling({10: employees}, {}, emp_absences, {}, list(employees), [FREE, MORNING], {10: []}, {}, YEAR, MONTH,
+                                      168, "max_time_in_seconds:30.0 num_workers:8", None, shifts_hint=shifts_hint, repair=repair)
+
+    # One morning shift a day is covered by one of two employees
+    schedule = solve({})
+    assert schedule["status"]
+    shifts_hint = dict()
+    for shift in schedule["data"]:
+        shifts_hint.setdefault(shift.date, []).append(shift)
+    day = next(d for d in range(10, 32) if [s.employee_id for s in shifts_hint.get(date(YEAR, MONTH, d), [])] == [1])
+
+    repaired = solve({}, shifts_hint, {"employees": [1], "days": [3]})
+    assert repaired["status"] and repaired["hints"]["pinned"] > 0 and "repair_fallback" not in repaired
+
+    # Employee 1 is absent on a day far from the changed one, the co-worker pinned to a free day would have to cover it
+    absences = {1: [AbsenceData(1, date(YEAR, MONTH, day), date(YEAR, MONTH, day), 8)]}
+    repaired = solve(absences, shifts_hint, {"employees": [1], "days": [3]})
+    assert repaired["status"] and repaired["repair_fallback"]
+    assert [s.employee_id for s in repaired["data"] if s.date.day == day] == [2]
+
+
+def components(emp_for_workplaces, emp_assignments):
+    return sorted((sorted(workplaces), sorted(employees)) for workplaces, employees in partition_workplaces(emp_for_workplaces, emp_assignments))
+
+
+def test_workplaces_without_common_employees_are_separate():
+    employees = {e: EmployeeData(id=e, job_time="1") for e in (1, 2, 3)}
+    emp_for_workplaces = {10: [employees[1], employees[2]], 20: [employees[3]], 30: []}
+
+    assert components(emp_for_workplaces, {}) == [([10], [1, 2]), ([20], [3]), ([30], [])]
+
+
+def test_positive_cross_assignment_merges_workplaces():
+    employees = {e: EmployeeData(id=e, job_time="1") for e in (1, 2, 3)}
+    emp_for_workplaces = {10: [employees[1], employees[2]], 20: [employees[3]], 30: []}
+
+    negative = {1: [AssignmentData(1, AFTERNOON, True)]}
+    assert components(emp_for_workplaces, negative) == [([10], [1, 2]), ([20], [3]), ([30], [])]
+
+    outside = ShiftTypeData(id=4, workplace_id=40, hour_start=time(6), hour_end=time(14), name="Rano")
+    not_scheduled = {1: [AssignmentData(1, outside, False)]}
+    assert components(emp_for_workplaces, not_scheduled) == [([10], [1, 2]), ([20], [3]), ([30], [])]
+
+    positive = {1: [AssignmentData(1, AFTERNOON, False)]}
+    assert components(emp_for_workplaces, positive) == [([10, 20], [1, 2, 3]), ([30], [])]
+
+
+def test_employee_of_two_workplaces_merges_them():
+    employee = EmployeeData(id=1, job_time="1")
+
+    assert components({10: [employee], 20: [employee]}, {}) == [([10, 20], [1])]